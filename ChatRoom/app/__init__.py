@@ -1,7 +1,7 @@
 import logging
 import logging.config
 import yaml
-from flask import Flask, request
+from flask import Flask, g, request
 from flask_sqlalchemy import SQLAlchemy
 from app.config import Config
 from app.routes import chatroom, user
@@ -9,8 +9,16 @@ import os
 from .extensions import db
 import time
 from flask_migrate import Migrate
-from .schema import setup_graphql
+from .schema import setup_graphql, document_cache
 from app.authentication.auth import auth
+from app.utils.sqlite_pragmas import apply_sqlite_pragmas
+from app.utils.log_pipeline import JsonFormatter, queued_file_handler, replace_handlers
+from app.utils.metrics import StatsGauges, instrument_sql, observe_request, registry
+from app.utils.sql_profiler import (PROFILE_HEADER, current_profile, end_profile, instrument_sql_profiling,
+                                    report_profile, start_profile)
+from app.utils.response_cache import response_cache
+from app.services.tenant import TenantService
+from app.services.message import message_ingest
 
 migrate = Migrate()
 def create_app(config_class=Config):
@@ -29,8 +37,11 @@ def create_app(config_class=Config):
     setup_graphql(app)
 
     configure_logging(app)    
+    configure_metrics(app)
+    configure_sql_profiling(app)
     
     with app.app_context():
+        apply_sqlite_pragmas(db.engine, app.config['SQLITE_PRAGMAS'])
         db.create_all()
 
     return app
@@ -39,34 +50,104 @@ def create_app(config_class=Config):
 def configure_logging(app):
     log_dir = os.path.join(app.root_path, 'logs')
     os.makedirs(log_dir, exist_ok=True)
+
+    with open('logging.yaml', 'r') as f:
+        config = yaml.safe_load(f.read())
+        logging.config.dictConfig(config)
+
+    # Access and debug records are written by background threads, so file I/O
+    # never runs on a request thread
+    access_logger = logging.getLogger('access_logger')
+    access_logger.setLevel(logging.INFO)
+    replace_handlers(access_logger, [
+        queued_file_handler(os.path.join(log_dir, 'access.log'), JsonFormatter(),
+                            app.config['LOG_QUEUE_SIZE'], app.config['LOG_BATCH_SIZE'])
+    ])
+    access_logger.propagate = False
+
     @app.before_request
-    def log_request_info():
-        access_logger = logging.getLogger('access_logger')
-        access_logger.info(f'{request.remote_addr} - - [{time.strftime("%d/%b/%Y:%H:%M:%S %z")}] '
-                            f'"{request.method} {request.url} HTTP/{request.environ.get("SERVER_PROTOCOL")}" '
-                            f'{request.content_length} -')
+    def start_request_timer():
+        g.request_started = time.perf_counter()
 
     @app.after_request
     def log_response_info(response):
-        access_logger = logging.getLogger('access_logger')
-        access_logger.info(f'{request.remote_addr} - - [{time.strftime("%d/%b/%Y:%H:%M:%S %z")}] '
-                            f'"{request.method} {request.url} HTTP/{request.environ.get("SERVER_PROTOCOL")}" '
-                            f'{response.status_code} {response.content_length}')
+        started = g.get('request_started')
+        access_logger.info('request', extra={'access': {
+            'remote_addr': request.remote_addr,
+            'method': request.method,
+            'path': request.path,
+            'query': request.query_string.decode('latin-1'),
+            'protocol': request.environ.get('SERVER_PROTOCOL'),
+            'status': response.status_code,
+            'bytes': response.content_length,
+            'duration_ms': round((time.perf_counter() - started) * 1000, 3) if started else None,
+            'tenant_id': g.get('tenant_id')
+        }})
         return response
-    
+
+    sql_profile_logger = logging.getLogger('sql_profile_logger')
+    sql_profile_logger.setLevel(logging.INFO)
+    replace_handlers(sql_profile_logger, [
+        queued_file_handler(os.path.join(log_dir, 'sql_profile.log'), JsonFormatter(),
+                            app.config['LOG_QUEUE_SIZE'], app.config['LOG_BATCH_SIZE'])
+    ])
+    sql_profile_logger.propagate = False
+
     debug_logger = logging.getLogger('debug_logger')
     debug_logger.setLevel(logging.DEBUG)
-    debug_handler = logging.FileHandler(os.path.join(log_dir, 'debug.log'))
-    debug_handler.setLevel(logging.DEBUG)
     debug_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-    debug_handler.setFormatter(debug_formatter)
-    debug_logger.addHandler(debug_handler)
+    replace_handlers(debug_logger, [
+        queued_file_handler(os.path.join(log_dir, 'debug.log'), debug_formatter,
+                            app.config['LOG_QUEUE_SIZE'], app.config['LOG_BATCH_SIZE'], logging.DEBUG)
+    ])
     debug_logger.debug('Application startup')
 
+    app.logger.info('Application startup')
 
-    with open('logging.yaml', 'r') as f:
-        config = yaml.safe_load(f.read())
-        logging.config.dictConfig(config)
 
-    app.logger.info('Application startup')
-    
\ No newline at end of file
+def configure_metrics(app):
+    from app.routes.metrics import metrics_bp
+    app.register_blueprint(metrics_bp)
+
+    instrument_sql()
+    registry.register(StatsGauges('tenant_engine_cache', 'Tenant engine cache statistics',
+                                  lambda: {(): TenantService.get_engine_stats()}))
+    registry.register(StatsGauges('response_cache', 'GET response cache statistics',
+                                  lambda: {(): response_cache.stats()}))
+    registry.register(StatsGauges('graphql_document_cache', 'Parsed GraphQL document cache statistics',
+                                  lambda: {(): document_cache.stats()}))
+    registry.register(StatsGauges('message_ingest', 'Write-behind message queue statistics',
+                                  lambda: {(): message_ingest.stats()}))
+
+    # Uses the timer started by configure_logging
+    @app.after_request
+    def record_request_metrics(response):
+        started = g.get('request_started')
+        if started:
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            observe_request(request.method, route, response.status_code, g.get('tenant_id'),
+                            time.perf_counter() - started)
+        return response
+    
+
+
+def configure_sql_profiling(app):
+    instrument_sql_profiling()
+
+    @app.before_request
+    def start_sql_profile():
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        g.sql_profile_token = start_profile(route, bool(request.headers.get(PROFILE_HEADER)))
+
+    @app.after_request
+    def report_sql_profile(response):
+        server_timing = report_profile(current_profile(), g.get('tenant_id'))
+        if server_timing:
+            response.headers['Server-Timing'] = server_timing
+        return response
+
+    @app.teardown_request
+    def end_sql_profile(exc):
+        token = g.pop('sql_profile_token', None)
+        if token is not None:
+            end_profile(token)
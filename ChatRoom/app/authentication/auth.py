@@ -1,14 +1,21 @@
 from app.extensions import db
 from app.models import Tenant
+from app.config import Config
+from app.authentication.cache import CredentialCache
 from flask_httpauth import HTTPBasicAuth
 from flask import g
 
 auth=HTTPBasicAuth()
+credential_cache = CredentialCache(ttl=Config.AUTH_CACHE_TTL, max_size=Config.AUTH_CACHE_SIZE)
 
 @auth.verify_password
 def verify_password(username, password):
-    tenant=Tenant.query.filter_by(name=username).first()
-    if tenant and tenant.password==password:
-        g.tenant_id=tenant.id
-        return True
-    return False
\ No newline at end of file
+    tenant_id = credential_cache.get(username, password)
+    if tenant_id is None:
+        tenant=Tenant.query.filter_by(name=username).first()
+        if not tenant or tenant.password!=password:
+            return False
+        tenant_id = tenant.id
+        credential_cache.set(username, password, tenant_id)
+    g.tenant_id=tenant_id
+    return True
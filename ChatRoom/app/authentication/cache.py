@@ -0,0 +1,78 @@
+import hashlib
+import hmac
+import secrets
+import threading
+import time
+
+
+class CredentialCache:
+    """In-memory cache of Basic auth credentials that were verified recently.
+
+    Entries are keyed by an HMAC of the username and password under a
+    per-process random key, so plaintext passwords are never held here.
+    """
+
+    def __init__(self, ttl, max_size):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._key = secrets.token_bytes(32)
+        self._entries = {}
+        self._by_username = {}
+        self._lock = threading.Lock()
+
+    def _digest(self, username, password):
+        message = f'{len(username)}:{username}:{password}'.encode('utf-8')
+        return hmac.new(self._key, message, hashlib.sha256).digest()
+
+    def get(self, username, password):
+        digest = self._digest(username, password)
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None or entry[2] < time.monotonic():
+                if entry is not None:
+                    self._remove(digest)
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[0]
+
+    def set(self, username, password, tenant_id):
+        if self.ttl <= 0:
+            return
+        digest = self._digest(username, password)
+        with self._lock:
+            if digest not in self._entries and len(self._entries) >= self.max_size:
+                self._remove(next(iter(self._entries)))
+            self._entries[digest] = (tenant_id, username, time.monotonic() + self.ttl)
+            self._by_username.setdefault(username, set()).add(digest)
+
+    def invalidate(self, username):
+        with self._lock:
+            for digest in self._by_username.pop(username, ()):
+                self._entries.pop(digest, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_username.clear()
+
+    def _remove(self, digest):
+        _, username, _ = self._entries.pop(digest)
+        digests = self._by_username.get(username)
+        if digests is not None:
+            digests.discard(digest)
+            if not digests:
+                del self._by_username[username]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
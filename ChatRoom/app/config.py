@@ -1,3 +1,4 @@
+import json
 import os
 basedir = os.path.abspath(os.path.dirname(__file__))
 
@@ -6,6 +7,82 @@ class Config:
     SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(basedir, 'app.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     TENANT_DATABASE_DIR = os.path.join(basedir, 'tenant_databases')
+    TENANT_ENGINE_CACHE_SIZE = int(os.environ.get('TENANT_ENGINE_CACHE_SIZE', 512))
+    AUTH_CACHE_TTL = int(os.environ.get('AUTH_CACHE_TTL', 300))
+    AUTH_CACHE_SIZE = int(os.environ.get('AUTH_CACHE_SIZE', 10000))
+    # Cached GET responses live at most RESPONSE_CACHE_TTL seconds; a TTL of 0
+    # disables the cache. RESPONSE_CACHE_SIZE bounds the entries per tenant.
+    RESPONSE_CACHE_TTL = int(os.environ.get('RESPONSE_CACHE_TTL', 30))
+    RESPONSE_CACHE_SIZE = int(os.environ.get('RESPONSE_CACHE_SIZE', 1000))
+    # Log records waiting for the background log writers; beyond this they are
+    # dropped instead of blocking requests. LOG_BATCH_SIZE caps records per write.
+    LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+    LOG_BATCH_SIZE = int(os.environ.get('LOG_BATCH_SIZE', 512))
+    # Tenants given their own label in /metrics; the rest are reported as "other"
+    METRICS_MAX_TENANTS = int(os.environ.get('METRICS_MAX_TENANTS', 1000))
+    # Statements slower than SQL_SLOW_QUERY_MS are logged to sql_profile.log with
+    # their query plan (0 disables). SQL_PROFILING=1 also logs every request's
+    # statements; tenants in SQL_PROFILE_TENANTS (JSON list of ids) can profile a
+    # single request by sending the X-SQL-Profile header.
+    SQL_SLOW_QUERY_MS = int(os.environ.get('SQL_SLOW_QUERY_MS', 200))
+    SQL_PROFILING = os.environ.get('SQL_PROFILING', '0') == '1'
+    SQL_PROFILE_TENANTS = json.loads(os.environ.get('SQL_PROFILE_TENANTS', '[]'))
+    SQL_LOG_STATEMENT_CHARS = int(os.environ.get('SQL_LOG_STATEMENT_CHARS', 2000))
+    SSE_QUEUE_SIZE = int(os.environ.get('SSE_QUEUE_SIZE', 256))
+    SSE_KEEPALIVE_SECONDS = int(os.environ.get('SSE_KEEPALIVE_SECONDS', 15))
+    # Most messages a reconnecting stream replays from Last-Event-ID before it
+    # sends a replay-truncated event and switches to live messages
+    SSE_REPLAY_MAX_MESSAGES = int(os.environ.get('SSE_REPLAY_MAX_MESSAGES', 1000))
+
+    # Applied to every main and tenant SQLite connection. SQLITE_TENANT_PRAGMAS
+    # is a JSON object of per-tenant overrides keyed by tenant id, e.g.
+    # {"7": {"synchronous": "FULL"}}
+    SQLITE_PRAGMAS = {
+        'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+        'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+        'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000)),
+        'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 268435456)),
+        'cache_size': int(os.environ.get('SQLITE_CACHE_SIZE', -20000)),
+    }
+    SQLITE_TENANT_PRAGMAS = json.loads(os.environ.get('SQLITE_TENANT_PRAGMAS', '{}'))
+
+    # direct: commit each message in its request. buffered: return at once and
+    # write messages in grouped transactions. durable: group commit, but the
+    # request waits until its message is written.
+    # Buffered sends return 202 before the write: a message that then fails
+    # to insert is only logged and counted in message_ingest_failed on
+    # /metrics, so use durable when the client must know.
+    # In every mode a message's timestamp, which orders history pages, cursors
+    # and SSE replay, is stamped in the transaction that inserts it. A queued
+    # message does not wait out the flush interval behind newer, already
+    # committed messages, so after= polling and Last-Event-ID replay do not
+    # skip it. A buffered send's response carries a provisional timestamp;
+    # the stored one is assigned at the group commit.
+    MESSAGE_INGEST_MODE = os.environ.get('MESSAGE_INGEST_MODE', 'direct')
+    MESSAGE_BATCH_SIZE = int(os.environ.get('MESSAGE_BATCH_SIZE', 500))
+    MESSAGE_FLUSH_INTERVAL_MS = int(os.environ.get('MESSAGE_FLUSH_INTERVAL_MS', 50))
+    MESSAGE_QUEUE_MAX_PENDING = int(os.environ.get('MESSAGE_QUEUE_MAX_PENDING', 10000))
+    MESSAGE_BULK_MAX_ITEMS = int(os.environ.get('MESSAGE_BULK_MAX_ITEMS', 1000))
+    BULK_PROVISION_MAX_ITEMS = int(os.environ.get('BULK_PROVISION_MAX_ITEMS', 5000))
+    SEARCH_MARK_START = os.environ.get('SEARCH_MARK_START', '<mark>')
+    SEARCH_MARK_END = os.environ.get('SEARCH_MARK_END', '</mark>')
+    SEARCH_SNIPPET_TOKENS = int(os.environ.get('SEARCH_SNIPPET_TOKENS', 12))
+
+    # GraphQL queries are costed before execution: each returned object costs 1
+    # and list fields multiply by perPage/limit, capped at GRAPHQL_MAX_PAGE_SIZE.
+    # GRAPHQL_TENANT_LIMITS is a JSON object of per-tenant overrides, e.g.
+    # {"7": {"max_cost": 50000, "max_depth": 12}}. Queries costing at least
+    # GRAPHQL_EXPENSIVE_QUERY_COST are logged, along with rejected ones.
+    GRAPHQL_MAX_COST = int(os.environ.get('GRAPHQL_MAX_COST', 10000))
+    GRAPHQL_MAX_DEPTH = int(os.environ.get('GRAPHQL_MAX_DEPTH', 8))
+    GRAPHQL_MAX_PAGE_SIZE = int(os.environ.get('GRAPHQL_MAX_PAGE_SIZE', 100))
+    GRAPHQL_DEFAULT_LIST_SIZE = int(os.environ.get('GRAPHQL_DEFAULT_LIST_SIZE', 20))
+    GRAPHQL_TENANT_LIMITS = json.loads(os.environ.get('GRAPHQL_TENANT_LIMITS', '{}'))
+    GRAPHQL_EXPENSIVE_QUERY_COST = int(os.environ.get('GRAPHQL_EXPENSIVE_QUERY_COST', 1000))
+    GRAPHQL_LOG_QUERY_CHARS = int(os.environ.get('GRAPHQL_LOG_QUERY_CHARS', 500))
+    # Parsed and validated documents kept in memory, keyed by their SHA-256;
+    # also the store behind automatic persisted queries. 0 disables both.
+    GRAPHQL_DOCUMENT_CACHE_SIZE = int(os.environ.get('GRAPHQL_DOCUMENT_CACHE_SIZE', 1000))
     
     @staticmethod
     def get_tenant_db_uri(tenant_name):
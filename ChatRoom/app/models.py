@@ -5,6 +5,11 @@ from sqlalchemy.ext.declarative import declarative_base
 Base = declarative_base()
 
 
+def utcnow():
+    """Naive UTC, the form SQLite stores and returns DateTime values in."""
+    return datetime.now(UTC).replace(tzinfo=None)
+
+
 class User(db.Model):
     __tablename__ = 'user'
     id = db.Column(db.Integer, primary_key=True)
@@ -12,8 +17,8 @@ class User(db.Model):
     email = db.Column(db.String(128), unique=True, nullable=False)
     password = db.Column(db.String(128), nullable=False)
     mobile = db.Column(db.String(10), unique=True, nullable=True)
-    created_at = db.Column(db.DateTime, default=datetime.now(UTC))
-    modified_at = db.Column(db.DateTime, default=datetime.now(UTC), onupdate=datetime.now(UTC))
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(UTC))
+    modified_at = db.Column(db.DateTime, default=lambda: datetime.now(UTC), onupdate=lambda: datetime.now(UTC))
     
     def to_dict(self):
         return {
@@ -31,26 +36,33 @@ class Chatroom(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(64), nullable=False)
     description = db.Column(db.String(128))
-    created_at = db.Column(db.DateTime, default=datetime.now(UTC))
-    modified_at = db.Column(db.DateTime, default=datetime.now(UTC), onupdate=datetime.now(UTC))
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(UTC))
+    modified_at = db.Column(db.DateTime, default=lambda: datetime.now(UTC), onupdate=lambda: datetime.now(UTC))
 
 
 class ChatroomUser(db.Model):
     __tablename__ = 'chatroom_user'
+    __table_args__ = (
+        db.Index('ix_chatroom_user_chatroom_id_user_id', 'chatroom_id', 'user_id', unique=True),
+    )
     id = db.Column(db.String(32), primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     chatroom_id = db.Column(db.Integer, db.ForeignKey('chatroom.id'), nullable=False)
     role = db.Column(db.String(32), default='member')
-    joined_at = db.Column(db.DateTime, default=datetime.now(UTC))
+    joined_at = db.Column(db.DateTime, default=lambda: datetime.now(UTC))
 
 
 class Message(db.Model):
     __tablename__ = 'message'
+    __table_args__ = (
+        db.Index('ix_message_chatroom_id_timestamp', 'chatroom_id', 'timestamp'),
+        db.Index('ix_message_user_id_timestamp', 'user_id', 'timestamp'),
+    )
     id = db.Column(db.String(32), primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     chatroom_id = db.Column(db.Integer, db.ForeignKey('chatroom.id'), nullable=False)
     content = db.Column(db.Text, nullable=False)
-    timestamp = db.Column(db.DateTime, default=datetime.now(UTC))
+    timestamp = db.Column(db.DateTime, default=utcnow)
 
 
 class Tenant(db.Model):
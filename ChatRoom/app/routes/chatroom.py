@@ -1,15 +1,21 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from app.services.chatroom import ChatroomService
 from app.services.chatroom_user import ChatroomUserService
-from app.services.message import MessageService
+from app.services.message import MessageService, message_broadcaster, encode_cursor, decode_cursor
+from app.config import Config
+import queue
 from werkzeug.exceptions import BadRequest, NotFound
 import uuid
+import json
 from flask import g
 from app.authentication.auth import auth
+from app.utils.response_cache import cached_response
 
 
 bp = Blueprint('chatrooms', __name__)
 
+SSE_REPLAY_PAGE_SIZE = 100
+
 def generate_error_id():
     return str(uuid.uuid4())
 
@@ -26,14 +32,17 @@ def create_chatroom():
     return jsonify(result.to_dict()), 201
 
 @bp.route('/api/chatrooms', methods=['GET'])
+@auth.login_required
+@cached_response(lambda: ['chatrooms'])
 def get_chatrooms():
     tenant_id=int(g.tenant_id)
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('pagesize', 10, type=int)
     sort_by = request.args.get('sortby', 'created_at')
     sort_order = request.args.get('sortorder', 'desc')
+    include_total = request.args.get('include_total', 'true').lower() == 'true'
 
-    chatrooms, error = ChatroomService.get_chatrooms(int(tenant_id), page, per_page, sort_by, sort_order)
+    chatrooms, error = ChatroomService.get_chatrooms(int(tenant_id), page, per_page, sort_by, sort_order, include_total)
 
     if error:
         return jsonify({"error": error}), 400
@@ -42,6 +51,8 @@ def get_chatrooms():
     return jsonify(chatrooms.to_dict()), 200
 
 @bp.route('/api/chatrooms/<int:chatroom_id>', methods=['GET'])
+@auth.login_required
+@cached_response(lambda chatroom_id: [f'chatroom:{chatroom_id}'])
 def get_chatroom(chatroom_id):
     tenant_id=int(g.tenant_id)
     chatroom, error = ChatroomService.get_chatroom(int(tenant_id), chatroom_id)
@@ -49,7 +60,7 @@ def get_chatroom(chatroom_id):
         return jsonify({"error": error}), 400
     if not chatroom:
         raise NotFound("Chatroom with particular ID found")
-    return jsonify(chatroom), 200
+    return jsonify(chatroom.to_dict()), 200
 
 @bp.route('/api/chatrooms/<int:chatroom_id>', methods=['PUT'])
 def update_chatroom(chatroom_id):
@@ -85,6 +96,22 @@ def add_user_to_chatroom(chatroom_id):
         raise BadRequest("Bad Request ")
     return jsonify(result), 201
 
+@bp.route('/api/chatrooms/<int:chatroom_id>/users/bulk', methods=['POST'])
+@auth.login_required
+def add_users_to_chatroom(chatroom_id):
+    tenant_id=int(g.tenant_id)
+    data = request.json
+    members = data.get('members') if isinstance(data, dict) else None
+    if not isinstance(members, list) or not members:
+        raise BadRequest("members must be a non-empty array")
+    if len(members) > Config.BULK_PROVISION_MAX_ITEMS:
+        raise BadRequest(f"At most {Config.BULK_PROVISION_MAX_ITEMS} members can be added at once")
+
+    result, error = ChatroomUserService.add_users_to_chatroom(tenant_id, chatroom_id, members)
+    if error:
+        return jsonify({"error": error}), 400
+    return jsonify(result), 207 if result['failed'] else 201
+
 @bp.route('/api/chatrooms/<int:chatroom_id>/users', methods=['GET'])
 @auth.login_required
 def get_users_in_chatroom(chatroom_id):
@@ -94,8 +121,10 @@ def get_users_in_chatroom(chatroom_id):
     sort_by = request.args.get('sortby', 'joined_at')
     sort_order = request.args.get('sortorder', 'desc')
     name = request.args.get('name')
+    include_total = request.args.get('include_total', 'true').lower() == 'true'
 
-    result, error = ChatroomUserService.get_users_in_chatroom(int(tenant_id), chatroom_id, page, per_page, sort_by, sort_order, name)
+    result, error = ChatroomUserService.get_users_in_chatroom(int(tenant_id), chatroom_id, page, per_page, sort_by, sort_order, name,
+                                                              include_total)
     if error:
         return jsonify({"error": error}), 400
     if not result:
@@ -124,7 +153,27 @@ def send_message(chatroom_id):
     result, error = MessageService.send_message(int(tenant_id), chatroom_id, user_id, content)
     if error:
         return jsonify({"error": error}), 400
-    return jsonify(result), 201
+    # Buffered messages are accepted but not yet written
+    status = 202 if Config.MESSAGE_INGEST_MODE == 'buffered' else 201
+    return jsonify(result.to_dict()), status
+
+@bp.route('/api/chatrooms/<int:chatroom_id>/messages/bulk', methods=['POST'])
+@auth.login_required
+def send_messages(chatroom_id):
+    tenant_id=int(g.tenant_id)
+    data = request.json
+    messages = data.get('messages') if isinstance(data, dict) else None
+    if not isinstance(messages, list) or not messages:
+        raise BadRequest("messages must be a non-empty array")
+    if len(messages) > Config.MESSAGE_BULK_MAX_ITEMS:
+        raise BadRequest(f"At most {Config.MESSAGE_BULK_MAX_ITEMS} messages can be sent at once")
+
+    result, error = MessageService.send_messages(tenant_id, chatroom_id, messages)
+    if error:
+        return jsonify({"error": error}), 400
+    # 207 tells the caller to check the per-item results
+    status = 207 if result.failed else 201
+    return jsonify(result.to_dict()), status
 
 @bp.route('/api/chatrooms/<int:chatroom_id>/messages', methods=['GET'])
 @auth.login_required
@@ -137,13 +186,112 @@ def get_messages(chatroom_id):
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
     search = request.args.get('search')
+    match = request.args.get('match')
+    before = request.args.get('before')
+    after = request.args.get('after')
 
-    result, error = MessageService.get_messages(int(tenant_id), chatroom_id, page, per_page, sort_by, sort_order, start_date, end_date, search)
+    if before or after or request.args.get('pagination') == 'cursor':
+        include_total = request.args.get('include_total', 'false').lower() == 'true'
+        result, error = MessageService.get_messages_by_cursor(int(tenant_id), chatroom_id, per_page, before, after, sort_order,
+                                                              include_total, start_date, end_date, search, match)
+    else:
+        include_total = request.args.get('include_total', 'true').lower() == 'true'
+        result, error = MessageService.get_messages(int(tenant_id), chatroom_id, page, per_page, sort_by, sort_order, start_date, end_date, search,
+                                                    include_total, match)
     if error:
         return jsonify({"error": error}), 400
     if not result:
         raise NotFound("No messages found")
-    return jsonify(result), 200
+    return jsonify(result.to_dict()), 200
+
+@bp.route('/api/chatrooms/<int:chatroom_id>/messages/stream', methods=['GET'])
+@auth.login_required
+def stream_messages(chatroom_id):
+    tenant_id=int(g.tenant_id)
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+
+    if last_event_id:
+        try:
+            decode_cursor(last_event_id)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+    # Subscribe before reading the backlog so nothing committed in between is lost
+    subscriber = message_broadcaster.subscribe(tenant_id, chatroom_id)
+
+    def replay():
+        """Missed messages, a page at a time, then None if SSE_REPLAY_MAX_MESSAGES cut the replay short."""
+        cursor, sent = last_event_id, 0
+        while cursor and sent < Config.SSE_REPLAY_MAX_MESSAGES:
+            page_size = min(SSE_REPLAY_PAGE_SIZE, Config.SSE_REPLAY_MAX_MESSAGES - sent)
+            page, error = MessageService.get_messages_by_cursor(tenant_id, chatroom_id, page_size, after=cursor)
+            if error:
+                raise RuntimeError(error)
+            yield from page.messages
+            sent += len(page.messages)
+            cursor = page.next_cursor if page.has_more else None
+        if cursor:
+            yield None
+
+    def generate():
+        try:
+            yield 'retry: 3000\n\n'
+            replayed = set()
+            last_replayed = last_event_id
+            try:
+                for message in replay():
+                    if message is None:
+                        # Messages after `after` and before the live events are not
+                        # replayed; the client pages them from the messages endpoint
+                        data = {'replayed': len(replayed), 'after': last_replayed}
+                        yield f'event: replay-truncated\ndata: {json.dumps(data)}\n\n'
+                        break
+                    replayed.add(message.id)
+                    last_replayed = encode_cursor(message.timestamp, message.id)
+                    yield f'id: {last_replayed}\ndata: {json.dumps(message.to_dict())}\n\n'
+            except RuntimeError as e:
+                yield f'event: error\ndata: {json.dumps({"error": str(e)})}\n\n'
+                return
+            while True:
+                try:
+                    event = subscriber.get(timeout=Config.SSE_KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+                    continue
+                if event is None:
+                    return
+                event_id, message_id, data = event
+                if message_id in replayed:
+                    continue
+                yield f'id: {event_id}\ndata: {data}\n\n'
+        finally:
+            message_broadcaster.unsubscribe(subscriber)
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    response.call_on_close(lambda: message_broadcaster.unsubscribe(subscriber))
+    return response
+
+@bp.route('/api/chatrooms/<int:chatroom_id>/messages/search', methods=['GET'])
+@auth.login_required
+def search_chatroom_messages(chatroom_id):
+    return _search_messages(chatroom_id)
+
+@bp.route('/api/messages/search', methods=['GET'])
+@auth.login_required
+def search_messages():
+    return _search_messages(request.args.get('chatroom_id', type=int))
+
+def _search_messages(chatroom_id):
+    tenant_id=int(g.tenant_id)
+    term = request.args.get('q', '')
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('pagesize', 20, type=int), 1), 100)
+
+    result, error = MessageService.search_messages(tenant_id, term, chatroom_id, page, per_page)
+    if error:
+        return jsonify({"error": error}), 400
+    return jsonify(result.to_dict()), 200
 
 @bp.route('/api/users/<int:user_id>/messages', methods=['GET'])
 @auth.login_required
@@ -156,10 +304,11 @@ def get_user_messages(user_id):
     per_page = request.args.get('pagesize', 10, type=int)
     sort_by = request.args.get('sortby', 'timestamp')
     sort_order = request.args.get('sortorder', 'desc')
+    include_total = request.args.get('include_total', 'true').lower() == 'true'
 
-    result, error = MessageService.get_user_messages(int(tenant_id), user_id, page, per_page, sort_by, sort_order)
+    result, error = MessageService.get_user_messages(int(tenant_id), user_id, page, per_page, sort_by, sort_order, include_total)
     if error:
         return jsonify({"error": error}), 400
     if not result:
         raise NotFound("No message found for user ")
-    return jsonify(result), 200
\ No newline at end of file
+    return jsonify(result.to_dict()), 200
\ No newline at end of file
@@ -4,7 +4,9 @@ from werkzeug.exceptions import BadRequest, NotFound, MethodNotAllowed, Internal
 from flask_httpauth import HTTPBasicAuth
 import uuid
 from app.authentication.auth import auth
+from app.config import Config
 from flask import g
+from app.utils.response_cache import cached_response
 
 
 bp = Blueprint('users', __name__)
@@ -19,6 +21,22 @@ def create_user():
     else:
         raise BadRequest(result)
 
+@bp.route('/api/users/bulk', methods=['POST'])
+@auth.login_required
+def create_users():
+    tenant_id=int(g.tenant_id)
+    data = request.json
+    users = data.get('users') if isinstance(data, dict) else None
+    if not isinstance(users, list) or not users:
+        raise BadRequest("users must be a non-empty array")
+    if len(users) > Config.BULK_PROVISION_MAX_ITEMS:
+        raise BadRequest(f"At most {Config.BULK_PROVISION_MAX_ITEMS} users can be created at once")
+
+    result, error = UserService.create_users(tenant_id, users)
+    if error:
+        return jsonify({"error": error}), 400
+    return jsonify(result), 207 if result['failed'] else 201
+
 @bp.route('/api/users', methods=['GET'])
 def get_users():
     tenant_id=int(g.tenant_id)
@@ -27,8 +45,9 @@ def get_users():
     per_page = request.args.get('pagesize', 10, type=int)
     sort_by = request.args.get('sortby', 'created_at')
     sort_order = request.args.get('sortorder', 'desc')
+    include_total = request.args.get('include_total', 'true').lower() == 'true'
 
-    users, error = UserService.get_users(int(tenant_id), page, per_page, sort_by, sort_order)
+    users, error = UserService.get_users(int(tenant_id), page, per_page, sort_by, sort_order, include_total)
 
     if error:
         return jsonify({"error": str(error)}), 400
@@ -38,6 +57,8 @@ def get_users():
 
 
 @bp.route('/api/users/<int:user_id>', methods=['GET'])
+@auth.login_required
+@cached_response(lambda user_id: [f'user:{user_id}'])
 def get_user(user_id):
     tenant_id=int(g.tenant_id)
     tenant_id = getattr(g, 'tenant_id', None)
@@ -6,6 +6,9 @@ from .services.user import UserService
 from .services.chatroom import ChatroomService
 from .services.chatroom_user import ChatroomUserService
 from .services.message import MessageService
+from .config import Config
+from .utils.query_cost import capped_page_size, measure_query
+from .utils.graphql_cache import CachedDocumentBackend, DocumentCache, PersistedQueryError, resolve_persisted_query
 from .extensions import db
 import datetime
 from datetime import timezone
@@ -13,10 +16,12 @@ from graphql import GraphQLError
 from graphene import DateTime
 from datetime import date
 UTC=timezone.utc
-from app.authentication.auth import auth
+from app.authentication.auth import auth, credential_cache
 from flask import g
 from flask_graphql import GraphQLView
-from flask import request, jsonify
+from graphql.error import GraphQLSyntaxError
+from graphql_server import HttpQueryError, get_graphql_params, json_encode
+from flask import Response, request, jsonify
 from dateutil import parser
 
 
@@ -45,6 +50,7 @@ class CreateTenant(graphene.Mutation):
             new_tenant = Tenant(name=name, db_name=db_name, password=password)
             db.session.add(new_tenant)
             db.session.commit()
+            credential_cache.invalidate(name)
             return CreateTenant(tenant=new_tenant, error=None)
         except Exception as e:
             db.session.rollback()
@@ -81,6 +87,14 @@ class TenantType(SQLAlchemyObjectType):
     class Meta:
         model = Tenant
 
+class MessageInfoType(graphene.ObjectType):
+    id = graphene.String()
+    user_id = graphene.Int()
+    chatroom_id = graphene.Int()
+    tenant_id = graphene.Int()
+    content = graphene.String()
+    timestamp = DateTime()
+
 class ChatroomList(graphene.ObjectType):
     total_count = graphene.Int()
     total_pages = graphene.Int()
@@ -223,10 +237,10 @@ class SendMessage(graphene.Mutation):
         user_id = graphene.Int(required=True)
         content = graphene.String(required=True)
 
-    message = graphene.Field(MessageType)
+    message = graphene.Field(MessageInfoType)
     error = graphene.String()
 
-    def mutate(self, chatroom_id, user_id, content):
+    def mutate(self, info, chatroom_id, user_id, content):
         tenant_id = int(g.tenant_id)
         result, error = MessageService.send_message(tenant_id, chatroom_id, user_id, content)
         if result:
@@ -234,6 +248,38 @@ class SendMessage(graphene.Mutation):
         return SendMessage(message=None, error=error)
 
 
+class MessageInput(graphene.InputObjectType):
+    user_id = graphene.Int(required=True)
+    content = graphene.String(required=True)
+
+
+class BulkMessageItem(graphene.ObjectType):
+    index = graphene.Int()
+    status = graphene.String()
+    error = graphene.String()
+    message = graphene.Field(MessageInfoType)
+
+
+class SendMessages(graphene.Mutation):
+    class Arguments:
+        chatroom_id = graphene.Int(required=True)
+        messages = graphene.List(graphene.NonNull(MessageInput), required=True)
+
+    created = graphene.Int()
+    failed = graphene.Int()
+    results = graphene.List(BulkMessageItem)
+    error = graphene.String()
+
+    def mutate(self, info, chatroom_id, messages):
+        tenant_id = int(g.tenant_id)
+        if len(messages) > Config.MESSAGE_BULK_MAX_ITEMS:
+            return SendMessages(error=f"At most {Config.MESSAGE_BULK_MAX_ITEMS} messages can be sent at once")
+        result, error = MessageService.send_messages(tenant_id, chatroom_id, [dict(message) for message in messages])
+        if error:
+            return SendMessages(error=error)
+        return SendMessages(created=result.created, failed=result.failed, results=result.results, error=None)
+
+
 
 
 # Queries
@@ -271,6 +317,7 @@ class Query(graphene.ObjectType):
         Get all users
         """
         tenant_id = int(g.tenant_id)
+        per_page = capped_page_size(per_page)
         result, error = UserService.get_users(tenant_id, page, per_page, sort_by, sort_order)
         if error:
             raise Exception(error)
@@ -295,6 +342,7 @@ class Query(graphene.ObjectType):
         Get all chatrooms
         """
         tenant_id = int(g.tenant_id)
+        per_page = capped_page_size(per_page)
         result, error = ChatroomService.get_chatrooms(tenant_id, page, per_page)
         if error:
             raise Exception(error)
@@ -336,6 +384,7 @@ class Query(graphene.ObjectType):
         Get messages for a chatroom
         """
         tenant_id = int(g.tenant_id)
+        per_page = capped_page_size(per_page)
         result, error = MessageService.get_messages(tenant_id, chatroom_id, page, per_page)
         if error:
             raise Exception(error)
@@ -354,6 +403,7 @@ class Query(graphene.ObjectType):
         Get messages for a user
         """
         tenant_id = int(g.tenant_id)
+        per_page = capped_page_size(per_page)
         result, error = MessageService.get_user_messages(tenant_id, user_id, page, per_page)
         if error:
             raise Exception(error)
@@ -372,6 +422,7 @@ class Query(graphene.ObjectType):
         Get users for  a chatroom
         """
         tenant_id = int(g.tenant_id)
+        per_page = capped_page_size(per_page)
         result, error = ChatroomUserService.get_users_in_chatroom(tenant_id, chatroom_id, page, per_page, sort_by, sort_order, name)
         if error:
             raise Exception(error)
@@ -400,11 +451,13 @@ class Mutation(graphene.ObjectType):
     add_user_to_chatroom = AddUserToChatroom.Field()
     remove_user_from_chatroom = RemoveUserFromChatroom.Field()
     send_message = SendMessage.Field()
+    send_messages = SendMessages.Field()
 
     
 
 tenant_schema = graphene.Schema(mutation=TenantMutation)
 schema = graphene.Schema(query=Query, mutation=Mutation)
+document_cache = DocumentCache(schema, Config.GRAPHQL_DOCUMENT_CACHE_SIZE)
 
 class AuthenticatedGraphQLView(GraphQLView):
     decorators = [auth.login_required]
@@ -413,14 +466,61 @@ class AuthenticatedGraphQLView(GraphQLView):
         tenant_id=g.tenant_id
         if not tenant_id:
             return jsonify({"error": "Tenant-ID  is  wrong "}), 400
+        try:
+            self.parse_body()
+        except PersistedQueryError as e:
+            return Response(self.encode({'errors': [e.as_dict()]}), status=400, content_type='application/json')
+        except HttpQueryError:
+            pass
+        error = self.check_query_cost(int(tenant_id))
+        if error:
+            return Response(self.encode({'errors': [{'message': error}]}), status=400, content_type='application/json')
         return super().dispatch_request()
 
+    def check_query_cost(self, tenant_id):
+        """
+        Cost the requested operation against the tenant's limits before it is
+        executed, keeping the result on g for the response extensions. Requests
+        that cannot be parsed are left for the regular error handling
+        """
+        try:
+            data = self.parse_body()
+            if not isinstance(data, dict):
+                return None
+            params = get_graphql_params(data, request.args)
+            if not params.query:
+                return None
+            entry = document_cache.document(params.query)
+        except (HttpQueryError, GraphQLSyntaxError):
+            return None
+        if entry.errors:
+            return None
+        g.query_cost = measure_query(self.schema, entry.document, tenant_id, params.query, params.variables,
+                                     params.operation_name)
+        return g.query_cost.error()
+
+    def parse_body(self):
+        # Read once per request, with any persisted query filled in
+        if 'graphql_body' not in g:
+            data = super().parse_body()
+            if isinstance(data, dict):
+                data = resolve_persisted_query(document_cache, data, request.args)
+            g.graphql_body = data
+        return g.graphql_body
+
+    def encode(self, data, pretty=False):
+        query_cost = g.get('query_cost')
+        if query_cost is not None and isinstance(data, dict):
+            data = dict(data, extensions={'cost': query_cost.extension()})
+        return json_encode(data, pretty)
+
 def setup_graphql(app):
     app.add_url_rule(
         '/graphql',
         view_func=AuthenticatedGraphQLView.as_view(
             'graphql',
             schema=schema,
+            backend=CachedDocumentBackend(document_cache),
             graphiql=True  
         )
     )
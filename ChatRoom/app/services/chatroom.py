@@ -3,6 +3,9 @@ from ..extensions import db
 import datetime 
 from typing import List, Any, Optional
 from app.services.tenant import TenantService
+from app.utils.counters import stored_count, CHATROOMS
+from app.utils.db import fetch_page, total_pages
+from app.utils.response_cache import response_cache
 
 
 class ChatroomInfo:
@@ -24,11 +27,13 @@ class ChatroomInfo:
 
 
 class ChatroomList:
-    def __init__(self, total_count: int, total_pages: int, current_page: int, chatrooms: List[ChatroomInfo]):
+    def __init__(self, total_count: Optional[int], total_pages: Optional[int], current_page: int, chatrooms: List[ChatroomInfo],
+                 has_more: bool = False):
         self.total_count = total_count
         self.total_pages = total_pages
         self.current_page = current_page
         self.chatrooms = chatrooms
+        self.has_more = has_more
 
         
     def to_dict(self):
@@ -36,6 +41,7 @@ class ChatroomList:
             'total_count': self.total_count,
             'total_pages': self.total_pages,
             'current_page': self.current_page,
+            'has_more': self.has_more,
             'chatrooms': [chatroom.to_dict() for chatroom in self.chatrooms]
         }
 
@@ -55,6 +61,7 @@ class ChatroomService:
             )
             session.add(new_chatroom)
             session.commit()
+            response_cache.invalidate(tenant_id, 'chatrooms')
             
             return ChatroomInfo(
                 id=new_chatroom.id,
@@ -70,7 +77,7 @@ class ChatroomService:
             session.close()
 
     @staticmethod
-    def get_chatrooms(tenant_id, page, per_page, sort_by, sort_order):
+    def get_chatrooms(tenant_id, page, per_page, sort_by, sort_order, include_total=True):
         session = TenantService.get_tenant_session(tenant_id)
         if not session:
             return None, "Tenant not found"
@@ -82,13 +89,14 @@ class ChatroomService:
             else:
                 query = query.order_by(getattr(Chatroom, sort_by))
 
-            total = query.count()
-            chatrooms = query.offset((page - 1) * per_page).limit(per_page).all()
+            chatrooms, total, has_more = fetch_page(query, page, per_page, include_total,
+                                                    count=lambda: stored_count(session, CHATROOMS))
 
             return ChatroomList(
                 total_count=total,
-                total_pages=(total + per_page - 1) // per_page,
+                total_pages=total_pages(total, per_page),
                 current_page=page,
+                has_more=has_more,
                 chatrooms=[ChatroomInfo(
                     id=chatroom.id,
                     name=chatroom.name,
@@ -137,6 +145,7 @@ class ChatroomService:
             chatroom.name = data.get('name', chatroom.name)
             chatroom.description = data.get('description', chatroom.description)
             session.commit()
+            response_cache.invalidate(tenant_id, 'chatrooms', f'chatroom:{chatroom_id}')
 
             return ChatroomInfo(
                 id=chatroom.id,
@@ -163,6 +172,7 @@ class ChatroomService:
                 return False, "Chatroom not found"
             session.delete(chatroom)
             session.commit()
+            response_cache.invalidate(tenant_id, 'chatrooms', f'chatroom:{chatroom_id}')
             return True, None
         except Exception as e:
             session.rollback()
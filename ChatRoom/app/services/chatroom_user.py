@@ -1,7 +1,43 @@
-from app.models import ChatroomUser, User
+from app.models import ChatroomUser, User, Chatroom
 from ..extensions import db
 import uuid
+from datetime import datetime, timezone
 from app.services.tenant import TenantService
+from app.utils.db import chunked, fetch_page, total_pages
+from app.utils.counters import stored_count, ROOM_MEMBERS
+
+
+def _validate_bulk_members(chatroom_id, members, known_users, existing_members):
+    """Split bulk membership items into rows to insert and per-item results."""
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    seen = set()
+    rows, results = [], []
+    for index, item in enumerate(members):
+        error = None
+        if not isinstance(item, dict):
+            error = "Each member must be an object"
+        elif not isinstance(item.get('user_id'), int) or isinstance(item.get('user_id'), bool):
+            error = "user_id must be an integer"
+        elif not isinstance(item.get('role', 'member'), str):
+            error = "role must be a string"
+        elif item['user_id'] not in known_users:
+            error = "User not found"
+        elif item['user_id'] in existing_members or item['user_id'] in seen:
+            error = "User is already a member of this chatroom"
+        if error:
+            results.append({'index': index, 'status': 'error', 'error': error})
+            continue
+        seen.add(item['user_id'])
+        row = {
+            'id': str(uuid.uuid4()),
+            'user_id': item['user_id'],
+            'chatroom_id': chatroom_id,
+            'role': item.get('role', 'member'),
+            'joined_at': now
+        }
+        rows.append(row)
+        results.append({'index': index, 'status': 'created', 'member': dict(row, joined_at=now.isoformat())})
+    return rows, results
 
 
 class ChatroomUserService:
@@ -35,16 +71,55 @@ class ChatroomUserService:
             session.close()
 
     @staticmethod
-    def get_users_in_chatroom(tenant_id, chatroom_id, page, per_page, sort_by, sort_order, name=None):
+    def add_users_to_chatroom(tenant_id, chatroom_id, members):
+        """
+        Add a batch of members to a chatroom in one transaction. Unknown users and
+        existing memberships are found with chunked IN queries and reported per
+        row without stopping the others.
+        """
+        session = TenantService.get_tenant_session(tenant_id)
+        if not session:
+            return None, "Tenant not found"
+
+        try:
+            if session.query(Chatroom.id).filter_by(id=chatroom_id).first() is None:
+                return None, "Chatroom not found"
+            user_ids = {item.get('user_id') for item in members
+                        if isinstance(item, dict) and isinstance(item.get('user_id'), int)}
+            known_users, existing_members = set(), set()
+            for chunk in chunked(user_ids):
+                known_users.update(row.id for row in session.query(User.id).filter(User.id.in_(chunk)))
+                existing_members.update(row.user_id for row in session.query(ChatroomUser.user_id).filter(
+                    ChatroomUser.chatroom_id == chatroom_id, ChatroomUser.user_id.in_(chunk)))
+
+            rows, results = _validate_bulk_members(chatroom_id, members, known_users, existing_members)
+            if rows:
+                session.execute(ChatroomUser.__table__.insert(), rows)
+                session.commit()
+            return {'created': len(rows), 'failed': len(members) - len(rows), 'results': results}, None
+        except Exception as e:
+            session.rollback()
+            return None, str(e)
+        finally:
+            session.close()
+
+    @staticmethod
+    def get_users_in_chatroom(tenant_id, chatroom_id, page, per_page, sort_by, sort_order, name=None, include_total=True):
         session = TenantService.get_tenant_session(tenant_id)
         if not session:
             return None, "Tenant not found"
 
         try:
-            query = session.query(ChatroomUser).filter_by(chatroom_id=chatroom_id)
+            query = session.query(
+                ChatroomUser.user_id,
+                User.username,
+                User.email,
+                ChatroomUser.role,
+                ChatroomUser.joined_at
+            ).join(User, User.id == ChatroomUser.user_id).filter(ChatroomUser.chatroom_id == chatroom_id)
 
             if name:
-                query = query.join(User).filter(User.username.ilike(f'%{name}%'))
+                query = query.filter(User.username.ilike(f'%{name}%'))
             if sort_by == 'username':
                 sort_column = User.username
             else:
@@ -53,20 +128,22 @@ class ChatroomUserService:
                 query = query.order_by(sort_column.asc())
             else:
                 query = query.order_by(sort_column.desc())
-            total = query.count()
-            chatroom_users = query.offset((page - 1) * per_page).limit(per_page).all()
+            # The maintained count only covers the unfiltered member list
+            count = None if name else lambda: stored_count(session, ROOM_MEMBERS, chatroom_id)
+            rows, total, has_more = fetch_page(query, page, per_page, include_total, count)
 
             return {
                 'total_count': total,
-                'total_pages': (total + per_page - 1) // per_page,
+                'total_pages': total_pages(total, per_page),
                 'current_page': page,
+                'has_more': has_more,
                 'users': [{
-                    'id': item.user_id,
-                    'username': session.query(User).get(item.user_id).username,
-                    'email': session.query(User).get(item.user_id).email,
-                    'role': item.role,
-                    'joined_at': item.joined_at
-                } for item in chatroom_users]
+                    'id': row.user_id,
+                    'username': row.username,
+                    'email': row.email,
+                    'role': row.role,
+                    'joined_at': row.joined_at
+                } for row in rows]
             }, None
         except Exception as e:
             return None, str(e)
@@ -1,8 +1,104 @@
-from app.models import Message, Chatroom, User,Tenant
+from app.models import Message, Chatroom, User,Tenant, utcnow
 from ..extensions import db
+import atexit
+import base64
+import json
 import uuid
-from datetime import datetime
-from app.services.tenant import TenantService
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import and_, or_, text
+from app.services.tenant import TenantService, tenant_registry
+from app.config import Config
+from app.utils.broadcaster import MessageBroadcaster
+from app.utils.message_ingest import MessageIngestQueue
+from app.utils.fts import fts5_supported, fts_query, FTS_TABLE, SEARCH_SQL, COUNT_SQL
+from app.utils.counters import stored_count, ROOM_MESSAGES, USER_MESSAGES
+from app.utils.db import chunked, fetch_page, total_pages
+
+message_broadcaster = MessageBroadcaster(queue_size=Config.SSE_QUEUE_SIZE)
+
+
+def _insert_messages(engine, rows):
+    # Stamp queued rows as they are written, not as they were queued, so a
+    # cursor can never pass a message that was still waiting for its commit
+    with engine.begin() as connection:
+        now = utcnow()
+        for index, row in enumerate(rows):
+            row['timestamp'] = now + timedelta(microseconds=index)
+        connection.execute(Message.__table__.insert(), rows)
+
+
+def _publish_messages(tenant_id, rows):
+    for row in rows:
+        message = MessageInfo(tenant_id=tenant_id, **row)
+        message_broadcaster.publish(tenant_id, row['chatroom_id'], encode_cursor(message.timestamp, message.id), message.to_dict())
+
+
+message_ingest = MessageIngestQueue(
+    write_batch=_insert_messages,
+    on_flushed=_publish_messages,
+    batch_size=Config.MESSAGE_BATCH_SIZE,
+    flush_interval=Config.MESSAGE_FLUSH_INTERVAL_MS / 1000,
+    max_pending=Config.MESSAGE_QUEUE_MAX_PENDING
+)
+atexit.register(message_ingest.flush)
+
+
+def _validate_bulk_messages(chatroom_id, messages, known_users):
+    """Split bulk message items into rows to insert and per-item results."""
+    now = utcnow()
+    rows, results = [], []
+    for index, item in enumerate(messages):
+        error = None
+        if not isinstance(item, dict):
+            error = "Each message must be an object"
+        elif not isinstance(item.get('user_id'), int) or isinstance(item.get('user_id'), bool):
+            error = "user_id must be an integer"
+        elif item['user_id'] not in known_users:
+            error = "User not found"
+        elif not isinstance(item.get('content'), str) or not item['content'].strip():
+            error = "content is required"
+        if error:
+            results.append({'index': index, 'status': 'error', 'error': error})
+            continue
+        # Offset each timestamp so the batch keeps its order in history pages
+        row = {
+            'id': str(uuid.uuid4()),
+            'user_id': item['user_id'],
+            'chatroom_id': chatroom_id,
+            'content': item['content'],
+            'timestamp': now + timedelta(microseconds=index)
+        }
+        rows.append(row)
+        results.append({'index': index, 'status': 'created', 'row': row})
+    return rows, results
+
+
+def encode_cursor(timestamp, message_id):
+    raw = json.dumps([timestamp.isoformat() if timestamp else None, message_id])
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        timestamp, message_id = json.loads(raw)
+        timestamp = datetime.fromisoformat(timestamp)
+        if timestamp.tzinfo is not None:
+            # Rows are stored as naive UTC; older cursors carried an offset
+            timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+        return timestamp, str(message_id)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+
+
+def keyset_filter(timestamp, message_id, older):
+    # The leading range condition on timestamp lets SQLite seek the
+    # (chatroom_id, timestamp) index instead of scanning the room.
+    if older:
+        return and_(Message.timestamp <= timestamp,
+                    or_(Message.timestamp < timestamp, Message.id < message_id))
+    return and_(Message.timestamp >= timestamp,
+                or_(Message.timestamp > timestamp, Message.id > message_id))
 
 
 class MessageInfo:
@@ -44,11 +140,12 @@ class UserMessageInfo:
         }
 
 class MessageList:
-    def __init__(self, total_count: int, total_pages: int, current_page: int, messages):
+    def __init__(self, total_count: int, total_pages: int, current_page: int, messages, has_more: bool = False):
         self.total_count = total_count
         self.total_pages = total_pages
         self.current_page = current_page
         self.messages = messages
+        self.has_more = has_more
 
 
     def to_dict(self):
@@ -56,11 +153,103 @@ class MessageList:
             'total_count': self.total_count,
             'total_pages': self.total_pages,
             'current_page': self.current_page,
+            'has_more': self.has_more,
+            'messages': [message.to_dict() for message in self.messages]
+        }
+
+
+class BulkMessageResult:
+    def __init__(self, created, failed, results):
+        self.created = created
+        self.failed = failed
+        self.results = results
+
+    def to_dict(self):
+        return {
+            'created': self.created,
+            'failed': self.failed,
+            'results': [
+                dict(result, message=result['message'].to_dict()) if 'message' in result else result
+                for result in self.results
+            ]
+        }
+
+
+class MessageSearchPage:
+    def __init__(self, total_count, current_page, per_page, results):
+        self.total_count = total_count
+        self.current_page = current_page
+        self.per_page = per_page
+        self.results = results
+
+    def to_dict(self):
+        return {
+            'total_count': self.total_count,
+            'current_page': self.current_page,
+            'per_page': self.per_page,
+            'results': self.results
+        }
+
+
+class MessageCursorPage:
+    def __init__(self, messages, next_cursor, has_more, total_count=None):
+        self.messages = messages
+        self.next_cursor = next_cursor
+        self.has_more = has_more
+        self.total_count = total_count
+
+    def to_dict(self):
+        result = {
+            'next_cursor': self.next_cursor,
+            'has_more': self.has_more,
             'messages': [message.to_dict() for message in self.messages]
         }
+        if self.total_count is not None:
+            result['total_count'] = self.total_count
+        return result
+
+
+def _filter_messages(query, start_date=None, end_date=None, search=None, chatroom_id=None, match=None):
+    """
+    search keeps the substring semantics of the list endpoints; match is the
+    opt-in full-text filter where every word must match as a word prefix.
+    """
+    if start_date:
+        query = query.filter(Message.timestamp >= datetime.fromisoformat(start_date))
+    if end_date:
+        query = query.filter(Message.timestamp <= datetime.fromisoformat(end_date))
+    if search:
+        query = query.filter(Message.content.ilike(f'%{search}%'))
+    if match:
+        words = fts_query(match, chatroom_id)
+        if words and fts5_supported():
+            query = query.filter(text(
+                f"message.rowid IN (SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :search_match)"
+            ).bindparams(search_match=words))
+        else:
+            query = query.filter(Message.content.ilike(f'%{match}%'))
+    return query
+
+
+def _room_message_count(session, chatroom_id, start_date=None, end_date=None, search=None, match=None):
+    """Maintained message count of a chatroom, or None when filters make it inapplicable."""
+    if start_date or end_date or search or match:
+        return None
+    return lambda: stored_count(session, ROOM_MESSAGES, chatroom_id)
+
+
 class MessageService:
     @staticmethod
     def send_message(tenant_id, chatroom_id, user_id, content):
+        if Config.MESSAGE_INGEST_MODE != 'direct':
+            result, future, error = MessageService.enqueue_message(tenant_id, chatroom_id, user_id, content)
+            if error is None and Config.MESSAGE_INGEST_MODE == 'durable':
+                try:
+                    result = MessageInfo(tenant_id=tenant_id, **future.result())
+                except Exception as e:
+                    return None, str(e)
+            return result, error
+
         session = TenantService.get_tenant_session(tenant_id)
         if not session:
             return None, "Tenant not found"
@@ -70,18 +259,21 @@ class MessageService:
                 id=str(uuid.uuid4()),
                 user_id=user_id,
                 chatroom_id=chatroom_id,
-                content=content
+                content=content,
+                timestamp=utcnow()
             )
             session.add(message)
             session.commit()
-            return MessageInfo(
+            result = MessageInfo(
                 id=message.id,
                 user_id=message.user_id,
                 chatroom_id=message.chatroom_id,
                 tenant_id=tenant_id,
                 timestamp=message.timestamp,
                 content=message.content
-            ), None
+            )
+            message_broadcaster.publish(tenant_id, chatroom_id, encode_cursor(result.timestamp, result.id), result.to_dict())
+            return result, None
         except Exception as e:
             session.rollback()
             return None, str(e)
@@ -89,20 +281,128 @@ class MessageService:
             session.close()
 
     @staticmethod
-    def get_messages(tenant_id, chatroom_id, page, per_page, sort_by, sort_order, start_date=None, end_date=None, search=None):
+    def send_messages(tenant_id, chatroom_id, messages):
+        """
+        Insert a batch of messages in one transaction. Invalid items are reported
+        in the per-item results and do not stop the others.
+        """
         session = TenantService.get_tenant_session(tenant_id)
         if not session:
             return None, "Tenant not found"
 
         try:
-            query = session.query(Message).filter_by(chatroom_id=chatroom_id)
+            if session.query(Chatroom.id).filter_by(id=chatroom_id).first() is None:
+                return None, "Chatroom not found"
+            user_ids = {item.get('user_id') for item in messages
+                        if isinstance(item, dict) and isinstance(item.get('user_id'), int)}
+            known_users = {row.id for chunk in chunked(user_ids)
+                           for row in session.query(User.id).filter(User.id.in_(chunk))}
+
+            rows, results = _validate_bulk_messages(chatroom_id, messages, known_users)
+            if rows:
+                session.execute(Message.__table__.insert(), rows)
+                session.commit()
+
+            for result in results:
+                row = result.pop('row', None)
+                if row is not None:
+                    result['message'] = MessageInfo(tenant_id=tenant_id, **row)
+                    message_broadcaster.publish(tenant_id, chatroom_id, encode_cursor(row['timestamp'], row['id']),
+                                                result['message'].to_dict())
+            return BulkMessageResult(len(rows), len(messages) - len(rows), results), None
+        except Exception as e:
+            session.rollback()
+            return None, str(e)
+        finally:
+            session.close()
+
+    @staticmethod
+    def search_messages(tenant_id, term, chatroom_id=None, page=1, per_page=20):
+        """
+        Ranked full-text search over one chatroom or the whole tenant, with a
+        highlighted snippet per hit. Falls back to an unranked LIKE scan when
+        SQLite has no FTS5.
+        """
+        match = fts_query(term, chatroom_id)
+        if not match:
+            return None, "Search term must contain at least one word"
+        session = TenantService.get_tenant_session(tenant_id)
+        if not session:
+            return None, "Tenant not found"
+
+        try:
+            if not fts5_supported():
+                query = session.query(Message).filter(Message.content.ilike(f'%{term}%'))
+                if chatroom_id is not None:
+                    query = query.filter(Message.chatroom_id == chatroom_id)
+                total = query.count()
+                messages = query.order_by(Message.timestamp.desc()).offset((page - 1) * per_page).limit(per_page).all()
+                results = [dict(MessageInfo(m.id, m.user_id, m.chatroom_id, tenant_id, m.timestamp, m.content).to_dict(),
+                                snippet=None, rank=None) for m in messages]
+                return MessageSearchPage(total, page, per_page, results), None
 
-            if start_date:
-                query = query.filter(Message.timestamp >= datetime.fromisoformat(start_date))
-            if end_date:
-                query = query.filter(Message.timestamp <= datetime.fromisoformat(end_date))
-            if search:
-                query = query.filter(Message.content.ilike(f'%{search}%'))
+            params = {
+                'query': match,
+                'mark_start': Config.SEARCH_MARK_START,
+                'mark_end': Config.SEARCH_MARK_END,
+                'snippet_tokens': Config.SEARCH_SNIPPET_TOKENS,
+                'limit': per_page,
+                'offset': (page - 1) * per_page
+            }
+            total = session.execute(text(COUNT_SQL), params).scalar()
+            rows = session.execute(text(SEARCH_SQL), params).mappings().all()
+            results = []
+            for row in rows:
+                timestamp = row['timestamp']
+                results.append({
+                    'id': row['id'],
+                    'user_id': row['user_id'],
+                    'chatroom_id': row['chatroom_id'],
+                    'tenant_id': tenant_id,
+                    'timestamp': datetime.fromisoformat(timestamp).isoformat() if timestamp else None,
+                    'content': row['content'],
+                    'snippet': row['snippet'],
+                    'rank': row['rank']
+                })
+            return MessageSearchPage(total, page, per_page, results), None
+        except Exception as e:
+            return None, str(e)
+        finally:
+            session.close()
+
+    @staticmethod
+    def enqueue_message(tenant_id, chatroom_id, user_id, content):
+        """
+        Buffer a message for the next group commit. Returns the message, a Future
+        resolved with the written row, and an error. The returned timestamp is
+        provisional: the writer stamps the stored one at the commit.
+        """
+        engine = tenant_registry.get_engine(tenant_id)
+        if engine is None:
+            return None, None, "Tenant not found"
+        if not user_id or not content:
+            return None, None, "user_id and content are required"
+
+        row = {
+            'id': str(uuid.uuid4()),
+            'user_id': user_id,
+            'chatroom_id': chatroom_id,
+            'content': content,
+            'timestamp': utcnow()
+        }
+        future = message_ingest.submit(tenant_id, engine, row, wait=Config.MESSAGE_INGEST_MODE == 'durable')
+        return MessageInfo(tenant_id=tenant_id, **row), future, None
+
+    @staticmethod
+    def get_messages(tenant_id, chatroom_id, page, per_page, sort_by, sort_order, start_date=None, end_date=None, search=None,
+                     include_total=True, match=None):
+        session = TenantService.get_tenant_session(tenant_id)
+        if not session:
+            return None, "Tenant not found"
+
+        try:
+            query = session.query(Message).filter_by(chatroom_id=chatroom_id)
+            query = _filter_messages(query, start_date, end_date, search, chatroom_id, match)
 
             if sort_by == 'timestamp':
                 sort_column = Message.timestamp
@@ -116,13 +416,14 @@ class MessageService:
             else:
                 query = query.order_by(sort_column.desc())
 
-            total = query.count()
-            messages = query.offset((page - 1) * per_page).limit(per_page).all()
+            count = _room_message_count(session, chatroom_id, start_date, end_date, search, match)
+            messages, total, has_more = fetch_page(query, page, per_page, include_total, count)
 
             return MessageList(
                 total_count=total,
-                total_pages=(total + per_page - 1) // per_page,
+                total_pages=total_pages(total, per_page),
                 current_page=page,
+                has_more=has_more,
                 messages=[MessageInfo(
                     id=str(message.id),
                     user_id=message.user_id,
@@ -138,13 +439,66 @@ class MessageService:
             session.close()
 
     @staticmethod
-    def get_user_messages(tenant_id, user_id, page, per_page, sort_by, sort_order):
+    def get_messages_by_cursor(tenant_id, chatroom_id, per_page, before=None, after=None, sort_order='desc',
+                               include_total=False, start_date=None, end_date=None, search=None, match=None):
+        session = TenantService.get_tenant_session(tenant_id)
+        if not session:
+            return None, "Tenant not found"
+
+        try:
+            base_query = session.query(Message).filter_by(chatroom_id=chatroom_id)
+            base_query = _filter_messages(base_query, start_date, end_date, search, chatroom_id, match)
+
+            if after:
+                older, cursor = False, after
+            elif before:
+                older, cursor = True, before
+            else:
+                older, cursor = sort_order != 'asc', None
+
+            query = base_query
+            if cursor:
+                timestamp, message_id = decode_cursor(cursor)
+                query = query.filter(keyset_filter(timestamp, message_id, older))
+            if older:
+                query = query.order_by(Message.timestamp.desc(), Message.id.desc())
+            else:
+                query = query.order_by(Message.timestamp.asc(), Message.id.asc())
+
+            messages = query.limit(per_page + 1).all()
+            has_more = len(messages) > per_page
+            messages = messages[:per_page]
+            next_cursor = encode_cursor(messages[-1].timestamp, messages[-1].id) if messages else cursor
+            count = _room_message_count(session, chatroom_id, start_date, end_date, search, match)
+
+            return MessageCursorPage(
+                messages=[MessageInfo(
+                    id=str(message.id),
+                    user_id=message.user_id,
+                    chatroom_id=message.chatroom_id,
+                    tenant_id=tenant_id,
+                    timestamp=message.timestamp,
+                    content=message.content
+                ) for message in messages],
+                next_cursor=next_cursor,
+                has_more=has_more,
+                total_count=(count() if count else base_query.count()) if include_total else None
+            ), None
+        except Exception as e:
+            return None, str(e)
+        finally:
+            session.close()
+
+    @staticmethod
+    def get_user_messages(tenant_id, user_id, page, per_page, sort_by, sort_order, include_total=True):
         session = TenantService.get_tenant_session(tenant_id)
         if not session:
             return None, "Tenant not found"
 
         try:
-            query = session.query(Message).filter_by(user_id=user_id)
+            query = session.query(Message, Chatroom.name.label('chatroom_name')) \
+                .outerjoin(Chatroom, Chatroom.id == Message.chatroom_id) \
+                .filter(Message.user_id == user_id)
 
             if sort_by == 'timestamp':
                 sort_column = Message.timestamp
@@ -154,25 +508,26 @@ class MessageService:
                 sort_column = Message.timestamp
 
             if sort_order == 'asc':
-                query = query.order_by(sort_column.asc())
+                query = query.order_by(sort_column.asc(), Message.timestamp.asc())
             else:
-                query = query.order_by(sort_column.desc())
+                query = query.order_by(sort_column.desc(), Message.timestamp.desc())
 
-            total = query.count()
-            messages = query.offset((page - 1) * per_page).limit(per_page).all()
+            rows, total, has_more = fetch_page(query, page, per_page, include_total,
+                                               count=lambda: stored_count(session, USER_MESSAGES, user_id))
 
             return MessageList(
                 total_count=total,
-                total_pages=(total + per_page - 1) // per_page,
+                total_pages=total_pages(total, per_page),
                 current_page=page,
+                has_more=has_more,
                 messages=[UserMessageInfo(
                     id=str(message.id),
                     chatroom_id=message.chatroom_id,
-                    chatroom_name=session.query(Chatroom).get(message.chatroom_id).name,
+                    chatroom_name=chatroom_name,
                     tenant_id=tenant_id,
                     timestamp=message.timestamp,
                     content=message.content
-                ) for message in messages]
+                ) for message, chatroom_name in rows]
             ), None
         except Exception as e:
             return None, str(e)
@@ -1,10 +1,26 @@
+import logging
 import os
 from flask import Flask
-from sqlalchemy import create_engine, inspect
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import create_engine, inspect, text
 from app.models import Tenant, User, Chatroom, ChatroomUser, Message
 from app.extensions import db
 from app.config import Config
+from app.utils.tenant_registry import TenantEngineRegistry
+from app.utils.sqlite_pragmas import apply_sqlite_pragmas, pragmas_for_tenant
+from app.utils.fts import ensure_message_fts, FTS_TABLE
+from app.utils.counters import ensure_counters, COUNTER_TABLE
+from app.authentication.auth import credential_cache
+
+logger = logging.getLogger(__name__)
+
+
+def _open_tenant_engine(tenant_id):
+    tenant = Tenant.query.get(tenant_id)
+    if not tenant:
+        return None
+    db_path = os.path.join(Config.TENANT_DATABASE_DIR, f"{tenant.id}.db")
+    pragmas = pragmas_for_tenant(Config.SQLITE_PRAGMAS, Config.SQLITE_TENANT_PRAGMAS, tenant.id)
+    return apply_sqlite_pragmas(create_engine(f"sqlite:///{db_path}"), pragmas)
 
 
 class TenantService:
@@ -14,12 +30,10 @@ class TenantService:
             new_tenant = Tenant(name=name, db_name=db_name,password=password)
             db.session.add(new_tenant)
             db.session.commit()
+            credential_cache.invalidate(name)
 
-            db_path = os.path.join(Config.TENANT_DATABASE_DIR, f"{new_tenant.id}.db")
-            os.makedirs(os.path.dirname(db_path), exist_ok=True)
-
-            engine = create_engine(f"sqlite:///{db_path}")
-            TenantService.create_tables(engine)
+            os.makedirs(Config.TENANT_DATABASE_DIR, exist_ok=True)
+            tenant_registry.get_session_factory(new_tenant.id)
 
             return new_tenant, None
         except Exception as e:
@@ -28,20 +42,63 @@ class TenantService:
 
     @staticmethod
     def get_tenant_session(tenant_id):
-        tenant = Tenant.query.get(tenant_id)
-        if not tenant:
+        Session = tenant_registry.get_session_factory(tenant_id)
+        if not Session:
             return None
-
-        db_path = os.path.join(Config.TENANT_DATABASE_DIR, f"{tenant.id}.db")
-        engine = create_engine(f"sqlite:///{db_path}")
-        TenantService.create_tables(engine)
-        Session = sessionmaker(bind=engine)
         return Session()
 
     @staticmethod
-    def create_tables(engine):
+    def get_engine_stats():
+        return tenant_registry.stats()
+
+    @staticmethod
+    def create_tables(engine, deduplicate=False):
         inspector = inspect(engine)
         tables = [User.__table__, Chatroom.__table__, ChatroomUser.__table__, Message.__table__]
+        created = []
         for table in tables:
             if not inspector.has_table(table.name):
-                table.create(engine)
\ No newline at end of file
+                table.create(engine)
+                continue
+            existing = {index['name'] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing and TenantService.create_index(engine, index, deduplicate):
+                    created.append(index.name)
+        if ensure_message_fts(engine):
+            created.append(FTS_TABLE)
+        if ensure_counters(engine):
+            created.append(COUNTER_TABLE)
+        return created
+
+    @staticmethod
+    def create_index(engine, index, deduplicate=False):
+        """
+        Create a missing index and return whether it was created. Older tenant
+        databases may hold duplicate rows that would make a unique index fail:
+        the index is then skipped with a warning, unless deduplicate is set to
+        keep only the earliest row of each duplicate group. Only the
+        upgrade_tenant_schema migration deletes rows.
+        """
+        with engine.begin() as connection:
+            if index.unique:
+                table = index.table.name
+                columns = ', '.join(column.name for column in index.columns)
+                duplicates = (f"FROM {table} WHERE rowid NOT IN "
+                              f"(SELECT MIN(rowid) FROM {table} GROUP BY {columns})")
+                count = connection.execute(text(f"SELECT COUNT(*) {duplicates}")).scalar()
+                if count and not deduplicate:
+                    logger.warning(f"Skipped unique index {index.name} on {engine.url.database}: {count} duplicate "
+                                   f"{table} rows; run migrations/upgrade_tenant_schema.py to remove them")
+                    return False
+                if count:
+                    connection.execute(text(f"DELETE {duplicates}"))
+                    logger.warning(f"Deleted {count} duplicate {table} rows from {engine.url.database}")
+            index.create(connection)
+        return True
+
+
+tenant_registry = TenantEngineRegistry(
+    open_engine=_open_tenant_engine,
+    prepare_engine=TenantService.create_tables,
+    capacity=Config.TENANT_ENGINE_CACHE_SIZE
+)
@@ -3,7 +3,47 @@ from ..extensions import db
 from typing import List, Optional
 import datetime 
 from app.services.tenant import TenantService
-import math
+from app.utils.db import chunked, fetch_page, total_pages
+from app.utils.counters import stored_count, USERS
+from app.utils.response_cache import response_cache
+
+
+UNIQUE_USER_FIELDS = ('username', 'email', 'mobile')
+
+
+def _validate_bulk_users(users, taken):
+    """
+    Check each bulk user item against the values already stored (``taken``,
+    keyed by field) and the items before it. Returns (index, user data) pairs
+    to insert and per-item results for the rejected ones.
+    """
+    seen = {field: set() for field in UNIQUE_USER_FIELDS}
+    valid, results = [], []
+    for index, item in enumerate(users):
+        error = None
+        if not isinstance(item, dict):
+            error = "Each user must be an object"
+        else:
+            missing = [field for field in ('username', 'email', 'password')
+                       if not isinstance(item.get(field), str) or not item[field].strip()]
+            if missing:
+                error = f"{', '.join(missing)} required"
+            elif item.get('mobile') is not None and not isinstance(item['mobile'], str):
+                error = "mobile must be a string"
+            else:
+                for field in UNIQUE_USER_FIELDS:
+                    value = item.get(field)
+                    if value is not None and (value in taken[field] or value in seen[field]):
+                        error = f"{field} already exists"
+                        break
+        if error:
+            results.append({'index': index, 'status': 'error', 'error': error})
+            continue
+        for field in UNIQUE_USER_FIELDS:
+            if item.get(field) is not None:
+                seen[field].add(item[field])
+        valid.append((index, {field: item.get(field) for field in ('username', 'email', 'password', 'mobile')}))
+    return valid, results
 
 
 class UserInfo:
@@ -60,7 +100,42 @@ class UserService:
     
 
     @staticmethod
-    def get_users(tenant_id, page, per_page, sort_by, sort_order):
+    def create_users(tenant_id, users):
+        """
+        Create a batch of users in one transaction. Uniqueness of username, email
+        and mobile is checked up front with chunked IN queries, and rejected items
+        are reported per row without stopping the others.
+        """
+        session = TenantService.get_tenant_session(tenant_id)
+        if not session:
+            return None, "Tenant not found"
+
+        try:
+            taken = {}
+            for field in UNIQUE_USER_FIELDS:
+                column = getattr(User, field)
+                values = {item.get(field) for item in users if isinstance(item, dict) and isinstance(item.get(field), str)}
+                taken[field] = {row[0] for chunk in chunked(values)
+                                for row in session.query(column).filter(column.in_(chunk))}
+
+            valid, results = _validate_bulk_users(users, taken)
+            new_users = [User(**data) for _, data in valid]
+            session.add_all(new_users)
+            session.flush()
+
+            for (index, _), new_user in zip(valid, new_users):
+                results.append({'index': index, 'status': 'created', 'user': new_user.to_dict()})
+            results.sort(key=lambda result: result['index'])
+            session.commit()
+            return {'created': len(new_users), 'failed': len(users) - len(new_users), 'results': results}, None
+        except Exception as e:
+            session.rollback()
+            return None, str(e)
+        finally:
+            session.close()
+
+    @staticmethod
+    def get_users(tenant_id, page, per_page, sort_by, sort_order, include_total=True):
         session = TenantService.get_tenant_session(tenant_id)
         if not session:
             return None, "Tenant not found"
@@ -71,18 +146,16 @@ class UserService:
                 query = query.order_by((getattr(User, sort_by)))
             else:
                 query = query.order_by(getattr(User, sort_by))
-            total = query.count()
-            pages = math.ceil(total / per_page)
-            query = query.offset((page - 1) * per_page).limit(per_page)
-            
-            users = query.all()
-            
+            users, total, has_more = fetch_page(query, page, per_page, include_total,
+                                                count=lambda: stored_count(session, USERS))
+
             return {
                 'items': [user.to_dict() for user in users],
                 'total': total,
                 'page': page,
-                'pages': pages,
-                'per_page': per_page
+                'pages': total_pages(total, per_page),
+                'per_page': per_page,
+                'has_more': has_more
             }, None
         except Exception as e:
             return None, str(e)
@@ -115,6 +188,7 @@ class UserService:
                 for key, value in data.items():
                     setattr(user, key, value)
                 session.commit()
+                response_cache.invalidate(tenant_id, f'user:{user_id}')
                 return user.to_dict(), None
             return None, None
         except Exception as e:
@@ -133,6 +207,7 @@ class UserService:
             if user:
                 session.delete(user)
                 session.commit()
+                response_cache.invalidate(tenant_id, f'user:{user_id}')
                 return True, None
             return False, None
         except Exception as e:
@@ -0,0 +1,69 @@
+import json
+import queue
+import threading
+
+
+class Subscriber:
+    def __init__(self, key, queue_size):
+        self.key = key
+        self.queue = queue.Queue(maxsize=queue_size)
+
+    def get(self, timeout):
+        """Next (event_id, message_id, data) tuple, or None once dropped as too slow."""
+        return self.queue.get(timeout=timeout)
+
+
+class MessageBroadcaster:
+    """In-process broadcaster feeding the Server-Sent Events streams.
+
+    Each stream has a bounded queue; a stream that cannot keep up is dropped
+    and the client reconnects with Last-Event-ID to resume from the database.
+    """
+
+    def __init__(self, queue_size):
+        self.queue_size = queue_size
+        self._rooms = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, tenant_id, chatroom_id):
+        subscriber = Subscriber((tenant_id, chatroom_id), self.queue_size)
+        with self._lock:
+            self._rooms.setdefault(subscriber.key, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            subscribers = self._rooms.get(subscriber.key)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._rooms[subscriber.key]
+
+    def publish(self, tenant_id, chatroom_id, event_id, message):
+        key = (tenant_id, chatroom_id)
+        with self._lock:
+            subscribers = list(self._rooms.get(key, ()))
+        if not subscribers:
+            return
+        event = (event_id, message['id'], json.dumps(message))
+        for subscriber in subscribers:
+            try:
+                subscriber.queue.put_nowait(event)
+            except queue.Full:
+                self._drop(subscriber)
+
+    def _drop(self, subscriber):
+        self.unsubscribe(subscriber)
+        try:
+            while True:
+                subscriber.queue.get_nowait()
+        except queue.Empty:
+            pass
+        subscriber.queue.put_nowait(None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'rooms': len(self._rooms),
+                'subscribers': sum(len(subscribers) for subscribers in self._rooms.values())
+            }
@@ -5,4 +5,30 @@ from app.config import Config
 def bind_db_for_tenant(tenant):
     db_uri = Config.get_tenant_db_uri(tenant.name)
     current_app.config['SQLALCHEMY_BINDS'] = {tenant.name: db_uri}
-    db.get_engine(current_app, bind=tenant.name)
\ No newline at end of file
+    db.get_engine(current_app, bind=tenant.name)
+
+
+def chunked(values, size=500):
+    """Split values into lists small enough for SQLite's bound parameter limit."""
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def fetch_page(query, page, per_page, include_total=True, count=None):
+    """
+    Fetch one offset page of query and tell whether another page follows.
+
+    The total comes from count, a callable returning a maintained row count,
+    when the query is unfiltered, from COUNT(*) over the query otherwise, and
+    is None when include_total is False. Returns (rows, total, has_more).
+    """
+    rows = query.offset((page - 1) * per_page).limit(per_page + 1).all()
+    total = None
+    if include_total:
+        total = count() if count else query.count()
+    return rows[:per_page], total, len(rows) > per_page
+
+
+def total_pages(total, per_page):
+    return (total + per_page - 1) // per_page if total is not None else None
@@ -0,0 +1,103 @@
+import functools
+import logging
+import re
+import sqlite3
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+# External-content FTS5 index over message.content, keyed by the message rowid.
+# chatroom_id is indexed as well so that a room filter is resolved inside the
+# index instead of ranking every match in the tenant. The triggers keep it in
+# step with every insert, update and delete on message. VACUUM may renumber the
+# rowids of message, so run rebuild_message_fts after one.
+FTS_TABLE = 'message_fts'
+
+FTS_DDL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "content, chatroom_id, content='message', content_rowid='rowid', tokenize='unicode61 remove_diacritics 2')",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON message BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, content, chatroom_id) VALUES (new.rowid, new.content, new.chatroom_id); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON message BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, content, chatroom_id) "
+    "VALUES ('delete', old.rowid, old.content, old.chatroom_id); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF content, chatroom_id ON message BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, content, chatroom_id) "
+    "VALUES ('delete', old.rowid, old.content, old.chatroom_id); "
+    f"INSERT INTO {FTS_TABLE}(rowid, content, chatroom_id) VALUES (new.rowid, new.content, new.chatroom_id); END",
+]
+
+# bm25 weights the content column only; chatroom_id is there for filtering
+SEARCH_SQL = (
+    "SELECT message.id, message.user_id, message.chatroom_id, message.content, message.timestamp, "
+    f"snippet({FTS_TABLE}, 0, :mark_start, :mark_end, '…', :snippet_tokens) AS snippet, "
+    f"bm25({FTS_TABLE}, 1.0, 0.0) AS rank "
+    f"FROM {FTS_TABLE} JOIN message ON message.rowid = {FTS_TABLE}.rowid "
+    f"WHERE {FTS_TABLE} MATCH :query "
+    "ORDER BY rank LIMIT :limit OFFSET :offset"
+)
+
+COUNT_SQL = f"SELECT COUNT(*) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :query"
+
+_TOKEN = re.compile(r'\w+', re.UNICODE)
+
+
+@functools.lru_cache(maxsize=None)
+def fts5_supported():
+    """Whether the linked SQLite library was compiled with FTS5."""
+    try:
+        connection = sqlite3.connect(':memory:')
+        connection.execute("CREATE VIRTUAL TABLE probe USING fts5(x)")
+        connection.close()
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+def fts_query(term, chatroom_id=None):
+    """Turn free text into an FTS5 query: every word must match the content as
+    a prefix, optionally within one chatroom.
+
+    Words are quoted so that user input can never be parsed as FTS5 syntax.
+    Returns None when the text has no searchable words.
+    """
+    tokens = _TOKEN.findall(term or '')
+    if not tokens:
+        return None
+    query = 'content : (' + ' '.join(f'"{token}"*' for token in tokens) + ')'
+    if chatroom_id is not None:
+        query += f' AND chatroom_id : "{int(chatroom_id)}"'
+    return query
+
+
+def message_fts_exists(connection):
+    return connection.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': FTS_TABLE}
+    ).first() is not None
+
+
+def ensure_message_fts(engine):
+    """Create the message search index and its triggers if missing.
+
+    A newly created index is backfilled from existing messages. Returns True
+    when the index was created.
+    """
+    if not fts5_supported():
+        logger.warning("SQLite was built without FTS5; message search falls back to LIKE")
+        return False
+    with engine.begin() as connection:
+        if message_fts_exists(connection):
+            return False
+        for statement in FTS_DDL:
+            connection.execute(text(statement))
+        connection.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+    return True
+
+
+def rebuild_message_fts(engine):
+    """Recreate the triggers and rebuild the whole index from the message table."""
+    with engine.begin() as connection:
+        for statement in FTS_DDL:
+            connection.execute(text(statement))
+        connection.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+        connection.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')"))
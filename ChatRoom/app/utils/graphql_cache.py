@@ -0,0 +1,139 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from functools import partial
+from graphql.backend.base import GraphQLDocument
+from graphql.backend.core import GraphQLCoreBackend, execute_and_validate
+from graphql.execution import ExecutionResult
+from graphql.language.parser import parse
+from graphql.validation import validate
+
+
+def query_hash(query):
+    return hashlib.sha256(query.encode('utf-8')).hexdigest()
+
+
+class PersistedQueryError(Exception):
+    def __init__(self, message, code):
+        super().__init__(message)
+        self.code = code
+
+    def as_dict(self):
+        return {'message': str(self), 'extensions': {'code': self.code}}
+
+
+class CachedDocument:
+    def __init__(self, query, document, errors):
+        self.query = query
+        self.document = document
+        self.errors = errors
+
+
+class DocumentCache:
+    """LRU of parsed and validated GraphQL documents for one schema.
+
+    Entries are keyed by the SHA-256 of the query text, which is also the
+    automatic persisted query hash, so the cache doubles as the persisted
+    query store. Documents with syntax errors are not cached.
+    """
+
+    def __init__(self, schema, max_entries):
+        self.schema = schema
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def lookup(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def document(self, query, key=None):
+        key = key or query_hash(query)
+        entry = self.lookup(key)
+        if entry is not None:
+            return entry
+        document = parse(query)
+        entry = CachedDocument(query, document, validate(self.schema, document))
+        if self.max_entries > 0:
+            with self._lock:
+                self._entries[key] = entry
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+
+def resolve_persisted_query(cache, data, query_data):
+    """Fill in the query of an automatic persisted query request.
+
+    A request carrying extensions.persistedQuery.sha256Hash without a query
+    is answered from the cache, or fails with PERSISTED_QUERY_NOT_FOUND so
+    the client resends the full query. A request with both registers the
+    query once the hash is checked. Returns the request data to execute.
+    """
+    extensions = data.get('extensions') or query_data.get('extensions')
+    if isinstance(extensions, str):
+        try:
+            extensions = json.loads(extensions)
+        except ValueError:
+            raise PersistedQueryError("Extensions are not valid JSON", 'BAD_REQUEST')
+    persisted = (extensions or {}).get('persistedQuery') if isinstance(extensions, dict) else None
+    if not persisted:
+        return data
+    if persisted.get('version') != 1:
+        raise PersistedQueryError("Unsupported persisted query version", 'PERSISTED_QUERY_NOT_SUPPORTED')
+    key = persisted.get('sha256Hash')
+    query = data.get('query') or query_data.get('query')
+    if query:
+        if query_hash(query) != key:
+            raise PersistedQueryError("Provided sha256Hash does not match the query", 'PERSISTED_QUERY_HASH_MISMATCH')
+        return data
+    entry = cache.lookup(key) if isinstance(key, str) else None
+    if entry is None:
+        raise PersistedQueryError("PersistedQueryNotFound", 'PERSISTED_QUERY_NOT_FOUND')
+    return dict(data, query=entry.query)
+
+
+class CachedDocumentBackend(GraphQLCoreBackend):
+    """GraphQLCoreBackend that takes documents from a DocumentCache.
+
+    The cache validates each document once, so execution skips validation.
+    """
+
+    def __init__(self, cache, executor=None):
+        super().__init__(executor)
+        self.cache = cache
+
+    def document_from_string(self, schema, document_string):
+        if schema is not self.cache.schema or not isinstance(document_string, str):
+            return super().document_from_string(schema, document_string)
+        entry = self.cache.document(document_string)
+        if entry.errors:
+            def execute(*args, **kwargs):
+                return ExecutionResult(errors=entry.errors, invalid=True)
+        else:
+            execute = partial(execute_and_validate, schema, entry.document, validate=False, **self.execute_params)
+        return GraphQLDocument(schema=schema, document_string=document_string, document_ast=entry.document,
+                               execute=execute)
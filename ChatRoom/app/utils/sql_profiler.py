@@ -0,0 +1,140 @@
+import logging
+import os
+import time
+from contextvars import ContextVar
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app.config import Config
+
+PROFILE_HEADER = 'X-SQL-Profile'
+EXPLAINABLE = ('select', 'insert', 'update', 'delete', 'with')
+
+sql_profile_logger = logging.getLogger('sql_profile_logger')
+_current_profile = ContextVar('sql_profile', default=None)
+
+
+class RequestProfile:
+    """Statements one request ran. route is the route template, or a callable
+    returning it for frameworks that only route once the request is under way."""
+
+    def __init__(self, route, record=False, requested=False):
+        self.route = route
+        self.record = record
+        self.requested = requested
+        self.statements = []
+
+    def route_name(self):
+        return self.route() if callable(self.route) else self.route
+
+    def duration_ms(self):
+        return sum(statement['duration_ms'] for statement in self.statements)
+
+
+def start_profile(route, requested=False):
+    """Make a profile current for this request; returns the token for end_profile.
+
+    Statements are recorded when SQL_PROFILING is on or the client sent the
+    profiling header; otherwise the profile only names the route in the slow
+    query log.
+    """
+    return _current_profile.set(RequestProfile(route, Config.SQL_PROFILING or requested, requested))
+
+
+def end_profile(token):
+    _current_profile.reset(token)
+
+
+def current_profile():
+    return _current_profile.get()
+
+
+def report_profile(profile, tenant_id):
+    """Log a recorded profile and return the Server-Timing header value for it.
+
+    The header is only returned to tenants listed in SQL_PROFILE_TENANTS that
+    asked for it; for anyone else a profile is logged only when SQL_PROFILING
+    is on. Returns None when nothing should be added to the response.
+    """
+    if profile is None or not profile.record:
+        return None
+    allowed = profile.requested and tenant_id in Config.SQL_PROFILE_TENANTS
+    if not (allowed or Config.SQL_PROFILING):
+        return None
+    duration_ms = round(profile.duration_ms(), 3)
+    sql_profile_logger.info('request', extra={'access': {
+        'event': 'request',
+        'route': profile.route_name(),
+        'tenant_id': tenant_id,
+        'statement_count': len(profile.statements),
+        'duration_ms': duration_ms,
+        'statements': profile.statements
+    }})
+    if not allowed:
+        return None
+    return f'sql;dur={duration_ms};desc="{len(profile.statements)} statements"'
+
+
+def _database(conn):
+    return os.path.basename(conn.engine.url.database or '') or 'memory'
+
+
+def explain(conn, statement, parameters):
+    """EXPLAIN QUERY PLAN rows for a statement, run on the raw DBAPI cursor so
+    the profiler does not see its own queries."""
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute(f'EXPLAIN QUERY PLAN {statement}', parameters)
+        return [row[-1] for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+
+def _log_slow_query(conn, statement, parameters, executemany, duration_ms, profile):
+    plan = None
+    if not executemany and statement.lstrip()[:6].lower().startswith(EXPLAINABLE):
+        try:
+            plan = explain(conn, statement, parameters)
+        except Exception as e:
+            plan = [f'EXPLAIN failed: {e}']
+    sql_profile_logger.warning('slow query', extra={'access': {
+        'event': 'slow_query',
+        'route': profile.route_name() if profile else None,
+        'database': _database(conn),
+        'duration_ms': duration_ms,
+        'statement': statement[:Config.SQL_LOG_STATEMENT_CHARS],
+        'plan': plan
+    }})
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('profile_query_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('profile_query_started')
+    if not started:
+        return
+    duration_ms = round((time.perf_counter() - started.pop()) * 1000, 3)
+    profile = _current_profile.get()
+    if profile is not None and profile.record:
+        profile.statements.append({
+            'database': _database(conn),
+            'duration_ms': duration_ms,
+            'statement': statement[:Config.SQL_LOG_STATEMENT_CHARS]
+        })
+    if Config.SQL_SLOW_QUERY_MS and duration_ms >= Config.SQL_SLOW_QUERY_MS:
+        _log_slow_query(conn, statement, parameters, executemany, duration_ms, profile)
+
+
+def _handle_error(context):
+    started = context.connection.info.get('profile_query_started') if context.connection is not None else None
+    if started:
+        started.pop()
+
+
+def instrument_sql_profiling():
+    """Attach the profiler to every SQLAlchemy engine in the process."""
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_error)
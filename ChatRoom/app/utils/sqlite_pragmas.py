@@ -0,0 +1,36 @@
+import re
+from sqlalchemy import event
+
+_PRAGMA_NAME = re.compile(r'^[a-z_]+$')
+_PRAGMA_VALUE = re.compile(r'^-?\w+$')
+
+
+def pragmas_for_tenant(defaults, overrides, tenant_id):
+    """Merge the default profile with the overrides configured for one tenant."""
+    pragmas = dict(defaults)
+    pragmas.update(overrides.get(str(tenant_id), {}))
+    return pragmas
+
+
+def apply_sqlite_pragmas(engine, pragmas):
+    """Run ``PRAGMA name=value`` on every new DBAPI connection of ``engine``.
+
+    Pragmas set to ``None`` are skipped, so a tenant override can fall back
+    to SQLite's own default.
+    """
+    statements = []
+    for name, value in pragmas.items():
+        if value is None:
+            continue
+        if not _PRAGMA_NAME.match(name) or not _PRAGMA_VALUE.match(str(value)):
+            raise ValueError(f"Invalid SQLite pragma {name}={value!r}")
+        statements.append(f"PRAGMA {name}={value}")
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for statement in statements:
+            cursor.execute(statement)
+        cursor.close()
+
+    return engine
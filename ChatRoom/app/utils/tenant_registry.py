@@ -0,0 +1,92 @@
+import threading
+from collections import OrderedDict
+from sqlalchemy.orm import sessionmaker
+
+
+class TenantEngineRegistry:
+    """Process-wide cache of one engine and sessionmaker per tenant.
+
+    Engines are kept in least-recently-used order and the oldest one is
+    disposed once more than ``capacity`` tenants are open. Schema checks run
+    the first time a tenant is opened in this process and are not repeated
+    when an evicted tenant is opened again.
+    """
+
+    def __init__(self, open_engine, prepare_engine, capacity):
+        self.open_engine = open_engine
+        self.prepare_engine = prepare_engine
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._prepared = set()
+        self._lock = threading.Lock()
+        self._open_lock = threading.Lock()
+
+    def get_session_factory(self, tenant_id):
+        with self._lock:
+            entry = self._entries.get(tenant_id)
+            if entry is not None:
+                self._entries.move_to_end(tenant_id)
+                self.hits += 1
+                return entry[1]
+
+        with self._open_lock:
+            with self._lock:
+                entry = self._entries.get(tenant_id)
+                if entry is not None:
+                    self._entries.move_to_end(tenant_id)
+                    self.hits += 1
+                    return entry[1]
+                self.misses += 1
+
+            engine = self.open_engine(tenant_id)
+            if engine is None:
+                return None
+            if tenant_id not in self._prepared:
+                self.prepare_engine(engine)
+                self._prepared.add(tenant_id)
+
+            session_factory = sessionmaker(bind=engine)
+            with self._lock:
+                self._entries[tenant_id] = (engine, session_factory)
+                evicted = []
+                while len(self._entries) > self.capacity:
+                    evicted.append(self._entries.popitem(last=False)[1][0])
+                    self.evictions += 1
+
+        for old_engine in evicted:
+            old_engine.dispose()
+        return session_factory
+
+    def get_engine(self, tenant_id):
+        session_factory = self.get_session_factory(tenant_id)
+        return session_factory.kw['bind'] if session_factory else None
+
+    def discard(self, tenant_id):
+        with self._lock:
+            entry = self._entries.pop(tenant_id, None)
+            self._prepared.discard(tenant_id)
+        if entry is not None:
+            entry[0].dispose()
+
+    def clear(self):
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+            self._prepared.clear()
+        for engine, _ in entries:
+            engine.dispose()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'capacity': self.capacity,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
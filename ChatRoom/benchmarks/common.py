@@ -0,0 +1,200 @@
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import sys
+import threading
+import time
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Benchmarks are run as ``python -m benchmarks.<name>`` from the ChatRoom directory
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+def measure(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def bench(fn, rounds, min_round_seconds=0.0002, warmup=3):
+    """
+    Time fn the way pytest-benchmark does: calls are grouped into rounds of
+    enough iterations to last min_round_seconds, so the fastest functions
+    are not lost in timer overhead, and the statistics are per call
+    """
+    for _ in range(warmup):
+        fn()
+    start = time.perf_counter()
+    fn()
+    single = time.perf_counter() - start
+    iterations = max(1, int(min_round_seconds / single)) if single > 0 else 1000
+
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            fn()
+        samples.append((time.perf_counter() - start) / iterations)
+    ordered = sorted(samples)
+    return {
+        'rounds': rounds,
+        'iterations': iterations,
+        'min_us': round(ordered[0] * 1e6, 3),
+        'median_us': round(statistics.median(ordered) * 1e6, 3),
+        'mean_us': round(statistics.fmean(ordered) * 1e6, 3),
+        'p95_us': round(percentile(ordered, 0.95) * 1e6, 3),
+        'stddev_us': round(statistics.pstdev(ordered) * 1e6, 3),
+        'ops_per_second': round(1 / statistics.median(ordered), 1),
+    }
+
+
+def percentile(sorted_samples, fraction):
+    if not sorted_samples:
+        return 0.0
+    index = min(len(sorted_samples) - 1, int(round(fraction * (len(sorted_samples) - 1))))
+    return sorted_samples[index]
+
+
+def summarize(samples):
+    ordered = sorted(samples)
+    return {
+        'count': len(ordered),
+        'mean_ms': round(sum(ordered) / len(ordered) * 1000, 4) if ordered else 0.0,
+        'p50_ms': round(percentile(ordered, 0.50) * 1000, 4),
+        'p95_ms': round(percentile(ordered, 0.95) * 1000, 4),
+        'p99_ms': round(percentile(ordered, 0.99) * 1000, 4),
+    }
+
+
+def load_summary(samples, errors, elapsed, statements):
+    """Latency percentiles of one load scenario plus its throughput and SQL statements per request."""
+    stats = summarize(samples)
+    stats.update({
+        'errors': errors,
+        'duration_s': round(elapsed, 3),
+        'throughput_rps': round(len(samples) / elapsed, 1) if elapsed else 0.0,
+        'sql_statements': statements,
+        'sql_per_request': round(statements / len(samples), 2) if samples else 0.0,
+    })
+    return stats
+
+
+class StatementCounter:
+    """Counts the SQL statements run on every SQLAlchemy engine in the process."""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+        event.listen(Engine, 'before_cursor_execute', self._count)
+
+    def _count(self, *args):
+        with self._lock:
+            self.count += 1
+
+    def reset(self):
+        with self._lock:
+            self.count = 0
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'sqlite': sqlite3.sqlite_version,
+    }
+
+
+def print_table(title, rows):
+    print(f"\n{title}")
+    for name, stats in rows.items():
+        print(f"  {name:<40} mean {stats['mean_ms']:>10.3f} ms   p95 {stats['p95_ms']:>10.3f} ms")
+
+
+def print_load_table(title, rows):
+    print(f"\n{title}")
+    print(f"  {'scenario':<24} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'SQL/req':>8} {'errors':>7}")
+    for name, stats in rows.items():
+        print(f"  {name:<24} {stats['throughput_rps']:>9.1f} {stats['p50_ms']:>9.3f} {stats['p95_ms']:>9.3f} "
+              f"{stats['p99_ms']:>9.3f} {stats['sql_per_request']:>8.2f} {stats['errors']:>7}")
+
+
+def print_bench_table(title, rows):
+    print(f"\n{title}")
+    print(f"  {'benchmark':<44} {'median us':>11} {'p95 us':>11} {'ops/s':>12} {'rounds':>7}")
+    for name, stats in rows.items():
+        print(f"  {name:<44} {stats['median_us']:>11.3f} {stats['p95_us']:>11.3f} "
+              f"{stats['ops_per_second']:>12.1f} {stats['rounds']:>7}")
+
+
+def compare_to_baseline(results, baseline, threshold):
+    """Median per call against a saved baseline; slower by more than threshold percent is a regression."""
+    comparison = {}
+    for name, stats in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        change = round((stats['median_us'] - before['median_us']) / before['median_us'] * 100, 2)
+        comparison[name] = {
+            'baseline_us': before['median_us'],
+            'current_us': stats['median_us'],
+            'change_pct': change,
+            'regression': change > threshold
+        }
+    return comparison
+
+
+def print_baseline_comparison(comparison, missing):
+    print("\nAgainst the baseline (median per call)")
+    for name, diff in comparison.items():
+        flag = '  REGRESSION' if diff['regression'] else ''
+        print(f"  {name:<44} {diff['baseline_us']:>11.3f} -> {diff['current_us']:>11.3f} us  "
+              f"{diff['change_pct']:>+8.1f}%{flag}")
+    if missing:
+        print(f"  not in the baseline: {', '.join(missing)}")
+
+
+def add_microbench_arguments(parser):
+    parser.add_argument('--rounds', type=int, default=200)
+    parser.add_argument('-k', '--filter', help='only run benchmarks whose name contains this')
+    parser.add_argument('--save-baseline', metavar='PATH', help='save the results as a baseline for later --compare runs')
+    parser.add_argument('--compare', metavar='PATH', help='compare the results with a saved baseline')
+    parser.add_argument('--threshold', type=float, default=10.0,
+                        help='percent slowdown of the median that counts as a regression')
+    parser.add_argument('--fail-on-regression', action='store_true',
+                        help='exit with status 1 when any benchmark regressed against --compare')
+    parser.add_argument('--output')
+
+
+def run_microbenchmarks(app_name, benchmarks, args):
+    """Time the named callables, then save and compare baselines as the arguments ask."""
+    results = {name: bench(fn, args.rounds) for name, fn in benchmarks.items()
+               if not args.filter or args.filter in name}
+    print_bench_table(f"{app_name} microbenchmarks, per call", results)
+    run = {'app': app_name, 'parameters': {'rounds': args.rounds}, 'environment': environment(), 'results': results}
+    write_results(run, args.output)
+    if args.save_baseline:
+        write_results(run, args.save_baseline)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+        comparison = compare_to_baseline(results, baseline, args.threshold)
+        print_baseline_comparison(comparison, sorted(set(results) - set(baseline)))
+        regressions = [name for name, diff in comparison.items() if diff['regression']]
+        if args.fail_on_regression and regressions:
+            print(f"\n{len(regressions)} regressions: {', '.join(regressions)}")
+            sys.exit(1)
+    return results
+
+
+def write_results(results, path):
+    if not path:
+        return
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    print(f"\nResults written to {path}")
@@ -0,0 +1,177 @@
+"""
+In-process load test of the Flask app. Seeds --tenants tenants through the
+service layer, then sends send_message, get_messages, get_users_in_chatroom
+and GraphQL requests through the Flask test client from --concurrency
+threads, each kind alone and as the weighted --mix. Reports throughput,
+p50/p95/p99 latency and SQL statements per request for every scenario.
+
+The JSON written to --output has the same layout as ChatRoomFast's
+benchmarks.load_test, so runs of either app can be diffed with
+ChatRoomFast's benchmarks.compare_runs.
+
+    python -m benchmarks.load_test --tenants 4 --users 50 --rooms 10 --messages 200 --requests 2000 --output flask.json
+"""
+import argparse
+import base64
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import StatementCounter, environment, load_summary, print_load_table, write_results
+from app import create_app
+from app.config import Config
+from app.services.chatroom import ChatroomService
+from app.services.chatroom_user import ChatroomUserService
+from app.services.message import MessageService
+from app.services.tenant import TenantService
+from app.services.user import UserService
+
+REQUEST_KINDS = ('send_message', 'get_messages', 'get_users_in_chatroom', 'graphql')
+SCENARIOS = REQUEST_KINDS + ('mixed',)
+DEFAULT_MIX = 'send_message=20,get_messages=50,get_users_in_chatroom=20,graphql=10'
+PASSWORD = 'load-test'
+GRAPHQL_QUERY = "query User($id: Int!) { user(userId: $id) { id username email } }"
+SEED_BATCH = 1000
+
+
+def parse_mix(value):
+    weights = {}
+    for part in value.split(','):
+        kind, _, weight = part.partition('=')
+        if kind not in REQUEST_KINDS:
+            raise argparse.ArgumentTypeError(f"unknown request kind {kind!r}, expected one of {', '.join(REQUEST_KINDS)}")
+        weights[kind] = float(weight)
+    return weights
+
+
+def basic_auth(name):
+    return {'Authorization': 'Basic ' + base64.b64encode(f'{name}:{PASSWORD}'.encode()).decode()}
+
+
+def seed_tenant(tenant_id, name, args, rng):
+    result, error = UserService.create_users(tenant_id, [
+        {'username': f'user{i}', 'email': f'user{i}@example.com', 'password': PASSWORD, 'mobile': f'+1555{i:07d}'}
+        for i in range(args.users)
+    ])
+    if error:
+        raise RuntimeError(error)
+    users = [item['user']['id'] for item in result['results'] if item['status'] == 'created']
+
+    members = {}
+    for index in range(args.rooms):
+        room, error = ChatroomService.create_chatroom(tenant_id, {'name': f'room {index}', 'description': 'load test'})
+        if error:
+            raise RuntimeError(error)
+        members[room.id] = rng.sample(users, min(args.members, len(users)))
+        ChatroomUserService.add_users_to_chatroom(tenant_id, room.id, [{'user_id': user} for user in members[room.id]])
+        messages = [{'user_id': rng.choice(members[room.id]), 'content': f'seed message {i}'}
+                    for i in range(args.messages)]
+        for start in range(0, len(messages), SEED_BATCH):
+            MessageService.send_messages(tenant_id, room.id, messages[start:start + SEED_BATCH])
+    return {'id': tenant_id, 'headers': basic_auth(name), 'users': users, 'members': members}
+
+
+def seed(app, args, rng):
+    tenants = []
+    with app.app_context():
+        for index in range(args.tenants):
+            name = f'load-{index}'
+            tenant, error = TenantService.create_tenant(name, name, PASSWORD)
+            if error:
+                raise RuntimeError(error)
+            tenants.append(seed_tenant(tenant.id, name, args, rng))
+    return tenants
+
+
+def build_request(kind, tenant, rng):
+    room = rng.choice(list(tenant['members']))
+    user = rng.choice(tenant['members'][room])
+    if kind == 'send_message':
+        return 'POST', f'/api/chatrooms/{room}/messages', {'json': {'user_id': user, 'content': 'load test message'}}
+    if kind == 'get_messages':
+        return 'GET', f'/api/chatrooms/{room}/messages', {'query_string': {'pagesize': 20}}
+    if kind == 'get_users_in_chatroom':
+        return 'GET', f'/api/chatrooms/{room}/users', {'query_string': {'pagesize': 20}}
+    return 'POST', '/graphql', {'json': {'query': GRAPHQL_QUERY, 'variables': {'id': user}}}
+
+
+def plan(scenario, count, tenants, mix, rng):
+    if scenario == 'mixed':
+        kinds = rng.choices(list(mix), weights=list(mix.values()), k=count)
+    else:
+        kinds = [scenario] * count
+    requests = []
+    for kind in kinds:
+        tenant = rng.choice(tenants)
+        method, url, kwargs = build_request(kind, tenant, rng)
+        requests.append((method, url, tenant['headers'], kwargs))
+    return requests
+
+
+def failed(url, response):
+    if response.status_code >= 400:
+        return True
+    return url == '/graphql' and bool(response.get_json().get('errors'))
+
+
+def run_worker(app, requests):
+    client = app.test_client()
+    samples, errors = [], 0
+    for method, url, headers, kwargs in requests:
+        start = time.perf_counter()
+        response = client.open(url, method=method, headers=headers, **kwargs)
+        samples.append(time.perf_counter() - start)
+        errors += failed(url, response)
+    return samples, errors
+
+
+def run_scenario(app, requests, concurrency, counter):
+    counter.reset()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = list(executor.map(lambda worker: run_worker(app, requests[worker::concurrency]), range(concurrency)))
+    elapsed = time.perf_counter() - start
+    samples = [sample for worker_samples, _ in outcomes for sample in worker_samples]
+    return load_summary(samples, sum(errors for _, errors in outcomes), elapsed, counter.count)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tenants', type=int, default=4)
+    parser.add_argument('--users', type=int, default=50, help='users per tenant')
+    parser.add_argument('--rooms', type=int, default=10, help='chatrooms per tenant')
+    parser.add_argument('--members', type=int, default=20, help='members per chatroom')
+    parser.add_argument('--messages', type=int, default=200, help='seeded messages per chatroom')
+    parser.add_argument('--requests', type=int, default=2000, help='requests per scenario')
+    parser.add_argument('--warmup', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f'weights of the mixed scenario (default {DEFAULT_MIX})')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='chatroom-load-')
+    Config.SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(workdir, 'app.db')}"
+    Config.TENANT_DATABASE_DIR = os.path.join(workdir, 'tenants')
+    app = create_app(Config)
+    rng = random.Random(args.seed)
+    tenants = seed(app, args, rng)
+
+    counter = StatementCounter()
+    run_scenario(app, plan('mixed', args.warmup, tenants, args.mix, rng), args.concurrency, counter)
+    results = {}
+    for scenario in args.scenarios:
+        results[scenario] = run_scenario(app, plan(scenario, args.requests, tenants, args.mix, rng), args.concurrency,
+                                         counter)
+
+    print_load_table(f"ChatRoom, {args.tenants} tenants, {args.concurrency} concurrent requests", results)
+    write_results({'app': 'ChatRoom', 'parameters': vars(args), 'environment': environment(),
+                   'scenarios': results}, args.output)
+
+
+if __name__ == '__main__':
+    main()
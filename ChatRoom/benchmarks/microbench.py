@@ -0,0 +1,124 @@
+"""
+Microbenchmarks of the service layer and serialization hot paths, one
+function at a time: tenant session lookup, a message history page at each
+of --depths messages, MessageInfo/ChatroomList serialization, Basic auth
+verification and the GraphQL user resolver.
+
+Save a baseline before a caching or query change and compare against it
+afterwards, on the same machine:
+
+    python -m benchmarks.microbench --save-baseline baseline.json
+    python -m benchmarks.microbench --compare baseline.json --fail-on-regression
+
+benchmarks/microbench_baseline.json is a reference run saved with the
+default arguments. Its environment block records the machine it came from;
+timings from another machine are only comparable by their ratios.
+"""
+import argparse
+import os
+import random
+import tempfile
+from flask import g
+
+from benchmarks.common import add_microbench_arguments, run_microbenchmarks
+from app import create_app
+from app.authentication.auth import credential_cache, verify_password
+from app.config import Config
+from app.schema import Query, document_cache, schema
+from app.services.chatroom import ChatroomService
+from app.services.chatroom_user import ChatroomUserService
+from app.services.message import MessageService
+from app.services.tenant import TenantService
+from app.services.user import UserService
+from app.utils.graphql_cache import CachedDocumentBackend
+
+TENANT = 'bench'
+PASSWORD = 'bench'
+PAGE_SIZE = 20
+SEED_BATCH = 1000
+USER_QUERY = "query User($id: Int!) { user(userId: $id) { id username email mobile } }"
+
+
+def seed(app, depths):
+    """One tenant with a chatroom per history depth; returns the tenant id, a user id and {depth: chatroom id}."""
+    rng = random.Random(7)
+    with app.app_context():
+        tenant, error = TenantService.create_tenant(TENANT, TENANT, PASSWORD)
+        if error:
+            raise RuntimeError(error)
+        result, error = UserService.create_users(tenant.id, [
+            {'username': f'user{i}', 'email': f'user{i}@example.com', 'password': PASSWORD} for i in range(50)
+        ])
+        users = [item['user']['id'] for item in result['results']]
+        rooms = {}
+        for depth in depths:
+            room, error = ChatroomService.create_chatroom(tenant.id, {'name': f'{depth} messages'})
+            if error:
+                raise RuntimeError(error)
+            ChatroomUserService.add_users_to_chatroom(tenant.id, room.id, [{'user_id': user} for user in users])
+            messages = [{'user_id': rng.choice(users), 'content': f'message {i}'} for i in range(depth)]
+            for start in range(0, depth, SEED_BATCH):
+                MessageService.send_messages(tenant.id, room.id, messages[start:start + SEED_BATCH])
+            rooms[depth] = room.id
+    return tenant.id, users[0], rooms
+
+
+def benchmarks(tenant_id, user_id, rooms):
+    def tenant_session():
+        TenantService.get_tenant_session(tenant_id).close()
+
+    def history_page(room):
+        return lambda: MessageService.get_messages(tenant_id, room, 1, PAGE_SIZE, 'timestamp', 'desc')
+
+    deepest = rooms[max(rooms)]
+    message_page, _ = MessageService.get_messages(tenant_id, deepest, 1, PAGE_SIZE, 'timestamp', 'desc')
+    message = message_page.messages[0]
+    chatroom_page, _ = ChatroomService.get_chatrooms(tenant_id, 1, PAGE_SIZE, 'created_at', 'desc')
+
+    def verify_uncached():
+        credential_cache.invalidate(TENANT)
+        verify_password(TENANT, PASSWORD)
+
+    backend = CachedDocumentBackend(document_cache)
+
+    def execute_user_query():
+        result = schema.execute(USER_QUERY, variables={'id': user_id}, backend=backend)
+        if result.errors:
+            raise RuntimeError(result.errors)
+
+    cases = {'tenant_session': tenant_session}
+    for depth, room in sorted(rooms.items()):
+        cases[f'get_messages[depth={depth}]'] = history_page(room)
+    cases.update({
+        'message_info_to_dict': message.to_dict,
+        f'message_list_to_dict[{PAGE_SIZE}]': message_page.to_dict,
+        f'chatroom_list_to_dict[{len(chatroom_page.chatrooms)}]': chatroom_page.to_dict,
+        'auth_verify_cached': lambda: verify_password(TENANT, PASSWORD),
+        'auth_verify_uncached': verify_uncached,
+        'graphql_resolve_user': lambda: Query.resolve_user(None, None, user_id),
+        'graphql_execute_user_query': execute_user_query,
+    })
+    return cases
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--depths', type=int, nargs='+', default=[100, 10000, 100000],
+                        help='messages in the chatroom each get_messages benchmark reads from')
+    add_microbench_arguments(parser)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='chatroom-bench-')
+    Config.SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(workdir, 'app.db')}"
+    Config.TENANT_DATABASE_DIR = os.path.join(workdir, 'tenants')
+    app = create_app(Config)
+    tenant_id, user_id, rooms = seed(app, args.depths)
+
+    # Resolvers and auth read the tenant from flask.g
+    with app.test_request_context():
+        g.tenant_id = tenant_id
+        run_microbenchmarks('ChatRoom', benchmarks(tenant_id, user_id, rooms), args)
+
+
+if __name__ == '__main__':
+    main()
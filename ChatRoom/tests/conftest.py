@@ -0,0 +1,56 @@
+import os
+import sys
+
+import pytest
+from sqlalchemy import event
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+from app import create_app
+from app.authentication.auth import credential_cache
+from app.config import Config
+from app.services.tenant import TenantService, tenant_registry
+from app.utils.response_cache import response_cache
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """An app on empty databases under tmp_path, inside an app context."""
+    # create_app reads logging.yaml from the working directory
+    (tmp_path / 'logging.yaml').write_text('version: 1\ndisable_existing_loggers: false\n')
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(Config, 'SQLALCHEMY_DATABASE_URI', f"sqlite:///{tmp_path / 'app.db'}")
+    monkeypatch.setattr(Config, 'TENANT_DATABASE_DIR', str(tmp_path / 'tenants'))
+    app = create_app(Config)
+    with app.app_context():
+        yield app
+    # Tenant ids restart at 1 in every test's main database
+    tenant_registry.clear()
+    credential_cache.clear()
+    response_cache.clear()
+
+
+@pytest.fixture
+def tenant_id(app):
+    tenant, error = TenantService.create_tenant('test', 'test', 'test')
+    assert error is None
+    return tenant.id
+
+
+class StatementRecorder:
+    """Collects the SQL statements an engine executes while active."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._record)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(self.engine, 'before_cursor_execute', self._record)
@@ -0,0 +1,40 @@
+import random
+
+import pytest
+
+from app.services.chatroom import ChatroomService
+from app.services.chatroom_user import ChatroomUserService
+from app.services.tenant import tenant_registry
+from app.services.user import UserService
+from conftest import StatementRecorder
+
+# One joined, projected page query and one read of the maintained member count
+MEMBER_PAGE_STATEMENTS = 2
+
+
+def seed_room(tenant_id, members):
+    names = [f'user{i:03d}' for i in range(members)]
+    random.Random(members).shuffle(names)
+    result, error = UserService.create_users(tenant_id, [
+        {'username': name, 'email': f'{name}@example.com', 'password': 'secret'} for name in names
+    ])
+    assert error is None
+    room, error = ChatroomService.create_chatroom(tenant_id, {'name': 'room'})
+    assert error is None
+    result, error = ChatroomUserService.add_users_to_chatroom(
+        tenant_id, room.id, [{'user_id': item['user']['id']} for item in result['results']])
+    assert error is None and result['created'] == members
+    return room.id, sorted(names)
+
+
+@pytest.mark.parametrize('members', [10, 100])
+def test_member_page_costs_a_fixed_number_of_queries(tenant_id, members):
+    room_id, names = seed_room(tenant_id, members)
+
+    with StatementRecorder(tenant_registry.get_engine(tenant_id)) as recorder:
+        page, error = ChatroomUserService.get_users_in_chatroom(tenant_id, room_id, 1, 100, 'username', 'asc')
+
+    assert error is None
+    assert [user['username'] for user in page['users']] == names
+    assert page['total_count'] == members
+    assert len(recorder.statements) == MEMBER_PAGE_STATEMENTS, recorder.statements
@@ -0,0 +1,17 @@
+import threading
+
+from app import create_app
+from app.config import Config
+
+
+def log_writers():
+    return [thread for thread in threading.enumerate() if thread.name.startswith('log-writer-')]
+
+
+def test_create_app_stops_the_writers_it_replaces(app):
+    writers = len(log_writers())
+
+    for _ in range(3):
+        create_app(Config)
+
+    assert len(log_writers()) == writers
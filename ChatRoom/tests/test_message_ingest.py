@@ -0,0 +1,28 @@
+from app.config import Config
+from app.services.chatroom import ChatroomService
+from app.services.message import MessageService, message_ingest
+from app.services.user import UserService
+
+
+def test_cursor_does_not_pass_a_queued_message(tenant_id, monkeypatch):
+    monkeypatch.setattr(Config, 'MESSAGE_INGEST_MODE', 'buffered')
+    # Only the explicit flush below writes the queue
+    monkeypatch.setattr(message_ingest, 'flush_interval', 60)
+    user, error = UserService.create_user(tenant_id, {'username': 'user', 'email': 'user@example.com',
+                                                      'password': 'secret'})
+    assert error is None
+    room, error = ChatroomService.create_chatroom(tenant_id, {'name': 'room'})
+    assert error is None
+
+    queued, error = MessageService.send_message(tenant_id, room.id, user['id'], 'queued')
+    assert error is None
+    result, error = MessageService.send_messages(tenant_id, room.id, [{'user_id': user['id'], 'content': 'bulk'}])
+    assert error is None and result.created == 1
+    page, error = MessageService.get_messages_by_cursor(tenant_id, room.id, 20, sort_order='asc')
+    assert [message.content for message in page.messages] == ['bulk']
+
+    message_ingest.flush()
+    page, error = MessageService.get_messages_by_cursor(tenant_id, room.id, 20, after=page.next_cursor)
+
+    assert error is None
+    assert [message.content for message in page.messages] == ['queued']
@@ -1,10 +1,13 @@
 import os
 from fastapi import FastAPI,Depends,HTTPException,Request
 from app.routes import tenant, user, chatroom
+from app.routes import metrics as metrics_routes
 from .database import create_main_tables
 from app.config import Config
+from app.services.tenant import TenantService
 from contextlib import asynccontextmanager
 from app.schema import schema,get_context,tenant_schema
+from app.graphql_app import TenantGraphQLApp
 import graphene
 import yaml
 import logging
@@ -15,7 +18,14 @@ import logging
 import logging.config
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.responses import Response
-from datetime import datetime
+from starlette.routing import Match
+import time
+from app.log_pipeline import JsonFormatter, queued_file_handler, replace_handlers
+from app.metrics import StatsGauges, instrument_sql, observe_request, registry
+from app.sql_profiler import (PROFILE_HEADER, current_profile, end_profile, instrument_sql_profiling,
+                              report_profile, start_profile)
+from app.response_cache import response_cache
+from app.services.message import message_ingest
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -23,6 +33,8 @@ async def lifespan(app: FastAPI):
     os.makedirs(Config.TENANT_DATABASE_DIR, exist_ok=True)
     
     create_main_tables()
+    # Open engines for the busiest tenants before the first request arrives
+    await TenantService.warm_up()
     yield
 
 app = FastAPI(lifespan=lifespan)
@@ -30,13 +42,12 @@ app = FastAPI(lifespan=lifespan)
 app.include_router(tenant.router)
 app.include_router(user.router)
 app.include_router(chatroom.router)
-app.add_route(
-    "/graphql",
-    GraphQLApp(
-        schema=schema,
-        context_value=Depends(get_context)
-    )
+app.include_router(metrics_routes.router)
+graphql_app = TenantGraphQLApp(
+    schema=schema,
+    context_value=get_context
 )
+app.add_route("/graphql", graphql_app)
 app.add_route(
     "/tenants",
     GraphQLApp(
@@ -48,20 +59,43 @@ register_error_handlers(app)
 
 
 
+def route_template(request: Request):
+    # FastAPI records the matched APIRoute in the scope; routes added with
+    # add_route, like /graphql, are looked up again
+    route = request.scope.get('route')
+    if route is None:
+        route = next((candidate for candidate in request.app.router.routes
+                      if candidate.matches(request.scope)[0] == Match.FULL), None)
+    return route.path if route else 'unmatched'
+
 class LoggingMiddleware(BaseHTTPMiddleware):
     async def dispatch(self, request: Request, call_next):
         access_logger = logging.getLogger('access_logger')
-        start_time = datetime.time()
+        start_time = time.perf_counter()
+        token = start_profile(lambda: route_template(request), bool(request.headers.get(PROFILE_HEADER)))
+        profile = current_profile()
 
-        response = await call_next(request)
+        try:
+            response = await call_next(request)
+        finally:
+            end_profile(token)
+        duration = time.perf_counter() - start_time
 
-        process_time = datetime.time() - start_time
-        formatted_process_time = '{0:.5f}'.format(process_time)
-
-        access_logger.info(f'{request.client.host} - - [{datetime.strftime("%d/%b/%Y:%H:%M:%S %z")}] '
-                           f'"{request.method} {request.url.path} HTTP/{request.scope["http_version"]}" '
-                           f'{response.status_code} {response.headers.get("content-length", 0)} '
-                           f'Process Time: {formatted_process_time}s')
+        tenant_id = getattr(request.state, 'tenant_id', None)
+        observe_request(request.method, route_template(request), response.status_code, tenant_id, duration)
+        server_timing = report_profile(profile, tenant_id)
+        if server_timing:
+            response.headers['Server-Timing'] = server_timing
+        access_logger.info('request', extra={'access': {
+            'remote_addr': request.client.host if request.client else None,
+            'method': request.method,
+            'path': request.url.path,
+            'query': request.url.query,
+            'protocol': f'HTTP/{request.scope["http_version"]}',
+            'status': response.status_code,
+            'bytes': int(response.headers.get('content-length', 0)),
+            'duration_ms': round(duration * 1000, 3)
+        }})
         return response
 
 def configure_logging(app: FastAPI):
@@ -72,17 +106,49 @@ def configure_logging(app: FastAPI):
         config = yaml.safe_load(f.read())
         logging.config.dictConfig(config)
 
+    # Access and debug records are written by background threads, so file I/O
+    # never runs on the event loop
+    access_logger = logging.getLogger('access_logger')
+    access_logger.setLevel(logging.INFO)
+    replace_handlers(access_logger, [
+        queued_file_handler(os.path.join(log_dir, 'access.log'), JsonFormatter(),
+                            Config.LOG_QUEUE_SIZE, Config.LOG_BATCH_SIZE)
+    ])
+    access_logger.propagate = False
+
+    sql_profile_logger = logging.getLogger('sql_profile_logger')
+    sql_profile_logger.setLevel(logging.INFO)
+    replace_handlers(sql_profile_logger, [
+        queued_file_handler(os.path.join(log_dir, 'sql_profile.log'), JsonFormatter(),
+                            Config.LOG_QUEUE_SIZE, Config.LOG_BATCH_SIZE)
+    ])
+    sql_profile_logger.propagate = False
+
     debug_logger = logging.getLogger('debug_logger')
     debug_logger.setLevel(logging.DEBUG)
-    debug_handler = logging.FileHandler(os.path.join(log_dir, 'debug.log'))
-    debug_handler.setLevel(logging.DEBUG)
     debug_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-    debug_handler.setFormatter(debug_formatter)
-    debug_logger.addHandler(debug_handler)
+    replace_handlers(debug_logger, [
+        queued_file_handler(os.path.join(log_dir, 'debug.log'), debug_formatter,
+                            Config.LOG_QUEUE_SIZE, Config.LOG_BATCH_SIZE, logging.DEBUG)
+    ])
     debug_logger.debug('Application startup')
 
-    app.logger.info('Application startup')
+    logging.getLogger(__name__).info('Application startup')
 
     app.add_middleware(LoggingMiddleware)
 
-configure_logging(app) 
\ No newline at end of file
+def configure_metrics(app: FastAPI):
+    instrument_sql()
+    registry.register(StatsGauges('tenant_engine_cache', 'Tenant engine cache statistics',
+                                  lambda: {(kind,): stats for kind, stats in TenantService.get_engine_stats().items()},
+                                  ('engine',)))
+    registry.register(StatsGauges('response_cache', 'GET response cache statistics',
+                                  lambda: {(): response_cache.stats()}))
+    registry.register(StatsGauges('graphql_document_cache', 'Parsed GraphQL document cache statistics',
+                                  lambda: {(): graphql_app.document_cache.stats()}))
+    registry.register(StatsGauges('message_ingest', 'Write-behind message queue statistics',
+                                  lambda: {(): message_ingest.stats()}))
+
+configure_logging(app)
+configure_metrics(app)
+instrument_sql_profiling()
@@ -1,14 +1,33 @@
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
 from starlette.status import HTTP_401_UNAUTHORIZED
+from starlette.requests import Request
+from starlette.websockets import WebSocket
+import base64
+import binascii
 import secrets
 from fastapi import FastAPI,Depends,HTTPException
+from sqlalchemy import select
 from ..models import Tenant
-from sqlalchemy.orm import Session
-from ..database import get_main_db
+from ..extensions import async_session
+from ..config import Config
+from .cache import CredentialCache
 security = HTTPBasic()
+credential_cache = CredentialCache(ttl=Config.AUTH_CACHE_TTL, max_size=Config.AUTH_CACHE_SIZE)
 
-def verify_credentials(credentials: HTTPBasicCredentials = Depends(security), db: Session = Depends(get_main_db)):
-    tenant = db.query(Tenant).filter(Tenant.name == credentials.username).first()
+async def verify_credentials(credentials: HTTPBasicCredentials = Depends(security), request: Request = None):
+    tenant_id = credential_cache.get(credentials.username, credentials.password)
+    if tenant_id is None:
+        tenant_id = await _authenticate(credentials)
+    if request is not None:
+        # Read back by the request middleware to label per-tenant metrics
+        request.state.tenant_id = tenant_id
+    return tenant_id
+
+
+async def _authenticate(credentials: HTTPBasicCredentials):
+    async with async_session() as db:
+        result = await db.execute(select(Tenant).where(Tenant.name == credentials.username))
+        tenant = result.scalars().first()
     if not tenant:
         raise HTTPException(
             status_code=HTTP_401_UNAUTHORIZED,
@@ -24,4 +43,26 @@ def verify_credentials(credentials: HTTPBasicCredentials = Depends(security), db
             headers={"WWW-Authenticate": "Basic"},
         )
     
-    return tenant.id
\ No newline at end of file
+    credential_cache.set(credentials.username, credentials.password, tenant.id)
+    return tenant.id
+
+
+async def verify_websocket_credentials(websocket: WebSocket):
+    """
+    Check the Basic Authorization header of a WebSocket handshake and
+    return the tenant id, or None when the credentials are missing or wrong
+    """
+    scheme, _, encoded = websocket.headers.get('authorization', '').partition(' ')
+    if scheme.lower() != 'basic':
+        return None
+    try:
+        username, separator, password = base64.b64decode(encoded).decode('utf-8').partition(':')
+    except (binascii.Error, UnicodeDecodeError):
+        return None
+    if not separator:
+        return None
+
+    try:
+        return await verify_credentials(HTTPBasicCredentials(username=username, password=password))
+    except HTTPException:
+        return None
@@ -0,0 +1,103 @@
+from sqlalchemy import text
+
+# Row counts kept per tenant so that list endpoints do not need a COUNT(*)
+# over the whole table for every page. The triggers run inside the writing
+# transaction, so a count is exactly as current as the rows it describes.
+COUNTER_TABLE = 'row_counter'
+
+USERS = 'users'
+CHATROOMS = 'chatrooms'
+ROOM_MESSAGES = 'room_messages'
+ROOM_MEMBERS = 'room_members'
+USER_MESSAGES = 'user_messages'
+
+
+def _bump(scope, key, delta):
+    return (
+        f"INSERT INTO {COUNTER_TABLE}(scope, key, count) VALUES ('{scope}', {key}, {delta}) "
+        "ON CONFLICT(scope, key) DO UPDATE SET count = count + excluded.count;"
+    )
+
+
+def _triggers(table, counters):
+    """Insert, delete and update triggers adjusting (scope, key column) counters on table."""
+    keys = ', '.join(column for _, column in counters if column)
+    statements = [
+        f"CREATE TRIGGER IF NOT EXISTS {table}_count_ai AFTER INSERT ON \"{table}\" BEGIN "
+        + ' '.join(_bump(scope, f'new.{column}' if column else 0, 1) for scope, column in counters) + " END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_count_ad AFTER DELETE ON \"{table}\" BEGIN "
+        + ' '.join(_bump(scope, f'old.{column}' if column else 0, -1) for scope, column in counters) + " END",
+    ]
+    if keys:
+        keyed = [(scope, column) for scope, column in counters if column]
+        statements.append(
+            f"CREATE TRIGGER IF NOT EXISTS {table}_count_au AFTER UPDATE OF {keys} ON \"{table}\" BEGIN "
+            + ' '.join(_bump(scope, f'old.{column}', -1) + ' ' + _bump(scope, f'new.{column}', 1)
+                       for scope, column in keyed) + " END"
+        )
+    return statements
+
+
+COUNTED_TABLES = {
+    'user': [(USERS, None)],
+    'chatroom': [(CHATROOMS, None)],
+    'chatroom_user': [(ROOM_MEMBERS, 'chatroom_id')],
+    'message': [(ROOM_MESSAGES, 'chatroom_id'), (USER_MESSAGES, 'user_id')],
+}
+
+COUNTER_DDL = [
+    f"CREATE TABLE IF NOT EXISTS {COUNTER_TABLE} ("
+    "scope TEXT NOT NULL, key INTEGER NOT NULL, count INTEGER NOT NULL, "
+    "PRIMARY KEY (scope, key)) WITHOUT ROWID"
+] + [statement for table, counters in COUNTED_TABLES.items() for statement in _triggers(table, counters)]
+
+
+def _backfill(connection):
+    connection.execute(text(f"DELETE FROM {COUNTER_TABLE}"))
+    for table, counters in COUNTED_TABLES.items():
+        for scope, column in counters:
+            key = column or '0'
+            group_by = f" GROUP BY {column}" if column else ""
+            connection.execute(text(
+                f"INSERT INTO {COUNTER_TABLE}(scope, key, count) "
+                f"SELECT '{scope}', {key}, COUNT(*) FROM \"{table}\"{group_by}"
+            ))
+
+
+def counters_exist(connection):
+    return connection.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': COUNTER_TABLE}
+    ).first() is not None
+
+
+def ensure_counters(engine):
+    """Create the counter table and its triggers if missing.
+
+    New counters are filled from the existing rows in the same transaction
+    that creates the triggers, so no write can slip in between. Returns True
+    when the counters were created.
+    """
+    with engine.begin() as connection:
+        if counters_exist(connection):
+            return False
+        for statement in COUNTER_DDL:
+            connection.execute(text(statement))
+        _backfill(connection)
+    return True
+
+
+def rebuild_counters(engine):
+    """Recreate the triggers and recount every counter from the tables."""
+    with engine.begin() as connection:
+        for statement in COUNTER_DDL:
+            connection.execute(text(statement))
+        _backfill(connection)
+
+
+def stored_count(session, scope, key=0):
+    """The maintained row count for scope and key; zero when nothing was counted yet."""
+    count = session.execute(
+        text(f"SELECT count FROM {COUNTER_TABLE} WHERE scope = :scope AND key = :key"),
+        {'scope': scope, 'key': key}
+    ).scalar()
+    return max(count or 0, 0)
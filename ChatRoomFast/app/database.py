@@ -2,17 +2,44 @@ from sqlalchemy import create_engine, inspect
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from app.config import Config
+from app.sqlite_pragmas import apply_sqlite_pragmas
 import logging
+import math
 
 logger = logging.getLogger(__name__)
 
 # Create the main database engine
-main_engine = create_engine(Config.MAIN_DATABASE_URL, echo=True)
+main_engine = create_engine(Config.MAIN_DATABASE_URL, echo=Config.SQL_ECHO)
+apply_sqlite_pragmas(main_engine, Config.SQLITE_PRAGMAS)
 
 # Create a SessionLocal class
 MainSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=main_engine)
 Base = declarative_base()
 
+def chunked(values, size: int = 500):
+    """
+    Split values into lists small enough for SQLite's bound parameter limit
+    """
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+def fetch_page(query, page: int, per_page: int, include_total: bool = True, count=None):
+    """
+    Fetch one offset page of query and tell whether another page follows.
+    The total comes from count, a callable returning a maintained row count,
+    when the query is unfiltered, from COUNT(*) over the query otherwise, and
+    is None when include_total is False. Returns (rows, total, has_more)
+    """
+    rows = query.offset((page - 1) * per_page).limit(per_page + 1).all()
+    total = None
+    if include_total:
+        total = count() if count else query.count()
+    return rows[:per_page], total, len(rows) > per_page
+
+def total_pages(total, per_page: int):
+    return math.ceil(total / per_page) if total is not None else None
+
 # Dependency to get the main database session
 def get_main_db():
     db = MainSessionLocal()
@@ -0,0 +1,55 @@
+import asyncio
+
+
+class DataLoader:
+    """
+    Batches the loads issued while one GraphQL level resolves into a single
+    call of batch_load, and caches each key's result for the lifetime of the
+    loader. Create loaders per request so that cached rows never outlive it.
+
+    batch_load is awaited with the list of distinct keys and returns a list
+    of values in the same order. max_batch_size splits larger batches into
+    several calls.
+    """
+
+    def __init__(self, batch_load, max_batch_size=None):
+        self.batch_load = batch_load
+        self.max_batch_size = max_batch_size
+        self.batches = 0
+        self._futures = {}
+        self._queue = []
+
+    def load(self, key):
+        future = self._futures.get(key)
+        if future is not None:
+            return future
+        loop = asyncio.get_running_loop()
+        future = self._futures[key] = loop.create_future()
+        self._queue.append(key)
+        if len(self._queue) == 1:
+            # Resolvers for the rest of this level run before the callback,
+            # so their keys join the same batch
+            loop.call_soon(lambda: asyncio.ensure_future(self._dispatch()))
+        return future
+
+    def load_many(self, keys):
+        return asyncio.gather(*(self.load(key) for key in keys))
+
+    async def _dispatch(self):
+        queue, self._queue = self._queue, []
+        size = self.max_batch_size or len(queue)
+        for start in range(0, len(queue), size):
+            await self._load_batch(queue[start:start + size])
+
+    async def _load_batch(self, keys):
+        self.batches += 1
+        try:
+            values = await self.batch_load(keys)
+            if len(values) != len(keys):
+                raise ValueError(f"batch_load returned {len(values)} values for {len(keys)} keys")
+        except Exception as e:
+            for key in keys:
+                self._futures.pop(key).set_exception(e)
+            return
+        for key, value in zip(keys, values):
+            self._futures[key].set_result(value)
@@ -12,4 +12,14 @@ async def get_tenant_db(x_tenant_id: int = Depends(verify_credentials)):
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+async def get_async_tenant_db(x_tenant_id: int = Depends(verify_credentials)):
+    db = await TenantService.get_async_tenant_session(x_tenant_id)
+    if not db:
+        raise HTTPException(status_code=400, detail=f"Invalid tenant ID or tenant database not found: {x_tenant_id}")
+    try:
+        yield db
+    finally:
+        await db.close()
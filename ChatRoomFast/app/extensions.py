@@ -1,9 +1,11 @@
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 from app.config import Config
+from app.sqlite_pragmas import apply_sqlite_pragmas
 from typing import AsyncGenerator
 
-engine = create_async_engine(Config.SQLALCHEMY_DATABASE_URI, echo=True)
+engine = create_async_engine(Config.MAIN_ASYNC_DATABASE_URL, echo=Config.SQL_ECHO)
+apply_sqlite_pragmas(engine.sync_engine, Config.SQLITE_PRAGMAS)
 async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
 async def get_session() -> AsyncGenerator[AsyncSession, None]:
@@ -11,4 +13,4 @@ async def get_session() -> AsyncGenerator[AsyncSession, None]:
         try:
             yield session
         finally:
-            await session.close()
\ No newline at end of file
+            await session.close()
@@ -0,0 +1,83 @@
+from inspect import isawaitable
+from graphql import ExecutionResult, GraphQLError, execute
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette_graphene3 import GraphQLApp, _get_operation_from_request
+from app.config import Config
+from app.graphql_cache import DocumentCache, PersistedQueryError, resolve_persisted_query
+from app.query_cost import measure_query
+
+
+class TenantGraphQLApp(GraphQLApp):
+    """
+    GraphQLApp for the tenant schema. Documents come from a DocumentCache,
+    so repeated queries skip parsing and validation, and clients may send
+    automatic persisted query hashes in place of the query. Every operation
+    is costed against the tenant's limits before execution, and the cost is
+    reported under extensions.cost of the response.
+    """
+
+    def __init__(self, schema, **kwargs):
+        super().__init__(schema, **kwargs)
+        self.document_cache = DocumentCache(schema.graphql_schema, Config.GRAPHQL_DOCUMENT_CACHE_SIZE)
+
+    async def _handle_http_request(self, request: Request) -> JSONResponse:
+        try:
+            operation = await _get_operation_from_request(request)
+        except ValueError as e:
+            return JSONResponse({"errors": [e.args[0]]}, status_code=400)
+        if isinstance(operation, list):
+            return JSONResponse({"errors": ["This server does not support batching"]}, status_code=400)
+
+        context_value = await self._get_context_value(request)
+        try:
+            operation = resolve_persisted_query(self.document_cache, operation)
+        except PersistedQueryError as e:
+            return JSONResponse({"data": None, "errors": [e.as_dict()]}, status_code=200)
+
+        query = operation.get("query")
+        variable_values = operation.get("variables")
+        operation_name = operation.get("operationName")
+        result, query_cost = await self._execute(query, variable_values, operation_name, context_value)
+
+        response = {"data": result.data}
+        if result.errors:
+            for error in result.errors:
+                if error.original_error:
+                    self.logger.error("An exception occurred in resolvers", exc_info=error.original_error)
+            response["errors"] = [self.error_formatter(error) for error in result.errors]
+        if query_cost is not None:
+            response["extensions"] = {"cost": query_cost.extension()}
+        return JSONResponse(response, status_code=200, background=context_value.get("background"))
+
+    async def _execute(self, query, variable_values, operation_name, context_value):
+        """Returns the ExecutionResult and the QueryCost, which is None when the query is invalid."""
+        if not isinstance(query, str):
+            return ExecutionResult(data=None, errors=[GraphQLError("Must provide query string.")]), None
+        try:
+            entry = self.document_cache.document(query)
+        except GraphQLError as error:
+            return ExecutionResult(data=None, errors=[error]), None
+        if entry.errors:
+            return ExecutionResult(data=None, errors=entry.errors), None
+
+        schema = self.schema.graphql_schema
+        query_cost = measure_query(schema, entry.document, context_value["tenant_id"], query, variable_values,
+                                   operation_name)
+        error = query_cost.error()
+        if error:
+            return ExecutionResult(data=None, errors=[GraphQLError(error)]), query_cost
+
+        result = execute(
+            schema,
+            entry.document,
+            root_value=self.root_value,
+            context_value=context_value,
+            variable_values=variable_values,
+            operation_name=operation_name,
+            middleware=self.middleware,
+            execution_context_class=self.execution_context_class
+        )
+        if isawaitable(result):
+            result = await result
+        return result, query_cost
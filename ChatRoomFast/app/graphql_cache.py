@@ -0,0 +1,105 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from graphql import parse, validate
+
+
+def query_hash(query):
+    return hashlib.sha256(query.encode('utf-8')).hexdigest()
+
+
+class PersistedQueryError(Exception):
+    def __init__(self, message, code):
+        super().__init__(message)
+        self.code = code
+
+    def as_dict(self):
+        return {'message': str(self), 'extensions': {'code': self.code}}
+
+
+class CachedDocument:
+    def __init__(self, query, document, errors):
+        self.query = query
+        self.document = document
+        self.errors = errors
+
+
+class DocumentCache:
+    """LRU of parsed and validated GraphQL documents for one schema.
+
+    Entries are keyed by the SHA-256 of the query text, which is also the
+    automatic persisted query hash, so the cache doubles as the persisted
+    query store. Documents with syntax errors are not cached.
+    """
+
+    def __init__(self, schema, max_entries):
+        self.schema = schema
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def lookup(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def document(self, query, key=None):
+        key = key or query_hash(query)
+        entry = self.lookup(key)
+        if entry is not None:
+            return entry
+        document = parse(query)
+        entry = CachedDocument(query, document, validate(self.schema, document))
+        if self.max_entries > 0:
+            with self._lock:
+                self._entries[key] = entry
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+
+def resolve_persisted_query(cache, operation):
+    """Fill in the query of an automatic persisted query request.
+
+    A request carrying extensions.persistedQuery.sha256Hash without a query
+    is answered from the cache, or fails with PERSISTED_QUERY_NOT_FOUND so
+    the client resends the full query. A request with both registers the
+    query once the hash is checked. Returns the operation to execute.
+    """
+    extensions = operation.get('extensions')
+    persisted = extensions.get('persistedQuery') if isinstance(extensions, dict) else None
+    if not persisted:
+        return operation
+    if persisted.get('version') != 1:
+        raise PersistedQueryError("Unsupported persisted query version", 'PERSISTED_QUERY_NOT_SUPPORTED')
+    key = persisted.get('sha256Hash')
+    query = operation.get('query')
+    if query:
+        if query_hash(query) != key:
+            raise PersistedQueryError("Provided sha256Hash does not match the query", 'PERSISTED_QUERY_HASH_MISMATCH')
+        return operation
+    entry = cache.lookup(key) if isinstance(key, str) else None
+    if entry is None:
+        raise PersistedQueryError("PersistedQueryNotFound", 'PERSISTED_QUERY_NOT_FOUND')
+    return dict(operation, query=entry.query)
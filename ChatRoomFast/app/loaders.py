@@ -0,0 +1,47 @@
+from graphql import GraphQLError
+from app.dataloader import DataLoader
+from app.services.tenant import TenantService
+from app.services.user import AsyncUserService
+from app.services.chatroom import AsyncChatroomService
+from app.services.chatroom_user import AsyncChatroomUserService
+from app.services.message import AsyncMessageService
+
+
+class TenantLoaders:
+    """
+    The DataLoaders of one GraphQL request against one tenant. Nested fields
+    load their related rows through these, so each level of a query costs
+    one batched query per relationship instead of one per parent row.
+    """
+
+    def __init__(self, tenant_id: int, max_batch_size: int = None):
+        self.tenant_id = tenant_id
+        self.max_batch_size = max_batch_size
+        self.users = self._loader(AsyncUserService.get_users_by_ids, None)
+        self.chatrooms = self._loader(AsyncChatroomService.get_chatrooms_by_ids, None)
+        self.members = self._loader(AsyncChatroomUserService.get_members_by_chatrooms, [])
+        self._latest_messages = {}
+
+    def latest_messages(self, limit: int):
+        loader = self._latest_messages.get(limit)
+        if loader is None:
+            async def load(db, chatroom_ids):
+                return await AsyncMessageService.get_latest_messages_by_chatrooms(db, chatroom_ids, limit)
+            loader = self._latest_messages[limit] = self._loader(load, [])
+        return loader
+
+    def batches(self):
+        return sum(loader.batches for loader in
+                   [self.users, self.chatrooms, self.members, *self._latest_messages.values()])
+
+    def _loader(self, fetch, missing):
+        async def batch_load(keys):
+            db = await TenantService.get_async_tenant_session(self.tenant_id)
+            if db is None:
+                raise GraphQLError("Invalid tenant ID or tenant database not found")
+            async with db:
+                rows, error = await fetch(db, keys)
+            if error:
+                raise GraphQLError(error)
+            return [rows.get(key, missing) for key in keys]
+        return DataLoader(batch_load, self.max_batch_size)
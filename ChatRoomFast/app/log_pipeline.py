@@ -0,0 +1,141 @@
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+from datetime import datetime, timezone
+
+_STOP = object()
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line. Access log records carry their fields in ``record.access``."""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name
+        }
+        access = getattr(record, 'access', None)
+        if access:
+            entry.update(access)
+        else:
+            entry['message'] = record.getMessage()
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class BatchWriter:
+    """Appends log records to a file from a background thread.
+
+    Records waiting in the queue are formatted and written together, with a
+    single write and flush per batch. When the queue is full, because the
+    disk cannot keep up, new records are dropped and counted rather than
+    making the logging thread wait, and the count is logged once the writer
+    catches up.
+    """
+
+    def __init__(self, path, formatter, queue_size, batch_size):
+        self.path = path
+        self.formatter = formatter
+        self.batch_size = batch_size
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+        self._reported_drops = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._run, name=f'log-writer-{os.path.basename(path)}', daemon=True)
+        self._thread.start()
+
+    def enqueue(self, record):
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def stop(self, timeout=5):
+        if not self._thread.is_alive():
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+    def stats(self):
+        return {
+            'path': self.path,
+            'queued': self._queue.qsize(),
+            'written': self.written,
+            'dropped': self.dropped,
+            'errors': self.errors
+        }
+
+    def _run(self):
+        with open(self.path, 'a', encoding='utf-8') as stream:
+            stopping = False
+            while not stopping:
+                batch = [self._queue.get()]
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if _STOP in batch:
+                    stopping = True
+                    batch = [record for record in batch if record is not _STOP]
+                self._write(stream, batch)
+
+    def _write(self, stream, batch):
+        lines = []
+        for record in batch:
+            try:
+                lines.append(self.formatter.format(record))
+            except Exception:
+                self.errors += 1
+        if self.dropped != self._reported_drops:
+            lines.append(self.formatter.format(logging.makeLogRecord({
+                'name': __name__, 'levelno': logging.WARNING, 'levelname': 'WARNING',
+                'msg': f'Dropped {self.dropped - self._reported_drops} log records while the queue was full'
+            })))
+            self._reported_drops = self.dropped
+        if not lines:
+            return
+        try:
+            stream.write('\n'.join(lines) + '\n')
+            stream.flush()
+            self.written += len(batch)
+        except OSError as e:
+            self.errors += 1
+            sys.stderr.write(f'Could not write {len(lines)} log records to {self.path}: {e}\n')
+
+
+class QueueingHandler(logging.Handler):
+    """Hands records to a BatchWriter, so the calling thread never touches the file."""
+
+    def __init__(self, writer, level=logging.NOTSET):
+        super().__init__(level)
+        self.writer = writer
+
+    def emit(self, record):
+        self.writer.enqueue(record)
+
+    def close(self):
+        # Called by logging.shutdown at exit and by replace_handlers, so each
+        # writer thread and its file are released along with the handler
+        self.writer.stop()
+        super().close()
+
+
+def queued_file_handler(path, formatter, queue_size, batch_size, level=logging.NOTSET):
+    return QueueingHandler(BatchWriter(path, formatter, queue_size, batch_size), level)
+
+
+def replace_handlers(logger, handlers):
+    """Give logger new handlers and close the ones they replace."""
+    previous, logger.handlers = logger.handlers, handlers
+    for handler in previous:
+        handler.close()
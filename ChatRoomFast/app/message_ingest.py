@@ -0,0 +1,158 @@
+import logging
+import threading
+import time
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFull(Exception):
+    """Raised by a non-blocking submit when the tenant's buffer is full."""
+
+
+class _TenantBuffer:
+    def __init__(self, engine):
+        self.engine = engine
+        self.rows = []
+        self.futures = []
+        self.first_queued = None
+        self.urgent = False
+
+
+class MessageIngestQueue:
+    """Write-behind buffer that groups message inserts into batched transactions.
+
+    Rows are buffered per tenant and written by a single background thread
+    once ``batch_size`` rows are waiting or the oldest row has waited
+    ``flush_interval`` seconds. Every submitted row gets a Future that
+    resolves after its group commit. Rows submitted with ``wait=True`` are
+    flushed as soon as the writer is free, so callers waiting for durability
+    share a commit with whatever queued up during the previous write instead
+    of sleeping out the interval. Submitters block once a tenant has
+    ``max_pending`` rows buffered, or get QueueFull with ``block=False``.
+
+    A row that cannot be written fails only its Future. Nobody waits on the
+    Future of a row accepted without ``wait``, so its loss is logged at error
+    level and counted in ``failed``.
+    """
+
+    def __init__(self, write_batch, on_flushed, batch_size, flush_interval, max_pending):
+        self.write_batch = write_batch
+        self.on_flushed = on_flushed
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.flushed = 0
+        self.batches = 0
+        self.failed = 0
+        self._buffers = {}
+        self._condition = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._thread = None
+
+    def submit(self, tenant_id, engine, row, wait=False, block=True):
+        future = Future()
+        with self._condition:
+            self._ensure_started()
+            buffer = self._buffers.get(tenant_id)
+            while buffer is not None and len(buffer.rows) >= self.max_pending:
+                if not block:
+                    raise QueueFull(f"Message queue for tenant {tenant_id} is full")
+                self._condition.wait()
+                buffer = self._buffers.get(tenant_id)
+            if buffer is None:
+                buffer = self._buffers[tenant_id] = _TenantBuffer(engine)
+            if not buffer.rows:
+                buffer.first_queued = time.monotonic()
+            buffer.rows.append(row)
+            buffer.futures.append(future)
+            buffer.urgent = buffer.urgent or wait
+            if wait or len(buffer.rows) == 1 or len(buffer.rows) >= self.batch_size:
+                self._condition.notify_all()
+        return future
+
+    def flush(self):
+        """Write every buffered row now; used on shutdown."""
+        with self._condition:
+            ready = self._take(force=True)
+        self._write(ready)
+
+    def _ensure_started(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='message-ingest', daemon=True)
+            self._thread.start()
+
+    def _take(self, force=False):
+        now = time.monotonic()
+        ready = []
+        for tenant_id, buffer in list(self._buffers.items()):
+            if not buffer.rows:
+                del self._buffers[tenant_id]
+                continue
+            if (force or buffer.urgent or len(buffer.rows) >= self.batch_size
+                    or now - buffer.first_queued >= self.flush_interval):
+                ready.append((tenant_id, buffer))
+                del self._buffers[tenant_id]
+        if ready:
+            self._condition.notify_all()
+        return ready
+
+    def _next_deadline(self):
+        queued = [buffer.first_queued for buffer in self._buffers.values() if buffer.rows]
+        if not queued:
+            return None
+        return max(0.0, min(queued) + self.flush_interval - time.monotonic())
+
+    def _run(self):
+        while True:
+            with self._condition:
+                ready = self._take()
+                while not ready:
+                    self._condition.wait(self._next_deadline())
+                    ready = self._take()
+            self._write(ready)
+
+    def _write(self, ready):
+        with self._write_lock:
+            for tenant_id, buffer in ready:
+                self._write_buffer(tenant_id, buffer)
+
+    def _write_buffer(self, tenant_id, buffer):
+        try:
+            self.write_batch(buffer.engine, buffer.rows)
+        except Exception as e:
+            # One bad row must not fail the whole group, so retry row by row.
+            logger.warning(f"Batched insert of {len(buffer.rows)} messages for tenant {tenant_id} failed: {e}")
+            written = []
+            for row, future in zip(buffer.rows, buffer.futures):
+                try:
+                    self.write_batch(buffer.engine, [row])
+                    written.append(row)
+                    future.set_result(row)
+                except Exception as row_error:
+                    self.failed += 1
+                    logger.error(f"Message {row.get('id')} for tenant {tenant_id} was not written: {row_error}")
+                    future.set_exception(row_error)
+            self._flushed(tenant_id, written)
+            return
+        for row, future in zip(buffer.rows, buffer.futures):
+            future.set_result(row)
+        self._flushed(tenant_id, buffer.rows)
+
+    def _flushed(self, tenant_id, rows):
+        self.batches += 1
+        self.flushed += len(rows)
+        try:
+            self.on_flushed(tenant_id, rows)
+        except Exception as e:
+            logger.warning(f"Publishing flushed messages for tenant {tenant_id} failed: {e}")
+
+    def stats(self):
+        with self._condition:
+            pending = sum(len(buffer.rows) for buffer in self._buffers.values())
+        return {
+            'pending': pending,
+            'flushed': self.flushed,
+            'batches': self.batches,
+            'failed': self.failed
+        }
@@ -0,0 +1,225 @@
+import bisect
+import math
+import os
+import threading
+import time
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app.config import Config
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+SQL_STATEMENTS = ('select', 'insert', 'update', 'delete')
+OTHER_TENANTS = 'other'
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(value)
+
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            yield self.name, _format_labels(self.labelnames, labels), value
+
+
+class Histogram:
+    """Cumulative latency buckets per label set, rendered as Prometheus
+    ``_bucket``, ``_sum`` and ``_count`` samples. Label values must be strings.
+    """
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # One count per bucket, then +Inf, then the sum
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def samples(self):
+        with self._lock:
+            series = sorted((labels, list(values)) for labels, values in self._series.items())
+        bounds = self.buckets + (math.inf,)
+        for labels, values in series:
+            cumulative = 0
+            for bound, count in zip(bounds, values):
+                cumulative += count
+                yield (f'{self.name}_bucket',
+                       _format_labels(self.labelnames, labels, [('le', _format_value(bound))]), cumulative)
+            yield f'{self.name}_sum', _format_labels(self.labelnames, labels), values[-1]
+            yield f'{self.name}_count', _format_labels(self.labelnames, labels), cumulative
+
+
+class StatsGauges:
+    """Gauges read from a component's ``stats()`` at scrape time.
+
+    collect returns {label values: stats dict}; every numeric stat becomes a
+    ``<prefix>_<key>`` gauge.
+    """
+
+    def __init__(self, name, documentation, collect, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.collect = collect
+        self.labelnames = labelnames
+
+    def render(self):
+        families = {}
+        for labels, stats in self.collect().items():
+            for key, value in stats.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    families.setdefault(f'{self.name}_{key}', []).append((labels, value))
+        for name, samples in families.items():
+            yield f'# HELP {name} {self.documentation}'
+            yield f'# TYPE {name} gauge'
+            for labels, value in samples:
+                yield f'{name}{_format_labels(self.labelnames, labels)} {_format_value(value)}'
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        # Registering a name again replaces it, so building a second app in
+        # the same process does not duplicate its collectors
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            if isinstance(metric, StatsGauges):
+                lines.extend(metric.render())
+                continue
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            lines.extend(f'{name}{labels} {_format_value(value)}' for name, labels, value in metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+request_latency = registry.register(Histogram(
+    'http_request_duration_seconds', 'HTTP request latency by route template', ('method', 'route', 'status')))
+tenant_request_latency = registry.register(Histogram(
+    'tenant_http_request_duration_seconds', 'HTTP request latency by authenticated tenant', ('tenant',)))
+sql_query_latency = registry.register(Histogram(
+    'sql_query_duration_seconds', 'SQL statement latency by database and statement type',
+    ('database', 'statement'), SQL_BUCKETS))
+tenant_sql_queries = registry.register(Counter(
+    'tenant_sql_queries_total', 'SQL statements run against each tenant database', ('tenant',)))
+tenant_sql_seconds = registry.register(Counter(
+    'tenant_sql_query_seconds_total', 'Time spent in SQL statements per tenant database', ('tenant',)))
+
+_tenant_labels = set()
+_tenant_labels_lock = threading.Lock()
+_database_tenants = {}
+
+
+def tenant_label(tenant_id):
+    """Label value for a tenant. Past METRICS_MAX_TENANTS distinct tenants,
+    new ones share the ``other`` label to bound the number of series."""
+    label = str(tenant_id)
+    if label in _tenant_labels:
+        return label
+    with _tenant_labels_lock:
+        if len(_tenant_labels) < Config.METRICS_MAX_TENANTS:
+            _tenant_labels.add(label)
+            return label
+    return OTHER_TENANTS
+
+
+def observe_request(method, route, status, tenant_id, seconds):
+    request_latency.observe(seconds, method, route, str(status))
+    if tenant_id is not None:
+        tenant_request_latency.observe(seconds, tenant_label(tenant_id))
+
+
+def _database_tenant(conn):
+    """Tenant id of a tenant database file, '' for any other database."""
+    path = conn.engine.url.database or ''
+    tenant = _database_tenants.get(path)
+    if tenant is None:
+        directory, filename = os.path.split(os.path.abspath(path))
+        stem, _ = os.path.splitext(filename)
+        is_tenant = directory == os.path.abspath(Config.TENANT_DATABASE_DIR) and stem.isdigit()
+        tenant = _database_tenants[path] = stem if is_tenant else ''
+    return tenant
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_query_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('metrics_query_started')
+    if not started:
+        return
+    seconds = time.perf_counter() - started.pop()
+    keyword = statement.lstrip()[:6].lower()
+    tenant = _database_tenant(conn)
+    sql_query_latency.observe(seconds, 'tenant' if tenant else 'main',
+                              keyword if keyword in SQL_STATEMENTS else 'other')
+    if tenant:
+        label = tenant_label(tenant)
+        tenant_sql_queries.inc(label)
+        tenant_sql_seconds.inc(label, amount=seconds)
+
+
+def _handle_error(context):
+    started = context.connection.info.get('metrics_query_started') if context.connection is not None else None
+    if started:
+        started.pop()
+
+
+def instrument_sql():
+    """Time the statements of every SQLAlchemy engine in the process, tenant
+    and async engines included."""
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_error)
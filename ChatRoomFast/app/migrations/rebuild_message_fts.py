@@ -0,0 +1,37 @@
+import os
+import sys
+from sqlalchemy import create_engine
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, project_root)
+
+from app.config import Config
+from app.services.tenant import TenantService
+from app.fts import fts5_supported, rebuild_message_fts
+
+
+def rebuild_tenant_search_indexes(tenant_dir=Config.TENANT_DATABASE_DIR):
+    """Create or rebuild the message search index of every tenant database in place."""
+    if not fts5_supported():
+        print("SQLite was built without FTS5; nothing to rebuild")
+        return {}
+    results = {}
+    for file_name in sorted(os.listdir(tenant_dir)):
+        if not file_name.endswith('.db'):
+            continue
+        engine = create_engine(f"sqlite:///{os.path.join(tenant_dir, file_name)}")
+        try:
+            TenantService.upgrade_schema(engine)
+            rebuild_message_fts(engine)
+            results[file_name] = 'rebuilt'
+            print(f"{file_name}: rebuilt")
+        except Exception as e:
+            results[file_name] = str(e)
+            print(f"{file_name}: failed ({e})")
+        finally:
+            engine.dispose()
+    return results
+
+
+if __name__ == '__main__':
+    rebuild_tenant_search_indexes(sys.argv[1] if len(sys.argv) > 1 else Config.TENANT_DATABASE_DIR)
@@ -0,0 +1,34 @@
+import os
+import sys
+from sqlalchemy import create_engine
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, project_root)
+
+from app.config import Config
+from app.services.tenant import TenantService
+from app.counters import rebuild_counters
+
+
+def recount_tenant_rows(tenant_dir=Config.TENANT_DATABASE_DIR):
+    """Recount the maintained row counters of every tenant database from its tables."""
+    results = {}
+    for file_name in sorted(os.listdir(tenant_dir)):
+        if not file_name.endswith('.db'):
+            continue
+        engine = create_engine(f"sqlite:///{os.path.join(tenant_dir, file_name)}")
+        try:
+            TenantService.upgrade_schema(engine)
+            rebuild_counters(engine)
+            results[file_name] = 'recounted'
+            print(f"{file_name}: recounted")
+        except Exception as e:
+            results[file_name] = str(e)
+            print(f"{file_name}: failed ({e})")
+        finally:
+            engine.dispose()
+    return results
+
+
+if __name__ == '__main__':
+    recount_tenant_rows(sys.argv[1] if len(sys.argv) > 1 else Config.TENANT_DATABASE_DIR)
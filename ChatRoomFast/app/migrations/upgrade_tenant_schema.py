@@ -0,0 +1,35 @@
+import os
+import sys
+from sqlalchemy import create_engine
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, project_root)
+
+from app.config import Config
+from app.services.tenant import TenantService
+
+
+def upgrade_tenant_databases(tenant_dir=Config.TENANT_DATABASE_DIR):
+    """
+    Add missing tables and indexes to every tenant database in place,
+    deleting duplicate rows that would block a unique index.
+    """
+    results = {}
+    for file_name in sorted(os.listdir(tenant_dir)):
+        if not file_name.endswith('.db'):
+            continue
+        engine = create_engine(f"sqlite:///{os.path.join(tenant_dir, file_name)}")
+        try:
+            created = TenantService.upgrade_schema(engine, deduplicate=True)
+            results[file_name] = created
+            print(f"{file_name}: {', '.join(created) if created else 'up to date'}")
+        except Exception as e:
+            results[file_name] = str(e)
+            print(f"{file_name}: failed ({e})")
+        finally:
+            engine.dispose()
+    return results
+
+
+if __name__ == '__main__':
+    upgrade_tenant_databases(sys.argv[1] if len(sys.argv) > 1 else Config.TENANT_DATABASE_DIR)
@@ -1,5 +1,5 @@
 from datetime import datetime, timezone
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 
@@ -7,6 +7,11 @@ Base = declarative_base()
 UTC = timezone.utc
 
 
+def utcnow():
+    """Naive UTC, the form SQLite stores and returns DateTime values in."""
+    return datetime.now(UTC).replace(tzinfo=None)
+
+
 class User(Base):
     __tablename__ = 'user'
     id = Column(Integer, primary_key=True)
@@ -54,6 +59,9 @@ class Chatroom(Base):
 
 class ChatroomUser(Base):
     __tablename__ = 'chatroom_user'
+    __table_args__ = (
+        Index('ix_chatroom_user_chatroom_id_user_id', 'chatroom_id', 'user_id', unique=True),
+    )
     id = Column(String(32), primary_key=True)
     user_id = Column(Integer, ForeignKey('user.id'), nullable=False)
     chatroom_id = Column(Integer, ForeignKey('chatroom.id'), nullable=False)
@@ -76,11 +84,15 @@ class ChatroomUser(Base):
 
 class Message(Base):
     __tablename__ = 'message'
+    __table_args__ = (
+        Index('ix_message_chatroom_id_timestamp', 'chatroom_id', 'timestamp'),
+        Index('ix_message_user_id_timestamp', 'user_id', 'timestamp'),
+    )
     id = Column(String(32), primary_key=True)
     user_id = Column(Integer, ForeignKey('user.id'), nullable=False)
     chatroom_id = Column(Integer, ForeignKey('chatroom.id'), nullable=False)
     content = Column(Text, nullable=False)
-    timestamp = Column(DateTime, default=lambda: datetime.now(UTC))
+    timestamp = Column(DateTime, default=utcnow)
 
     user = relationship("User", back_populates="messages")
     chatroom = relationship("Chatroom", back_populates="messages")
@@ -0,0 +1,98 @@
+import asyncio
+import json
+import threading
+from app.config import Config
+
+
+class Subscription:
+    def __init__(self, key, queue_size):
+        self.key = key
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.overflowed = False
+
+    async def get(self):
+        """
+        Wait for the next encoded message, or None once the subscription
+        has been dropped for falling too far behind
+        """
+        return await self.queue.get()
+
+
+class MessageHub:
+    """In-process pub/sub hub that fans chat messages out to the WebSocket
+    subscribers of a (tenant, chatroom) pair.
+
+    Every subscriber gets a bounded queue. A subscriber whose queue is full
+    is dropped instead of slowing the publisher or buffering without limit;
+    it can catch up from the REST history with an ``after`` cursor.
+    """
+
+    def __init__(self, queue_size):
+        self.queue_size = queue_size
+        self.published = 0
+        self.delivered = 0
+        self.dropped_subscribers = 0
+        self._rooms = {}
+        self._loop = None
+        self._lock = threading.Lock()
+
+    def subscribe(self, tenant_id, chatroom_id):
+        self._loop = asyncio.get_running_loop()
+        subscription = Subscription((tenant_id, chatroom_id), self.queue_size)
+        with self._lock:
+            self._rooms.setdefault(subscription.key, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._rooms.get(subscription.key)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._rooms[subscription.key]
+
+    def publish(self, tenant_id, chatroom_id, message):
+        key = (tenant_id, chatroom_id)
+        if key not in self._rooms or self._loop is None:
+            return
+        payload = json.dumps(message, default=str)
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if running_loop is self._loop:
+            self._fan_out(key, payload)
+        else:
+            self._loop.call_soon_threadsafe(self._fan_out, key, payload)
+
+    def _fan_out(self, key, payload):
+        with self._lock:
+            subscribers = list(self._rooms.get(key, ()))
+        self.published += 1
+        for subscription in subscribers:
+            try:
+                subscription.queue.put_nowait(payload)
+                self.delivered += 1
+            except asyncio.QueueFull:
+                self._drop(subscription)
+
+    def _drop(self, subscription):
+        self.unsubscribe(subscription)
+        subscription.overflowed = True
+        self.dropped_subscribers += 1
+        while not subscription.queue.empty():
+            subscription.queue.get_nowait()
+        subscription.queue.put_nowait(None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'rooms': len(self._rooms),
+                'subscribers': sum(len(subscribers) for subscribers in self._rooms.values()),
+                'published': self.published,
+                'delivered': self.delivered,
+                'dropped_subscribers': self.dropped_subscribers
+            }
+
+
+message_hub = MessageHub(queue_size=Config.WS_QUEUE_SIZE)
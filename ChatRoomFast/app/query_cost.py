@@ -0,0 +1,171 @@
+import logging
+from graphql import (FieldNode, FragmentDefinitionNode, FragmentSpreadNode, InlineFragmentNode, IntValueNode,
+                     OperationDefinitionNode, VariableNode, get_named_type, get_nullable_type, is_leaf_type,
+                     is_list_type)
+from app.config import Config
+
+logger = logging.getLogger(__name__)
+
+# Cost of one object returned by a field, where it differs from the default
+# of 1. Scalar fields are free.
+FIELD_COSTS = {
+    'Mutation.sendMessages': 10,
+}
+LIST_SIZE_ARGUMENTS = ('perPage', 'limit')
+
+
+def capped_page_size(per_page: int):
+    return max(1, min(per_page, Config.GRAPHQL_MAX_PAGE_SIZE))
+
+
+def limits_for_tenant(tenant_id: int):
+    limits = {'max_cost': Config.GRAPHQL_MAX_COST, 'max_depth': Config.GRAPHQL_MAX_DEPTH}
+    limits.update(Config.GRAPHQL_TENANT_LIMITS.get(str(tenant_id), {}))
+    return limits
+
+
+class QueryCost:
+    def __init__(self, cost, depth, limits):
+        self.cost = cost
+        self.depth = depth
+        self.limits = limits
+
+    def error(self):
+        if self.depth > self.limits['max_depth']:
+            return f"Query depth {self.depth} exceeds the limit of {self.limits['max_depth']}"
+        if self.cost > self.limits['max_cost']:
+            return f"Query cost {self.cost} exceeds the limit of {self.limits['max_cost']}"
+        return None
+
+    def extension(self):
+        return {
+            'requested': self.cost,
+            'depth': self.depth,
+            'maxCost': self.limits['max_cost'],
+            'maxDepth': self.limits['max_depth']
+        }
+
+
+class _Analysis:
+    def __init__(self, schema, document, variables):
+        self.schema = schema
+        self.variables = variables or {}
+        self.fragments = {definition.name.value: definition for definition in document.definitions
+                          if isinstance(definition, FragmentDefinitionNode)}
+        self.variable_defaults = {}
+        # Fragment name -> (cost, depth below the spread); each fragment is
+        # analyzed once however many times it is spread
+        self.fragment_costs = {}
+
+    def operation_cost(self, operation):
+        self.variable_defaults = {definition.variable.name.value: definition.default_value
+                                  for definition in operation.variable_definitions or ()}
+        root = {
+            'query': self.schema.query_type,
+            'mutation': self.schema.mutation_type,
+            'subscription': self.schema.subscription_type
+        }[operation.operation.value]
+        if root is None:
+            return 0, 0
+        return self.selection_cost(root, operation.selection_set, 0, frozenset())
+
+    def selection_cost(self, parent_type, selection_set, depth, spread):
+        """Returns (cost, depth) of the selections made on one object of parent_type."""
+        cost, max_depth = 0, depth
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                field_cost, field_depth = self.field_cost(parent_type, selection, depth + 1, spread)
+            elif isinstance(selection, InlineFragmentNode):
+                fragment_type = parent_type
+                if selection.type_condition:
+                    fragment_type = self.schema.get_type(selection.type_condition.name.value)
+                if not hasattr(fragment_type, 'fields'):
+                    continue
+                field_cost, field_depth = self.selection_cost(fragment_type, selection.selection_set, depth, spread)
+            elif isinstance(selection, FragmentSpreadNode):
+                name = selection.name.value
+                fragment = self.fragments.get(name)
+                if fragment is None or name in spread:
+                    continue
+                fragment_type = self.schema.get_type(fragment.type_condition.name.value)
+                if not hasattr(fragment_type, 'fields'):
+                    continue
+                if name not in self.fragment_costs:
+                    self.fragment_costs[name] = self.selection_cost(fragment_type, fragment.selection_set, 0,
+                                                                    spread | {name})
+                field_cost, fragment_depth = self.fragment_costs[name]
+                field_depth = depth + fragment_depth
+            else:
+                continue
+            cost += field_cost
+            max_depth = max(max_depth, field_depth)
+        return cost, max_depth
+
+    def field_cost(self, parent_type, node, depth, spread):
+        name = node.name.value
+        field = parent_type.fields.get(name)
+        if name.startswith('__') or field is None:
+            return 0, depth - 1
+        field_type = get_nullable_type(field.type)
+        named_type = get_named_type(field_type)
+        if is_leaf_type(named_type):
+            return 0, depth
+        size = self.list_size(field, node) if is_list_type(field_type) else 1
+        cost = FIELD_COSTS.get(f'{parent_type.name}.{name}', 1) * size
+        if node.selection_set is None or not hasattr(named_type, 'fields'):
+            return cost, depth
+        child_cost, child_depth = self.selection_cost(named_type, node.selection_set, depth, spread)
+        return cost + size * child_cost, child_depth
+
+    def list_size(self, field, node):
+        size = None
+        for argument in node.arguments or ():
+            if argument.name.value in LIST_SIZE_ARGUMENTS:
+                size = self.int_value(argument.value)
+        if size is None:
+            for name in LIST_SIZE_ARGUMENTS:
+                default = getattr(field.args.get(name), 'default_value', None)
+                if isinstance(default, int):
+                    size = default
+        return capped_page_size(Config.GRAPHQL_DEFAULT_LIST_SIZE if size is None else size)
+
+    def int_value(self, value):
+        if isinstance(value, VariableNode):
+            name = value.name.value
+            if name in self.variables:
+                return self.variables[name] if isinstance(self.variables[name], int) else None
+            value = self.variable_defaults.get(name)
+        if isinstance(value, IntValueNode):
+            return int(value.value)
+        return None
+
+
+def analyze_query(schema, document, variables=None, operation_name=None):
+    """
+    Estimate the cost and depth of one operation of a parsed GraphQL document
+    before it is executed. Every object a field returns costs 1 (or its
+    FIELD_COSTS entry), and a list field multiplies the cost of its
+    selections by its perPage or limit argument, capped at
+    GRAPHQL_MAX_PAGE_SIZE. Returns (cost, depth), or (0, 0) when the
+    operation does not exist, leaving that error to execution.
+    """
+    operations = [definition for definition in document.definitions
+                  if isinstance(definition, OperationDefinitionNode)]
+    if operation_name:
+        operations = [operation for operation in operations
+                      if operation.name and operation.name.value == operation_name]
+    if len(operations) != 1:
+        return 0, 0
+    return _Analysis(schema, document, variables).operation_cost(operations[0])
+
+
+def measure_query(schema, document, tenant_id: int, query: str, variables=None, operation_name=None):
+    """Analyze a query against the tenant's limits and log it when it is expensive or rejected."""
+    cost, depth = analyze_query(schema, document, variables, operation_name)
+    query_cost = QueryCost(cost, depth, limits_for_tenant(tenant_id))
+    error = query_cost.error()
+    if error or cost >= Config.GRAPHQL_EXPENSIVE_QUERY_COST:
+        logger.warning("%s GraphQL query: tenant=%s operation=%s cost=%s depth=%s query=%r",
+                       'Rejected' if error else 'Expensive', tenant_id, operation_name, cost, depth,
+                       ' '.join(query.split())[:Config.GRAPHQL_LOG_QUERY_CHARS])
+    return query_cost
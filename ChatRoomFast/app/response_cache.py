@@ -0,0 +1,136 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlencode
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from app.config import Config
+
+
+class CachedResponse:
+    def __init__(self, body, etag, tags, expires):
+        self.body = body
+        self.etag = etag
+        self.tags = tags
+        self.expires = expires
+
+
+def make_etag(body):
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+class ResponseCache:
+    """Per-tenant LRU cache of rendered GET responses with a TTL.
+
+    Every entry carries tags naming the rows it was rendered from, and the
+    services that change those rows invalidate the tags after committing.
+    Each invalidation also bumps the tenant's version, and a response that
+    was rendered while its tenant's version changed is not stored, so a
+    read racing a write cannot cache the pre-write data.
+    """
+
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._tenants = {}
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def version(self, tenant_id):
+        with self._lock:
+            return self._versions.get(tenant_id, 0)
+
+    def get(self, tenant_id, key):
+        with self._lock:
+            entries = self._tenants.get(tenant_id)
+            entry = entries.get(key) if entries else None
+            if entry is None or entry.expires < time.monotonic():
+                if entry is not None:
+                    del entries[key]
+                self.misses += 1
+                return None
+            entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def set(self, tenant_id, key, body, tags, version):
+        """Store body unless the tenant was invalidated since version; returns its ETag."""
+        etag = make_etag(body)
+        if self.ttl <= 0:
+            return etag
+        with self._lock:
+            if self._versions.get(tenant_id, 0) != version:
+                return etag
+            entries = self._tenants.setdefault(tenant_id, OrderedDict())
+            entries[key] = CachedResponse(body, etag, frozenset(tags), time.monotonic() + self.ttl)
+            entries.move_to_end(key)
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+        return etag
+
+    def invalidate(self, tenant_id, *tags):
+        tags = set(tags)
+        with self._lock:
+            self._versions[tenant_id] = self._versions.get(tenant_id, 0) + 1
+            self.invalidations += 1
+            entries = self._tenants.get(tenant_id)
+            if not entries:
+                return
+            for key in [key for key, entry in entries.items() if entry.tags & tags]:
+                del entries[key]
+
+    def clear(self, tenant_id=None):
+        with self._lock:
+            if tenant_id is None:
+                self._tenants.clear()
+            else:
+                self._tenants.pop(tenant_id, None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'tenants': len(self._tenants),
+                'size': sum(len(entries) for entries in self._tenants.values()),
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+
+response_cache = ResponseCache(ttl=Config.RESPONSE_CACHE_TTL, max_entries=Config.RESPONSE_CACHE_SIZE)
+
+
+def etag_matches(if_none_match: str, etag: str):
+    if not if_none_match:
+        return False
+    candidates = {candidate.strip().removeprefix('W/').strip('"') for candidate in if_none_match.split(',')}
+    return '*' in candidates or etag in candidates
+
+
+async def cached_json(request: Request, tenant_id: int, tags: list, render):
+    """
+    Answer a JSON GET request through response_cache. render is awaited on a
+    miss and returns the content; errors it raises are not cached. A matching
+    If-None-Match is answered with 304 straight from the cache
+    """
+    key = request.url.path + '?' + urlencode(sorted(request.query_params.multi_items()))
+    entry = response_cache.get(tenant_id, key)
+    if entry is not None:
+        body, etag = entry.body, entry.etag
+    else:
+        version = response_cache.version(tenant_id)
+        body = JSONResponse(jsonable_encoder(await render())).body
+        etag = response_cache.set(tenant_id, key, body, tags, version)
+
+    headers = {'ETag': f'"{etag}"', 'Cache-Control': 'private, no-cache'}
+    if etag_matches(request.headers.get('if-none-match'), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type='application/json', headers=headers)
@@ -1,12 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from app.services.chatroom import ChatroomService
-from app.services.chatroom_user import ChatroomUserService
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect
+import asyncio
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.services.chatroom import AsyncChatroomService
+from app.services.chatroom_user import AsyncChatroomUserService
 import uuid
-from app.services.message import MessageService
-from ..dependencies import get_tenant_db
+from app.services.message import AsyncMessageService, MESSAGE_QUEUE_FULL
+from app.pubsub import message_hub
+from app.config import Config
+from app.authentication.auth import verify_credentials, verify_websocket_credentials
+from app.response_cache import cached_json
+from ..dependencies import get_async_tenant_db
 from .error_handler import NotFound,BadRequest
 from pydantic import BaseModel
+from typing import Optional
 
 
 class ChatroomUserCreate(BaseModel):
@@ -19,6 +25,16 @@ class MessageCreate(BaseModel):
     content: str
 
 
+class BulkChatroomUserCreate(BaseModel):
+    members: list
+
+
+class BulkMessageCreate(BaseModel):
+    # Items are validated one by one by the service so that a bad item is
+    # reported in the results instead of rejecting the whole batch
+    messages: list
+
+
 
 router = APIRouter()
 
@@ -26,37 +42,45 @@ def generate_error_id():
     return str(uuid.uuid4())
 
 @router.post("/api/chatrooms", status_code=201)
-def create_chatroom(chatroom_data: dict, db: Session = Depends(get_tenant_db)):
-    new_chatroom, error = ChatroomService.create_chatroom(db, chatroom_data)
+async def create_chatroom(chatroom_data: dict, db: AsyncSession = Depends(get_async_tenant_db)):
+    new_chatroom, error = await AsyncChatroomService.create_chatroom(db, chatroom_data)
     if error:
         raise HTTPException(status_code=400, detail=str("There was an error creating the chatroom"))
     return new_chatroom
 
 @router.get("/api/chatrooms")
-def get_chatrooms(
-    db: Session = Depends(get_tenant_db),
+async def get_chatrooms(
+    request: Request,
+    tenant_id: int = Depends(verify_credentials),
+    db: AsyncSession = Depends(get_async_tenant_db),
     page: int = Query(1, ge=1),
     per_page: int = Query(10, ge=1, le=100),
     sort_by: str = Query("created_at"),
-    sort_order: str = Query("desc")
+    sort_order: str = Query("desc"),
+    include_total: bool = Query(True)
 ):
-    chatrooms, error = ChatroomService.get_chatrooms(db, page, per_page, sort_by, sort_order)
-    if error:
-        raise NotFound("No chatrooms found")
-    return chatrooms
+    async def render():
+        chatrooms, error = await AsyncChatroomService.get_chatrooms(db, page, per_page, sort_by, sort_order, include_total)
+        if error:
+            raise NotFound("No chatrooms found")
+        return chatrooms
+    return await cached_json(request, tenant_id, ['chatrooms'], render)
 
 @router.get("/api/chatrooms/{chatroom_id}")
-def get_chatroom(chatroom_id: int, db: Session = Depends(get_tenant_db)):
-    chatroom, error = ChatroomService.get_chatroom(db, chatroom_id)
-    if error:
-        raise HTTPException(status_code=400, detail=str(error))
-    if not chatroom:
-        raise NotFound("Chatroom with particular ID not found")
-    return chatroom
+async def get_chatroom(chatroom_id: int, request: Request, tenant_id: int = Depends(verify_credentials),
+                       db: AsyncSession = Depends(get_async_tenant_db)):
+    async def render():
+        chatroom, error = await AsyncChatroomService.get_chatroom(db, chatroom_id)
+        if error:
+            raise HTTPException(status_code=400, detail=str(error))
+        if not chatroom:
+            raise NotFound("Chatroom with particular ID not found")
+        return chatroom
+    return await cached_json(request, tenant_id, [f'chatroom:{chatroom_id}'], render)
 
 @router.put("/api/chatrooms/{chatroom_id}")
-def update_chatroom(chatroom_id: int, chatroom_data: dict, db: Session = Depends(get_tenant_db)):
-    updated_chatroom, error = ChatroomService.update_chatroom(db, chatroom_id, chatroom_data)
+async def update_chatroom(chatroom_id: int, chatroom_data: dict, db: AsyncSession = Depends(get_async_tenant_db)):
+    updated_chatroom, error = await AsyncChatroomService.update_chatroom(db, chatroom_id, chatroom_data)
     if error:
         raise HTTPException(status_code=400, detail=str(error))
     if not updated_chatroom:
@@ -64,47 +88,65 @@ def update_chatroom(chatroom_id: int, chatroom_data: dict, db: Session = Depends
     return updated_chatroom
 
 @router.delete("/api/chatrooms/{chatroom_id}", status_code=204)
-def delete_chatroom(chatroom_id: int, db: Session = Depends(get_tenant_db)):
-    success, error = ChatroomService.delete_chatroom(db, chatroom_id)
+async def delete_chatroom(chatroom_id: int, db: AsyncSession = Depends(get_async_tenant_db)):
+    success, error = await AsyncChatroomService.delete_chatroom(db, chatroom_id)
     if error:
         raise HTTPException(status_code=400, detail=str(error))
     if not success:
         raise NotFound("Chatroom with particular ID not found")
     
 
-from app.dependencies import get_tenant_db
-
-
 
 @router.post("/api/chatrooms/{chatroom_id}/users", status_code=201)
-def add_user_to_chatroom(
+async def add_user_to_chatroom(
     chatroom_id: int,
     user_data: ChatroomUserCreate,
-    db: Session = Depends(get_tenant_db)
+    db: AsyncSession = Depends(get_async_tenant_db)
 ):
-    new_chatroom_user, error = ChatroomUserService.add_user_to_chatroom(db, chatroom_id, user_data.user_id, user_data.role)
+    new_chatroom_user, error = await AsyncChatroomUserService.add_user_to_chatroom(db, chatroom_id, user_data.user_id, user_data.role)
     if error:
         raise BadRequest("Bad Request ")
     return new_chatroom_user
 
+@router.post("/api/chatrooms/{chatroom_id}/users/bulk", status_code=201)
+async def add_users_to_chatroom(
+    chatroom_id: int,
+    payload: BulkChatroomUserCreate,
+    response: Response,
+    db: AsyncSession = Depends(get_async_tenant_db)
+):
+    if not payload.members:
+        raise BadRequest("members must be a non-empty array")
+    if len(payload.members) > Config.BULK_PROVISION_MAX_ITEMS:
+        raise BadRequest(f"At most {Config.BULK_PROVISION_MAX_ITEMS} members can be added at once")
+
+    result, error = await AsyncChatroomUserService.add_users_to_chatroom(db, chatroom_id, payload.members)
+    if error:
+        raise BadRequest(error)
+    if result['failed']:
+        response.status_code = 207
+    return result
+
 @router.get("/api/chatrooms/{chatroom_id}/users")
-def get_users_in_chatroom(
+async def get_users_in_chatroom(
     chatroom_id: int,
-    db: Session = Depends(get_tenant_db),
+    db: AsyncSession = Depends(get_async_tenant_db),
     page: int = Query(1, ge=1),
     per_page: int = Query(10, ge=1, le=100),
     sort_by: str = Query("joined_at"),
     sort_order: str = Query("desc"),
-    name: str = Query(None)
+    name: str = Query(None),
+    include_total: bool = Query(True)
 ):
-    users, error = ChatroomUserService.get_users_in_chatroom(db, chatroom_id, page, per_page, sort_by, sort_order, name)
+    users, error = await AsyncChatroomUserService.get_users_in_chatroom(db, chatroom_id, page, per_page, sort_by, sort_order, name,
+                                                                        include_total)
     if error:
         raise NotFound("No users found in chatroom")
     return users
 
 @router.delete("/api/chatrooms/{chatroom_id}/users/{user_id}", status_code=204)
-def remove_user_from_chatroom(chatroom_id: int, user_id: int, db: Session = Depends(get_tenant_db)):
-    success, error = ChatroomUserService.remove_user_from_chatroom(db, chatroom_id, user_id)
+async def remove_user_from_chatroom(chatroom_id: int, user_id: int, db: AsyncSession = Depends(get_async_tenant_db)):
+    success, error = await AsyncChatroomUserService.remove_user_from_chatroom(db, chatroom_id, user_id)
     if error:
         raise HTTPException(status_code=400, detail=str(error))
     if not success:
@@ -113,43 +155,144 @@ def remove_user_from_chatroom(chatroom_id: int, user_id: int, db: Session = Depe
 
 
 @router.post("/api/chatrooms/{chatroom_id}/messages", status_code=201)
-def send_message(
+async def send_message(
     chatroom_id: int, 
     message: MessageCreate,
-    db: Session = Depends(get_tenant_db)
+    response: Response,
+    db: AsyncSession = Depends(get_async_tenant_db)
 ):
-    new_message, error = MessageService.send_message(db, chatroom_id, message.user_id, message.content)
+    new_message, error = await AsyncMessageService.send_message(db, chatroom_id, message.user_id, message.content)
+    if error == MESSAGE_QUEUE_FULL:
+        raise HTTPException(status_code=503, detail=error, headers={'Retry-After': '1'})
     if error:
         raise NotFound("The requested data could not be found")
+    # Buffered messages are accepted but not yet written; one that then fails
+    # to write is logged and counted in the message_ingest metrics only
+    if Config.MESSAGE_INGEST_MODE == 'buffered':
+        response.status_code = 202
     return new_message
 
+@router.post("/api/chatrooms/{chatroom_id}/messages/bulk", status_code=201)
+async def send_messages(
+    chatroom_id: int,
+    payload: BulkMessageCreate,
+    response: Response,
+    db: AsyncSession = Depends(get_async_tenant_db)
+):
+    if not payload.messages:
+        raise BadRequest("messages must be a non-empty array")
+    if len(payload.messages) > Config.MESSAGE_BULK_MAX_ITEMS:
+        raise BadRequest(f"At most {Config.MESSAGE_BULK_MAX_ITEMS} messages can be sent at once")
+
+    result, error = await AsyncMessageService.send_messages(db, chatroom_id, payload.messages)
+    if error:
+        raise BadRequest(error)
+    # 207 tells the caller to check the per-item results
+    if result['failed']:
+        response.status_code = 207
+    return result
+
 @router.get("/api/chatrooms/{chatroom_id}/messages")
-def get_messages(
+async def get_messages(
     chatroom_id: int,
-    db: Session = Depends(get_tenant_db),
+    db: AsyncSession = Depends(get_async_tenant_db),
     page: int = Query(1, ge=1),
     per_page: int = Query(10, ge=1, le=100),
     sort_by: str = Query("timestamp"),
     sort_order: str = Query("desc"),
     start_date: str = Query(None),
     end_date: str = Query(None),
-    search: str = Query(None)
+    search: str = Query(None),
+    match: str = Query(None),
+    before: str = Query(None),
+    after: str = Query(None),
+    pagination: str = Query("offset"),
+    include_total: Optional[bool] = Query(None)
 ):
-    messages, error = MessageService.get_messages(db, chatroom_id, page, per_page, sort_by, sort_order, start_date, end_date, search)
+    # Totals are opt-in for cursor pages and opt-out for offset pages
+    if before or after or pagination == "cursor":
+        messages, error = await AsyncMessageService.get_messages_by_cursor(db, chatroom_id, per_page, before, after, sort_order,
+                                                                bool(include_total), start_date, end_date, search, match)
+    else:
+        messages, error = await AsyncMessageService.get_messages(db, chatroom_id, page, per_page, sort_by, sort_order, start_date, end_date, search,
+                                                                 include_total is not False, match)
     if error:
         raise HTTPException(status_code=400, detail=str(error))
     return messages
 
+@router.websocket("/api/chatrooms/{chatroom_id}/ws")
+async def chatroom_messages_ws(websocket: WebSocket, chatroom_id: int):
+    tenant_id = await verify_websocket_credentials(websocket)
+    if tenant_id is None:
+        await websocket.close(code=1008)
+        return
+
+    await websocket.accept()
+    subscription = message_hub.subscribe(tenant_id, chatroom_id)
+
+    async def forward_messages():
+        while True:
+            payload = await subscription.get()
+            if payload is None:
+                # Dropped by the hub for falling behind; the client should
+                # reconnect and catch up with an `after` cursor.
+                await websocket.close(code=1013)
+                return
+            await websocket.send_text(payload)
+
+    async def wait_for_disconnect():
+        while True:
+            event = await websocket.receive()
+            if event['type'] == 'websocket.disconnect':
+                return
+
+    tasks = [asyncio.create_task(forward_messages()), asyncio.create_task(wait_for_disconnect())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        for task in tasks:
+            task.cancel()
+        message_hub.unsubscribe(subscription)
+
+@router.get("/api/chatrooms/{chatroom_id}/messages/search")
+async def search_chatroom_messages(
+    chatroom_id: int,
+    q: str = Query(..., min_length=1),
+    db: AsyncSession = Depends(get_async_tenant_db),
+    page: int = Query(1, ge=1),
+    per_page: int = Query(20, ge=1, le=100)
+):
+    result, error = await AsyncMessageService.search_messages(db, q, chatroom_id, page, per_page)
+    if error:
+        raise BadRequest(error)
+    return result
+
+@router.get("/api/messages/search")
+async def search_messages(
+    q: str = Query(..., min_length=1),
+    chatroom_id: int = Query(None),
+    db: AsyncSession = Depends(get_async_tenant_db),
+    page: int = Query(1, ge=1),
+    per_page: int = Query(20, ge=1, le=100)
+):
+    result, error = await AsyncMessageService.search_messages(db, q, chatroom_id, page, per_page)
+    if error:
+        raise BadRequest(error)
+    return result
+
 @router.get("/api/users/{user_id}/messages")
-def get_user_messages(
+async def get_user_messages(
     user_id: int,
-    db: Session = Depends(get_tenant_db),
+    db: AsyncSession = Depends(get_async_tenant_db),
     page: int = Query(1, ge=1),
     per_page: int = Query(10, ge=1, le=100),
     sort_by: str = Query("timestamp"),
-    sort_order: str = Query("desc")
+    sort_order: str = Query("desc"),
+    include_total: bool = Query(True)
 ):
-    messages, error = MessageService.get_user_messages(db, user_id, page, per_page, sort_by, sort_order)
+    messages, error = await AsyncMessageService.get_user_messages(db, user_id, page, per_page, sort_by, sort_order, include_total)
     if error:
         raise HTTPException(status_code=400, detail=str(error))
     return messages
\ No newline at end of file
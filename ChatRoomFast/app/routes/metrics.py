@@ -0,0 +1,9 @@
+from fastapi import APIRouter
+from fastapi.responses import Response
+from app.metrics import registry, CONTENT_TYPE
+
+router = APIRouter()
+
+@router.get("/metrics")
+def metrics():
+    return Response(registry.render(), media_type=CONTENT_TYPE)
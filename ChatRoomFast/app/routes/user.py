@@ -1,53 +1,84 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from app.services.user import UserService
-from ..dependencies import get_tenant_db
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.services.user import AsyncUserService
+from ..dependencies import get_async_tenant_db
 from .error_handler import BadRequest,NotFound
 import uuid
 from app.authentication.auth import verify_credentials
+from app.config import Config
+from app.response_cache import cached_json
+from pydantic import BaseModel
 
 router = APIRouter()
 
+
+class BulkUserCreate(BaseModel):
+    # Items are validated one by one by the service so that a bad row is
+    # reported in the results instead of rejecting the whole batch
+    users: list
+
+
 def generate_error_id():
     return str(uuid.uuid4())
 
 
 @router.post("/api/users", status_code=201)
-def create_user(user_data: dict, 
-                db: Session = Depends(get_tenant_db)):
-    user_dict, error = UserService.create_user(db, user_data)
+async def create_user(user_data: dict, 
+                db: AsyncSession = Depends(get_async_tenant_db)):
+    user_dict, error = await AsyncUserService.create_user(db, user_data)
     if error:
         raise BadRequest(str(error))
     return user_dict
 
+@router.post("/api/users/bulk", status_code=201)
+async def create_users(payload: BulkUserCreate,
+                response: Response,
+                db: AsyncSession = Depends(get_async_tenant_db)):
+    if not payload.users:
+        raise BadRequest("users must be a non-empty array")
+    if len(payload.users) > Config.BULK_PROVISION_MAX_ITEMS:
+        raise BadRequest(f"At most {Config.BULK_PROVISION_MAX_ITEMS} users can be created at once")
+
+    result, error = await AsyncUserService.create_users(db, payload.users)
+    if error:
+        raise BadRequest(str(error))
+    if result['failed']:
+        response.status_code = 207
+    return result
+
 @router.get("/api/users")
-def get_users(
+async def get_users(
     page: int = Query(1, ge=1),
     per_page: int = Query(10, ge=1, le=100),
     sort_by: str = Query("created_at"),
     sort_order: str = Query("desc"),
-    db: Session = Depends(get_tenant_db),
+    include_total: bool = Query(True),
+    db: AsyncSession = Depends(get_async_tenant_db),
 ):
     
-    users, error =  UserService.get_users(db, page, per_page, sort_by, sort_order)
+    users, error = await AsyncUserService.get_users(db, page, per_page, sort_by, sort_order, include_total)
     if error:
         raise NotFound("No  such users found")
     return users
 
 @router.get("/api/users/{user_id}")
-def get_user(user_id: int,
-                   db: Session = Depends(get_tenant_db)):
+async def get_user(user_id: int,
+                   request: Request,
+                   tenant_id: int = Depends(verify_credentials),
+                   db: AsyncSession = Depends(get_async_tenant_db)):
     
-    user, error = UserService.get_user(db, user_id)
-    if error:
-        raise HTTPException(status_code=400, detail=str(error))
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    return user
+    async def render():
+        user, error = await AsyncUserService.get_user(db, user_id)
+        if error:
+            raise HTTPException(status_code=400, detail=str(error))
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        return user
+    return await cached_json(request, tenant_id, [f'user:{user_id}'], render)
 
 @router.put("/api/users/{user_id}")
-def update_user(user_id: int, user_data: dict, db: Session = Depends(get_tenant_db)):
-    updated_user, error =  UserService.update_user(db, user_id, user_data)
+async def update_user(user_id: int, user_data: dict, db: AsyncSession = Depends(get_async_tenant_db)):
+    updated_user, error = await AsyncUserService.update_user(db, user_id, user_data)
     if error:
         raise HTTPException(status_code=400, detail=str(error))
     if not updated_user:
@@ -55,8 +86,8 @@ def update_user(user_id: int, user_data: dict, db: Session = Depends(get_tenant_
     return updated_user
 
 @router.delete("/api/users/{user_id}", status_code=204)
-def delete_user(user_id: int, db: Session = Depends(get_tenant_db)):
-    success, error = UserService.delete_user(db, user_id)
+async def delete_user(user_id: int, db: AsyncSession = Depends(get_async_tenant_db)):
+    success, error = await AsyncUserService.delete_user(db, user_id)
     if error:
         raise HTTPException(status_code=400, detail=str(error))
     if not success:
@@ -1,11 +1,32 @@
 import graphene
-from datetime import datetime
-from .dependencies import get_tenant_db
-from sqlalchemy import desc
 from contextlib import asynccontextmanager
+from datetime import datetime
+from fastapi.security import HTTPBasic
+from graphql import GraphQLError
+from sqlalchemy import select
+from starlette.background import BackgroundTasks
 from app.authentication.auth import verify_credentials
-from fastapi import Depends
-from fastapi.security import HTTPBasic, HTTPBasicCredentials
+from app.config import Config
+from app.extensions import async_session
+from app.loaders import TenantLoaders
+from app.query_cost import capped_page_size
+from app.models import Tenant as TenantModel
+from app.services.tenant import TenantService
+from app.services.user import AsyncUserService
+from app.services.chatroom import AsyncChatroomService
+from app.services.chatroom_user import AsyncChatroomUserService
+from app.services.message import AsyncMessageService
+
+security = HTTPBasic()
+
+
+@asynccontextmanager
+async def tenant_session(info):
+    db = await TenantService.get_async_tenant_session(info.context["tenant_id"])
+    if db is None:
+        raise GraphQLError("Invalid tenant ID or tenant database not found")
+    async with db:
+        yield db
 
 
 class Tenant(graphene.ObjectType):
@@ -24,16 +45,11 @@ class CreateTenant(graphene.Mutation):
     error = graphene.String()
 
     async def mutate(self, info, name, db_name, password):
-        async with get_tenant_db() as db:
-            try:
-                new_tenant = Tenant(name=name, db_name=db_name, password=password)
-                db.add(new_tenant)
-                await db.commit()
-                await db.refresh(new_tenant)
-                return CreateTenant(tenant=Tenant(id=new_tenant.id, name=new_tenant.name, db_name=new_tenant.db_name), error=None)
-            except Exception as e:
-                await db.rollback()
-                return CreateTenant(tenant=None, error=str(e))
+        async with async_session() as db:
+            new_tenant, error = await db.run_sync(TenantService.create_tenant, name, db_name, password)
+        if error:
+            return CreateTenant(tenant=None, error=error)
+        return CreateTenant(tenant=Tenant(id=new_tenant.id, name=new_tenant.name, db_name=new_tenant.db_name), error=None)
 
 
 class User(graphene.ObjectType):
@@ -48,87 +64,138 @@ class Chatroom(graphene.ObjectType):
     id = graphene.Int()
     name = graphene.String()
     description = graphene.String()
+    members = graphene.List(lambda: ChatroomUser)
+    latest_messages = graphene.List(lambda: Message, limit=graphene.Int(default_value=10))
+
+    def resolve_members(parent, info):
+        return info.context["loaders"].members.load(parent["id"])
+
+    def resolve_latest_messages(parent, info, limit=10):
+        limit = max(1, min(limit, Config.GRAPHQL_LATEST_MESSAGES_MAX))
+        return info.context["loaders"].latest_messages(limit).load(parent["id"])
 
 
 class ChatroomUser(graphene.ObjectType):
-    id = graphene.Int()
+    id = graphene.String()
     user_id = graphene.Int()
     chatroom_id = graphene.Int()
     role = graphene.String()
+    user = graphene.Field(User)
+    chatroom = graphene.Field(Chatroom)
+
+    def resolve_user(parent, info):
+        return info.context["loaders"].users.load(parent["user_id"])
+
+    def resolve_chatroom(parent, info):
+        return info.context["loaders"].chatrooms.load(parent["chatroom_id"])
 
 
 class Message(graphene.ObjectType):
-    id = graphene.Int()
+    id = graphene.String()
     user_id = graphene.Int()
     chatroom_id = graphene.Int()
     content = graphene.String()
     timestamp = graphene.DateTime()
+    user = graphene.Field(User)
+    chatroom = graphene.Field(Chatroom)
+
+    def resolve_timestamp(parent, info):
+        timestamp = parent["timestamp"]
+        return datetime.fromisoformat(timestamp) if timestamp else None
+
+    def resolve_user(parent, info):
+        return info.context["loaders"].users.load(parent["user_id"])
+
+    def resolve_chatroom(parent, info):
+        return info.context["loaders"].chatrooms.load(parent["chatroom_id"])
 
 
 class Query(graphene.ObjectType):
     user = graphene.Field(User, id=graphene.Int(required=True))
-    all_users = graphene.List(User, page=graphene.Int(), per_page=graphene.Int())
+    all_users = graphene.List(User, page=graphene.Int(default_value=1), per_page=graphene.Int(default_value=10))
     chatroom = graphene.Field(Chatroom, id=graphene.Int(required=True))
-    all_chatrooms = graphene.List(Chatroom, page=graphene.Int(), per_page=graphene.Int())
-    chatroom_users = graphene.List(ChatroomUser, chatroom_id=graphene.Int(required=True))
-    messages = graphene.List(Message, chatroom_id=graphene.Int(required=True), page=graphene.Int(), per_page=graphene.Int())
-    user_messages = graphene.List(Message, user_id=graphene.Int(required=True), page=graphene.Int(), per_page=graphene.Int())
+    all_chatrooms = graphene.List(Chatroom, page=graphene.Int(default_value=1), per_page=graphene.Int(default_value=10))
+    chatroom_users = graphene.List(ChatroomUser, chatroom_id=graphene.Int(required=True), page=graphene.Int(default_value=1), per_page=graphene.Int(default_value=100))
+    messages = graphene.List(Message, chatroom_id=graphene.Int(required=True), page=graphene.Int(default_value=1), per_page=graphene.Int(default_value=10))
+    user_messages = graphene.List(Message, user_id=graphene.Int(required=True), page=graphene.Int(default_value=1), per_page=graphene.Int(default_value=10))
 
     async def resolve_user(self, info, id):
         """
         Get a user by id
         """
-        db = next(get_tenant_db())
-        user = db.query(User).filter(User.id == id).first()
-        return User(id=user.id, username=user.username, email=user.email, password=user.password, mobile=user.mobile)
+        async with tenant_session(info) as db:
+            user, error = await AsyncUserService.get_user(db, id)
+        if error:
+            raise GraphQLError(error)
+        return user
 
     async def resolve_all_users(self, info, page=1, per_page=10):
         """
         Get all users
         """
-        db = next(get_tenant_db())
-        users = db.query(User).offset((page - 1) * per_page).limit(per_page).all()
-        return [User(id=u.id, username=u.username, email=u.email, password=u.password, mobile=u.mobile) for u in users]
+        per_page = capped_page_size(per_page)
+        async with tenant_session(info) as db:
+            result, error = await AsyncUserService.get_users(db, page, per_page, "created_at", "desc", include_total=False)
+        if error:
+            raise GraphQLError(error)
+        return result["items"]
 
     async def resolve_chatroom(self, info, id):
         """
         Get a chatroom by id
         """
-        db = next(get_tenant_db())
-        chatroom = db.query(Chatroom).filter(Chatroom.id == id).first()
-        return Chatroom(id=chatroom.id, name=chatroom.name, description=chatroom.description)
+        async with tenant_session(info) as db:
+            chatroom, error = await AsyncChatroomService.get_chatroom(db, id)
+        if error:
+            raise GraphQLError(error)
+        return chatroom
 
     async def resolve_all_chatrooms(self, info, page=1, per_page=10):
         """
         Get all chatrooms
         """
-        db = next(get_tenant_db())
-        chatrooms = db.query(Chatroom).offset((page - 1) * per_page).limit(per_page).all()
-        return [Chatroom(id=c.id, name=c.name, description=c.description) for c in chatrooms]
-
-    async def resolve_chatroom_users(self, info, chatroom_id):
+        per_page = capped_page_size(per_page)
+        async with tenant_session(info) as db:
+            result, error = await AsyncChatroomService.get_chatrooms(db, page, per_page, "created_at", "desc", include_total=False)
+        if error:
+            raise GraphQLError(error)
+        return result["items"]
+
+    async def resolve_chatroom_users(self, info, chatroom_id, page=1, per_page=100):
         """
         Get users for a chatroom
         """
-        db = next(get_tenant_db())
-        cu_list = db.query(ChatroomUser).filter(ChatroomUser.chatroom_id == chatroom_id).all()
-        return [ChatroomUser(id=cu.id, user_id=cu.user_id, chatroom_id=cu.chatroom_id, role=cu.role) for cu in cu_list]
+        per_page = capped_page_size(per_page)
+        async with tenant_session(info) as db:
+            result, error = await AsyncChatroomUserService.get_users_in_chatroom(db, chatroom_id, page, per_page, "joined_at", "desc",
+                                                                                 include_total=False)
+        if error:
+            raise GraphQLError(error)
+        return result["users"]
 
     async def resolve_messages(self, info, chatroom_id, page=1, per_page=10):
         """
         Get messages for a chatroom
         """
-        db = next(get_tenant_db())
-        messages = db.query(Message).filter(Message.chatroom_id == chatroom_id).order_by(desc(Message.timestamp)).offset((page - 1) * per_page).limit(per_page).all()
-        return [Message(id=m.id, user_id=m.user_id, chatroom_id=m.chatroom_id, content=m.content, timestamp=m.timestamp) for m in messages]
+        per_page = capped_page_size(per_page)
+        async with tenant_session(info) as db:
+            result, error = await AsyncMessageService.get_messages(db, chatroom_id, page, per_page, "timestamp", "desc",
+                                                                  include_total=False)
+        if error:
+            raise GraphQLError(error)
+        return result["messages"]
 
     async def resolve_user_messages(self, info, user_id, page=1, per_page=10):
         """
         Get message for a user
         """
-        db = next(get_tenant_db())
-        messages = db.query(Message).filter(Message.user_id == user_id).order_by(desc(Message.timestamp)).offset((page - 1) * per_page).limit(per_page).all()
-        return [Message(id=m.id, user_id=m.user_id, chatroom_id=m.chatroom_id, content=m.content, timestamp=m.timestamp) for m in messages]
+        per_page = capped_page_size(per_page)
+        async with tenant_session(info) as db:
+            result, error = await AsyncMessageService.get_user_messages(db, user_id, page, per_page, "timestamp", "desc",
+                                                                       include_total=False)
+        if error:
+            raise GraphQLError(error)
+        return result["messages"]
 
 
 class CreateUser(graphene.Mutation):
@@ -139,13 +206,14 @@ class CreateUser(graphene.Mutation):
         mobile = graphene.String()
 
     user = graphene.Field(lambda: User)
+
     async def mutate(self, info, username, email, password, mobile=None):
-        async with get_tenant_db() as db:
-            user = User(username=username, email=email, password=password, mobile=mobile)
-            db.add(user)
-            await db.commit()
-            await db.refresh(user)
-            return CreateUser(user=user)
+        async with tenant_session(info) as db:
+            user, error = await AsyncUserService.create_user(
+                db, {"username": username, "email": email, "password": password, "mobile": mobile})
+        if error:
+            raise GraphQLError(error)
+        return CreateUser(user=user)
         
 
 
@@ -159,19 +227,13 @@ class UpdateUser(graphene.Mutation):
     user = graphene.Field(lambda: User)
 
     async def mutate(self, info, id, username=None, email=None, mobile=None):
-        
-        async with get_tenant_db() as db:
-            user = db.query(User).filter(User.id == id).first()
-            if user:
-                if username:
-                    user.username = username
-                if email:
-                    user.email = email
-                if mobile:
-                    user.mobile = mobile
-                await db.commit()
-                await db.refresh(user)
-            return UpdateUser(user=user)
+        data = {key: value for key, value in
+                {"username": username, "email": email, "mobile": mobile}.items() if value}
+        async with tenant_session(info) as db:
+            user, error = await AsyncUserService.update_user(db, id, data)
+        if error:
+            raise GraphQLError(error)
+        return UpdateUser(user=user)
 
 
 class DeleteUser(graphene.Mutation):
@@ -181,15 +243,11 @@ class DeleteUser(graphene.Mutation):
     success = graphene.Boolean()
 
     async def mutate(self, info, id):
-        
-        
-        async with get_tenant_db() as db:
-            user = db.query(User).filter(User.id == id).first()
-            if user:
-                await db.delete(user)
-                await db.commit()
-                return DeleteUser(success=True)
-            return DeleteUser(success=False)
+        async with tenant_session(info) as db:
+            success, error = await AsyncUserService.delete_user(db, id)
+        if error:
+            raise GraphQLError(error)
+        return DeleteUser(success=success)
 
 
 class CreateChatroom(graphene.Mutation): 
@@ -200,12 +258,11 @@ class CreateChatroom(graphene.Mutation):
     chatroom = graphene.Field(lambda: Chatroom)
 
     async def mutate(self, info, name, description=None):
-        async with get_tenant_db() as db:
-            chatroom = Chatroom(name=name, description=description)
-            db.add(chatroom)
-            await db.commit()
-            await db.refresh(chatroom)
-            return CreateChatroom(chatroom=chatroom)
+        async with tenant_session(info) as db:
+            chatroom, error = await AsyncChatroomService.create_chatroom(db, {"name": name, "description": description})
+        if error:
+            raise GraphQLError(error)
+        return CreateChatroom(chatroom=chatroom)
 
 class UpdateChatroom(graphene.Mutation):
     class Arguments:
@@ -216,16 +273,12 @@ class UpdateChatroom(graphene.Mutation):
     chatroom = graphene.Field(lambda: Chatroom)
 
     async def mutate(self, info, id, name=None, description=None):
-        async with get_tenant_db() as db:
-            chatroom = db.query(Chatroom).filter(Chatroom.id == id).first()
-            if chatroom:
-                if name:
-                    chatroom.name = name
-                if description:
-                    chatroom.description = description
-                await db.commit()
-                await db.refresh(chatroom)
-            return UpdateChatroom(chatroom=chatroom)
+        data = {key: value for key, value in {"name": name, "description": description}.items() if value}
+        async with tenant_session(info) as db:
+            chatroom, error = await AsyncChatroomService.update_chatroom(db, id, data)
+        if error:
+            raise GraphQLError(error)
+        return UpdateChatroom(chatroom=chatroom)
 
 
 class DeleteChatroom(graphene.Mutation):
@@ -235,13 +288,11 @@ class DeleteChatroom(graphene.Mutation):
     success = graphene.Boolean()
 
     async def mutate(self, info, id):
-        async with get_tenant_db() as db:
-            chatroom = db.query(Chatroom).filter(Chatroom.id == id).first()
-            if chatroom:
-                await db.delete(chatroom)
-                await db.commit()
-                return DeleteChatroom(success=True)
-            return DeleteChatroom(success=False)
+        async with tenant_session(info) as db:
+            success, error = await AsyncChatroomService.delete_chatroom(db, id)
+        if error:
+            raise GraphQLError(error)
+        return DeleteChatroom(success=success)
 
 
 class AddUserToChatroom(graphene.Mutation):
@@ -253,12 +304,11 @@ class AddUserToChatroom(graphene.Mutation):
     chatroom_user = graphene.Field(lambda: ChatroomUser)
 
     async def mutate(self, info, user_id, chatroom_id, role="member"):
-        async with get_tenant_db() as db:
-            chatroom_user = ChatroomUser(user_id=user_id, chatroom_id=chatroom_id, role=role)
-            db.add(chatroom_user)
-            await db.commit()
-            await db.refresh(chatroom_user)
-            return AddUserToChatroom(chatroom_user=chatroom_user)
+        async with tenant_session(info) as db:
+            chatroom_user, error = await AsyncChatroomUserService.add_user_to_chatroom(db, chatroom_id, user_id, role)
+        if error:
+            raise GraphQLError(error)
+        return AddUserToChatroom(chatroom_user=chatroom_user)
 
 
 class RemoveUserFromChatroom(graphene.Mutation):
@@ -269,16 +319,9 @@ class RemoveUserFromChatroom(graphene.Mutation):
     success = graphene.Boolean()
 
     async def mutate(self, info, user_id, chatroom_id):
-        async with get_tenant_db() as db:
-            chatroom_user = db.query(ChatroomUser).filter(
-                ChatroomUser.user_id == user_id,
-                ChatroomUser.chatroom_id == chatroom_id
-            ).first()
-            if chatroom_user:
-                await db.delete(chatroom_user)
-                await db.commit()
-                return RemoveUserFromChatroom(success=True)
-            return RemoveUserFromChatroom(success=False)
+        async with tenant_session(info) as db:
+            success, error = await AsyncChatroomUserService.remove_user_from_chatroom(db, chatroom_id, user_id)
+        return RemoveUserFromChatroom(success=success)
 
 
 class SendMessage(graphene.Mutation):
@@ -290,12 +333,51 @@ class SendMessage(graphene.Mutation):
     message = graphene.Field(lambda: Message)
 
     async def mutate(self, info, user_id, chatroom_id, content):
-        async with get_tenant_db() as db:
-            message = Message(user_id=user_id, chatroom_id=chatroom_id, content=content)
-            db.add(message)
-            await db.commit()
-            await db.refresh(message)
-            return SendMessage(message=message)
+        async with tenant_session(info) as db:
+            message, error = await AsyncMessageService.send_message(db, chatroom_id, user_id, content)
+        if error:
+            raise GraphQLError(error)
+        return SendMessage(message=message)
+
+class MessageInput(graphene.InputObjectType):
+    user_id = graphene.Int(required=True)
+    content = graphene.String(required=True)
+
+
+class BulkMessageItem(graphene.ObjectType):
+    index = graphene.Int()
+    status = graphene.String()
+    error = graphene.String()
+    message = graphene.Field(Message)
+
+
+class SendMessages(graphene.Mutation):
+    class Arguments:
+        chatroom_id = graphene.Int(required=True)
+        messages = graphene.List(graphene.NonNull(MessageInput), required=True)
+
+    created = graphene.Int()
+    failed = graphene.Int()
+    results = graphene.List(BulkMessageItem)
+
+    async def mutate(self, info, chatroom_id, messages):
+        if len(messages) > Config.MESSAGE_BULK_MAX_ITEMS:
+            raise GraphQLError(f"At most {Config.MESSAGE_BULK_MAX_ITEMS} messages can be sent at once")
+        async with tenant_session(info) as db:
+            result, error = await AsyncMessageService.send_messages(db, chatroom_id, [dict(message) for message in messages])
+        if error:
+            raise GraphQLError(error)
+        return SendMessages(**result)
+
+
+class TenantQuery(graphene.ObjectType):
+    tenant_exists = graphene.Boolean(name=graphene.String(required=True))
+
+    async def resolve_tenant_exists(self, info, name):
+        async with async_session() as db:
+            tenant = await db.scalar(select(TenantModel).filter_by(name=name))
+        return tenant is not None
+
 
 class TenantMutation(graphene.ObjectType):
     create_tenant = CreateTenant.Field()
@@ -311,16 +393,18 @@ class Mutation(graphene.ObjectType):
     add_user_to_chatroom = AddUserToChatroom.Field()
     remove_user_from_chatroom = RemoveUserFromChatroom.Field()
     send_message = SendMessage.Field()
+    send_messages = SendMessages.Field()
 
 
-async def get_context(request, credentials: HTTPBasicCredentials = Depends(HTTPBasic())):
-    tenant_id = verify_credentials(credentials)
-    db = get_tenant_db(tenant_id)
+async def get_context(request):
+    credentials = await security(request)
+    tenant_id = await verify_credentials(credentials, request)
     return {
         "request": request,
-        "db": db,
-        "tenant_id": tenant_id
+        "background": BackgroundTasks(),
+        "tenant_id": tenant_id,
+        "loaders": TenantLoaders(tenant_id)
     }
 
-tenant_schema = graphene.Schema(mutation=TenantMutation)
-schema = graphene.Schema(query=Query, mutation=Mutation,context_value=get_context)
\ No newline at end of file
+tenant_schema = graphene.Schema(query=TenantQuery, mutation=TenantMutation)
+schema = graphene.Schema(query=Query, mutation=Mutation)
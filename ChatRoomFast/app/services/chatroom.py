@@ -1,6 +1,9 @@
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.models import Chatroom
-import math
+from app.database import chunked, fetch_page, total_pages
+from app.counters import stored_count, CHATROOMS
+from app.response_cache import response_cache
 
 
 class ChatroomService:
@@ -10,6 +13,7 @@ class ChatroomService:
             new_chatroom = Chatroom(**chatroom_data)
             db.add(new_chatroom)
             db.commit()
+            response_cache.invalidate(db.info.get('tenant_id'), 'chatrooms')
             db.refresh(new_chatroom)
             
             return new_chatroom.to_dict(), None
@@ -18,7 +22,7 @@ class ChatroomService:
             return None, str(e)
 
     @staticmethod
-    def get_chatrooms(db: Session, page: int, per_page: int, sort_by: str, sort_order: str):
+    def get_chatrooms(db: Session, page: int, per_page: int, sort_by: str, sort_order: str, include_total: bool = True):
         try:
             query = db.query(Chatroom)
             
@@ -27,16 +31,16 @@ class ChatroomService:
             else:
                 query = query.order_by(getattr(Chatroom, sort_by))
             
-            total = query.count()
-            pages = math.ceil(total / per_page)
-            chatrooms = query.offset((page - 1) * per_page).limit(per_page).all()
-            
+            chatrooms, total, has_more = fetch_page(query, page, per_page, include_total,
+                                                    count=lambda: stored_count(db, CHATROOMS))
+
             return {
                 'items': [chatroom.to_dict() for chatroom in chatrooms],
                 'total': total,
                 'page': page,
-                'pages': pages,
-                'per_page': per_page
+                'pages': total_pages(total, per_page),
+                'per_page': per_page,
+                'has_more': has_more
             }, None
         except Exception as e:
             return None, str(e)
@@ -49,6 +53,17 @@ class ChatroomService:
         except Exception as e:
             return None, str(e)
 
+    @staticmethod
+    def get_chatrooms_by_ids(db: Session, chatroom_ids: list):
+        """
+        Fetch chatrooms for a list of ids with chunked IN queries, keyed by id
+        """
+        try:
+            return {chatroom.id: chatroom.to_dict() for chunk in chunked(set(chatroom_ids))
+                    for chatroom in db.query(Chatroom).filter(Chatroom.id.in_(chunk))}, None
+        except Exception as e:
+            return None, str(e)
+
     @staticmethod
     def update_chatroom(db: Session, chatroom_id: int, data: dict):
         try:
@@ -57,6 +72,7 @@ class ChatroomService:
                 for key, value in data.items():
                     setattr(chatroom, key, value)
                 db.commit()
+                response_cache.invalidate(db.info.get('tenant_id'), 'chatrooms', f'chatroom:{chatroom_id}')
                 return chatroom.to_dict(), None
             return None, None
         except Exception as e:
@@ -70,8 +86,35 @@ class ChatroomService:
             if chatroom:
                 db.delete(chatroom)
                 db.commit()
+                response_cache.invalidate(db.info.get('tenant_id'), 'chatrooms', f'chatroom:{chatroom_id}')
                 return True, None
             return False, None
         except Exception as e:
             db.rollback()
-            return False, str(e)
\ No newline at end of file
+            return False, str(e)
+
+
+class AsyncChatroomService:
+    @staticmethod
+    async def create_chatroom(db: AsyncSession, chatroom_data: dict):
+        return await db.run_sync(ChatroomService.create_chatroom, chatroom_data)
+
+    @staticmethod
+    async def get_chatrooms(db: AsyncSession, page: int, per_page: int, sort_by: str, sort_order: str, include_total: bool = True):
+        return await db.run_sync(ChatroomService.get_chatrooms, page, per_page, sort_by, sort_order, include_total)
+
+    @staticmethod
+    async def get_chatroom(db: AsyncSession, chatroom_id: int):
+        return await db.run_sync(ChatroomService.get_chatroom, chatroom_id)
+
+    @staticmethod
+    async def get_chatrooms_by_ids(db: AsyncSession, chatroom_ids: list):
+        return await db.run_sync(ChatroomService.get_chatrooms_by_ids, chatroom_ids)
+
+    @staticmethod
+    async def update_chatroom(db: AsyncSession, chatroom_id: int, data: dict):
+        return await db.run_sync(ChatroomService.update_chatroom, chatroom_id, data)
+
+    @staticmethod
+    async def delete_chatroom(db: AsyncSession, chatroom_id: int):
+        return await db.run_sync(ChatroomService.delete_chatroom, chatroom_id)
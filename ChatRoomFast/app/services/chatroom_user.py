@@ -1,9 +1,47 @@
 from sqlalchemy.orm import Session
-from app.models import ChatroomUser, User
-import math
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models import ChatroomUser, User, Chatroom
+from app.database import chunked, fetch_page, total_pages
+from app.counters import stored_count, ROOM_MEMBERS
+from datetime import datetime, timezone
 import uuid
 
 
+def _validate_bulk_members(chatroom_id: int, members: list, known_users: set, existing_members: set):
+    """
+    Split bulk membership items into rows to insert and per-item results
+    """
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    seen = set()
+    rows, results = [], []
+    for index, item in enumerate(members):
+        error = None
+        if not isinstance(item, dict):
+            error = "Each member must be an object"
+        elif not isinstance(item.get('user_id'), int) or isinstance(item.get('user_id'), bool):
+            error = "user_id must be an integer"
+        elif not isinstance(item.get('role', 'member'), str):
+            error = "role must be a string"
+        elif item['user_id'] not in known_users:
+            error = "User not found"
+        elif item['user_id'] in existing_members or item['user_id'] in seen:
+            error = "User is already a member of this chatroom"
+        if error:
+            results.append({'index': index, 'status': 'error', 'error': error})
+            continue
+        seen.add(item['user_id'])
+        row = {
+            'id': str(uuid.uuid4()),
+            'user_id': item['user_id'],
+            'chatroom_id': chatroom_id,
+            'role': item.get('role', 'member'),
+            'joined_at': now
+        }
+        rows.append(row)
+        results.append({'index': index, 'status': 'created', 'member': dict(row, joined_at=now.isoformat())})
+    return rows, results
+
+
 class ChatroomUserService:
     @staticmethod
     def add_user_to_chatroom(db: Session, chatroom_id: int, user_id: int, role: str = 'member'):
@@ -24,12 +62,48 @@ class ChatroomUserService:
             return None, str(e)
 
     @staticmethod
-    def get_users_in_chatroom(db: Session, chatroom_id: int, page: int, per_page: int, sort_by: str, sort_order: str, name: str = None):
+    def add_users_to_chatroom(db: Session, chatroom_id: int, members: list):
+        """
+        Add a batch of members to a chatroom in one transaction. Unknown users and
+        existing memberships are found with chunked IN queries and reported per
+        row without stopping the others
+        """
         try:
-            query = db.query(ChatroomUser).filter_by(chatroom_id=chatroom_id)
+            if db.query(Chatroom.id).filter_by(id=chatroom_id).first() is None:
+                return None, "Chatroom not found"
+            user_ids = {item.get('user_id') for item in members
+                        if isinstance(item, dict) and isinstance(item.get('user_id'), int)}
+            known_users, existing_members = set(), set()
+            for chunk in chunked(user_ids):
+                known_users.update(row.id for row in db.query(User.id).filter(User.id.in_(chunk)))
+                existing_members.update(row.user_id for row in db.query(ChatroomUser.user_id).filter(
+                    ChatroomUser.chatroom_id == chatroom_id, ChatroomUser.user_id.in_(chunk)))
+
+            rows, results = _validate_bulk_members(chatroom_id, members, known_users, existing_members)
+            if rows:
+                db.execute(ChatroomUser.__table__.insert(), rows)
+                db.commit()
+            return {'created': len(rows), 'failed': len(members) - len(rows), 'results': results}, None
+        except Exception as e:
+            db.rollback()
+            return None, str(e)
+
+    @staticmethod
+    def get_users_in_chatroom(db: Session, chatroom_id: int, page: int, per_page: int, sort_by: str, sort_order: str, name: str = None,
+                              include_total: bool = True):
+        try:
+            query = db.query(
+                ChatroomUser.id,
+                ChatroomUser.user_id,
+                ChatroomUser.chatroom_id,
+                ChatroomUser.role,
+                ChatroomUser.joined_at,
+                User.username,
+                User.email
+            ).join(User, User.id == ChatroomUser.user_id).filter(ChatroomUser.chatroom_id == chatroom_id)
 
             if name:
-                query = query.join(User).filter(User.username.ilike(f'%{name}%'))
+                query = query.filter(User.username.ilike(f'%{name}%'))
 
             if sort_by == 'username':
                 sort_column = User.username
@@ -41,18 +115,45 @@ class ChatroomUserService:
             else:
                 query = query.order_by(sort_column.desc())
 
-            total = query.count()
-            chatroom_users = query.offset((page - 1) * per_page).limit(per_page).all()
+            # The maintained count only covers the unfiltered member list
+            count = None if name else lambda: stored_count(db, ROOM_MEMBERS, chatroom_id)
+            rows, total, has_more = fetch_page(query, page, per_page, include_total, count)
 
             return {
                 'total_count': total,
-                'total_pages': math.ceil(total / per_page),
+                'total_pages': total_pages(total, per_page),
                 'current_page': page,
-                'users': [item.to_dict() for item in chatroom_users]
+                'has_more': has_more,
+                'users': [{
+                    'id': row.id,
+                    'user_id': row.user_id,
+                    'chatroom_id': row.chatroom_id,
+                    'username': row.username,
+                    'email': row.email,
+                    'role': row.role,
+                    'joined_at': row.joined_at.isoformat() if row.joined_at else None
+                } for row in rows]
             }, None
         except Exception as e:
             return None, str(e)
 
+    @staticmethod
+    def get_members_by_chatrooms(db: Session, chatroom_ids: list):
+        """
+        Fetch the members of several chatrooms with chunked IN queries, as lists
+        keyed by chatroom id in joined order. Rooms without members are absent
+        """
+        try:
+            members = {}
+            for chunk in chunked(set(chatroom_ids)):
+                query = db.query(ChatroomUser).filter(ChatroomUser.chatroom_id.in_(chunk)) \
+                    .order_by(ChatroomUser.chatroom_id, ChatroomUser.joined_at)
+                for member in query:
+                    members.setdefault(member.chatroom_id, []).append(member.to_dict())
+            return members, None
+        except Exception as e:
+            return None, str(e)
+
     @staticmethod
     def remove_user_from_chatroom(db: Session, chatroom_id: int, user_id: int):
         try:
@@ -64,4 +165,28 @@ class ChatroomUserService:
             return False, "User not found in chatroom"
         except Exception as e:
             db.rollback()
-            return False, str(e)
\ No newline at end of file
+            return False, str(e)
+
+
+class AsyncChatroomUserService:
+    @staticmethod
+    async def add_user_to_chatroom(db: AsyncSession, chatroom_id: int, user_id: int, role: str = 'member'):
+        return await db.run_sync(ChatroomUserService.add_user_to_chatroom, chatroom_id, user_id, role)
+
+    @staticmethod
+    async def add_users_to_chatroom(db: AsyncSession, chatroom_id: int, members: list):
+        return await db.run_sync(ChatroomUserService.add_users_to_chatroom, chatroom_id, members)
+
+    @staticmethod
+    async def get_users_in_chatroom(db: AsyncSession, chatroom_id: int, page: int, per_page: int, sort_by: str, sort_order: str, name: str = None,
+                                    include_total: bool = True):
+        return await db.run_sync(ChatroomUserService.get_users_in_chatroom, chatroom_id, page, per_page, sort_by, sort_order, name,
+                                 include_total)
+
+    @staticmethod
+    async def get_members_by_chatrooms(db: AsyncSession, chatroom_ids: list):
+        return await db.run_sync(ChatroomUserService.get_members_by_chatrooms, chatroom_ids)
+
+    @staticmethod
+    async def remove_user_from_chatroom(db: AsyncSession, chatroom_id: int, user_id: int):
+        return await db.run_sync(ChatroomUserService.remove_user_from_chatroom, chatroom_id, user_id)
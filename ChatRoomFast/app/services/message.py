@@ -1,39 +1,289 @@
+from sqlalchemy import and_, or_, select, text, union_all
 from sqlalchemy.orm import Session
-from app.models import Message, Chatroom, User
-import math
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from app.models import Message, Chatroom, User, utcnow
+from app.pubsub import message_hub
+from app.config import Config
+from app.message_ingest import MessageIngestQueue, QueueFull
+from app.fts import fts5_supported, fts_query, FTS_TABLE, SEARCH_SQL, COUNT_SQL
+from app.counters import stored_count, ROOM_MESSAGES, USER_MESSAGES
+from app.database import chunked, fetch_page, total_pages
+from app.services.tenant import tenant_registry
+import asyncio
+import atexit
+import base64
+import json
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+
+
+MESSAGE_QUEUE_FULL = "Message queue is full, retry later"
+
+
+def _insert_messages(engine, rows):
+    # Stamp queued rows as they are written, not as they were queued, so a
+    # cursor can never pass a message that was still waiting for its commit
+    with engine.begin() as connection:
+        now = utcnow()
+        for index, row in enumerate(rows):
+            row['timestamp'] = now + timedelta(microseconds=index)
+        connection.execute(Message.__table__.insert(), rows)
+
+
+def _message_dict(row):
+    return dict(row, timestamp=row['timestamp'].isoformat())
+
+
+def _validate_bulk_messages(chatroom_id: int, messages: list, known_users: set):
+    """
+    Split bulk message items into rows to insert and per-item results
+    """
+    now = utcnow()
+    rows, results = [], []
+    for index, item in enumerate(messages):
+        error = None
+        if not isinstance(item, dict):
+            error = "Each message must be an object"
+        elif not isinstance(item.get('user_id'), int) or isinstance(item.get('user_id'), bool):
+            error = "user_id must be an integer"
+        elif item['user_id'] not in known_users:
+            error = "User not found"
+        elif not isinstance(item.get('content'), str) or not item['content'].strip():
+            error = "content is required"
+        if error:
+            results.append({'index': index, 'status': 'error', 'error': error})
+            continue
+        # Offset each timestamp so the batch keeps its order in history pages
+        row = {
+            'id': str(uuid.uuid4()),
+            'user_id': item['user_id'],
+            'chatroom_id': chatroom_id,
+            'content': item['content'],
+            'timestamp': now + timedelta(microseconds=index)
+        }
+        rows.append(row)
+        results.append({'index': index, 'status': 'created', 'message': _message_dict(row)})
+    return rows, results
+
+
+def _publish_messages(tenant_id, rows):
+    for row in rows:
+        message_hub.publish(tenant_id, row['chatroom_id'], _message_dict(row))
+
+
+message_ingest = MessageIngestQueue(
+    write_batch=_insert_messages,
+    on_flushed=_publish_messages,
+    batch_size=Config.MESSAGE_BATCH_SIZE,
+    flush_interval=Config.MESSAGE_FLUSH_INTERVAL_MS / 1000,
+    max_pending=Config.MESSAGE_QUEUE_MAX_PENDING
+)
+atexit.register(message_ingest.flush)
+
+
+def encode_cursor(timestamp: datetime, message_id: str):
+    raw = json.dumps([timestamp.isoformat() if timestamp else None, message_id])
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        timestamp, message_id = json.loads(raw)
+        timestamp = datetime.fromisoformat(timestamp)
+        if timestamp.tzinfo is not None:
+            # Rows are stored as naive UTC; older cursors carried an offset
+            timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+        return timestamp, str(message_id)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+
+
+def keyset_filter(timestamp: datetime, message_id: str, older: bool):
+    # The leading range condition on timestamp lets SQLite seek the
+    # (chatroom_id, timestamp) index instead of scanning the room.
+    if older:
+        return and_(Message.timestamp <= timestamp,
+                    or_(Message.timestamp < timestamp, Message.id < message_id))
+    return and_(Message.timestamp >= timestamp,
+                or_(Message.timestamp > timestamp, Message.id > message_id))
+
+
+def _filter_messages(query, start_date: str = None, end_date: str = None, search: str = None,
+                     chatroom_id: int = None, match: str = None):
+    """
+    search keeps the substring semantics of the list endpoints; match is the
+    opt-in full-text filter where every word must match as a word prefix
+    """
+    if start_date:
+        query = query.filter(Message.timestamp >= datetime.fromisoformat(start_date))
+    if end_date:
+        query = query.filter(Message.timestamp <= datetime.fromisoformat(end_date))
+    if search:
+        query = query.filter(Message.content.ilike(f'%{search}%'))
+    if match:
+        words = fts_query(match, chatroom_id)
+        if words and fts5_supported():
+            query = query.filter(text(
+                f"message.rowid IN (SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :search_match)"
+            ).bindparams(search_match=words))
+        else:
+            query = query.filter(Message.content.ilike(f'%{match}%'))
+    return query
+
+
+def _room_message_count(db: Session, chatroom_id: int, start_date: str = None, end_date: str = None, search: str = None,
+                        match: str = None):
+    """
+    Maintained message count of a chatroom, or None when filters make it inapplicable
+    """
+    if start_date or end_date or search or match:
+        return None
+    return lambda: stored_count(db, ROOM_MESSAGES, chatroom_id)
 
 
 class MessageService:
     @staticmethod
     def send_message(db: Session, chatroom_id: int, user_id: int, content: str):
+        if Config.MESSAGE_INGEST_MODE != 'direct':
+            result, future, error = MessageService.enqueue_message(db.info.get('tenant_id'), chatroom_id, user_id, content)
+            if error is None and Config.MESSAGE_INGEST_MODE == 'durable':
+                try:
+                    result = _message_dict(future.result())
+                except Exception as e:
+                    return None, str(e)
+            return result, error
+
         try:
             message = Message(
                 id=str(uuid.uuid4()),
                 user_id=user_id,
                 chatroom_id=chatroom_id,
-                content=content
+                content=content,
+                timestamp=utcnow()
             )
             db.add(message)
             db.commit()
             db.refresh(message)
-            return message.to_dict(), None
+            result = message.to_dict()
+            message_hub.publish(db.info.get('tenant_id'), chatroom_id, result)
+            return result, None
         except Exception as e:
             db.rollback()
             return None, str(e)
 
     @staticmethod
-    def get_messages(db: Session, chatroom_id: int, page: int, per_page: int, sort_by: str, sort_order: str, start_date: str = None, end_date: str = None, search: str = None):
+    def send_messages(db: Session, chatroom_id: int, messages: list):
+        """
+        Insert a batch of messages in one transaction. Invalid items are reported
+        in the per-item results and do not stop the others
+        """
         try:
-            query = db.query(Message).filter_by(chatroom_id=chatroom_id)
+            if db.query(Chatroom.id).filter_by(id=chatroom_id).first() is None:
+                return None, "Chatroom not found"
+            user_ids = {item.get('user_id') for item in messages
+                        if isinstance(item, dict) and isinstance(item.get('user_id'), int)}
+            known_users = {row.id for chunk in chunked(user_ids)
+                           for row in db.query(User.id).filter(User.id.in_(chunk))}
+
+            rows, results = _validate_bulk_messages(chatroom_id, messages, known_users)
+            if rows:
+                db.execute(Message.__table__.insert(), rows)
+                db.commit()
+
+            tenant_id = db.info.get('tenant_id')
+            for result in results:
+                if result['status'] == 'created':
+                    message_hub.publish(tenant_id, chatroom_id, result['message'])
+            return {
+                'created': len(rows),
+                'failed': len(messages) - len(rows),
+                'results': results
+            }, None
+        except Exception as e:
+            db.rollback()
+            return None, str(e)
+
+    @staticmethod
+    def search_messages(db: Session, term: str, chatroom_id: int = None, page: int = 1, per_page: int = 20):
+        """
+        Ranked full-text search over one chatroom or the whole tenant, with a
+        highlighted snippet per hit. Falls back to an unranked LIKE scan when
+        SQLite has no FTS5
+        """
+        match = fts_query(term, chatroom_id)
+        if not match:
+            return None, "Search term must contain at least one word"
 
-            if start_date:
-                query = query.filter(Message.timestamp >= datetime.fromisoformat(start_date))
-            if end_date:
-                query = query.filter(Message.timestamp <= datetime.fromisoformat(end_date))
-            if search:
-                query = query.filter(Message.content.ilike(f'%{search}%'))
+        try:
+            if not fts5_supported():
+                query = db.query(Message).filter(Message.content.ilike(f'%{term}%'))
+                if chatroom_id is not None:
+                    query = query.filter(Message.chatroom_id == chatroom_id)
+                total = query.count()
+                messages = query.order_by(Message.timestamp.desc()).offset((page - 1) * per_page).limit(per_page).all()
+                results = [dict(message.to_dict(), snippet=None, rank=None) for message in messages]
+            else:
+                params = {
+                    'query': match,
+                    'mark_start': Config.SEARCH_MARK_START,
+                    'mark_end': Config.SEARCH_MARK_END,
+                    'snippet_tokens': Config.SEARCH_SNIPPET_TOKENS,
+                    'limit': per_page,
+                    'offset': (page - 1) * per_page
+                }
+                total = db.execute(text(COUNT_SQL), params).scalar()
+                rows = db.execute(text(SEARCH_SQL), params).mappings().all()
+                results = [
+                    dict(row, timestamp=datetime.fromisoformat(row['timestamp']).isoformat() if row['timestamp'] else None)
+                    for row in rows
+                ]
+
+            return {
+                'total_count': total,
+                'current_page': page,
+                'per_page': per_page,
+                'results': results
+            }, None
+        except Exception as e:
+            return None, str(e)
+
+    @staticmethod
+    def enqueue_message(tenant_id: int, chatroom_id: int, user_id: int, content: str, block: bool = True):
+        """
+        Buffer a message for the next group commit. Returns the message, a Future
+        resolved with the written row, and an error. The returned timestamp is
+        provisional: the writer stamps the stored one at the commit. With
+        block=False a full tenant queue returns MESSAGE_QUEUE_FULL instead of
+        waiting for room
+        """
+        engine = tenant_registry.get_engine(tenant_id)
+        if engine is None:
+            return None, None, "Tenant not found"
+        if not user_id or not content:
+            return None, None, "user_id and content are required"
+
+        row = {
+            'id': str(uuid.uuid4()),
+            'user_id': user_id,
+            'chatroom_id': chatroom_id,
+            'content': content,
+            'timestamp': utcnow()
+        }
+        try:
+            future = message_ingest.submit(tenant_id, engine, row, wait=Config.MESSAGE_INGEST_MODE == 'durable',
+                                           block=block)
+        except QueueFull:
+            return None, None, MESSAGE_QUEUE_FULL
+        return _message_dict(row), future, None
+
+    @staticmethod
+    def get_messages(db: Session, chatroom_id: int, page: int, per_page: int, sort_by: str, sort_order: str, start_date: str = None, end_date: str = None, search: str = None,
+                     include_total: bool = True, match: str = None):
+        try:
+            query = db.query(Message).filter_by(chatroom_id=chatroom_id)
+            query = _filter_messages(query, start_date, end_date, search, chatroom_id, match)
 
             if sort_by == 'timestamp':
                 sort_column = Message.timestamp
@@ -47,22 +297,88 @@ class MessageService:
             else:
                 query = query.order_by(sort_column.desc())
 
-            total = query.count()
-            messages = query.offset((page - 1) * per_page).limit(per_page).all()
+            count = _room_message_count(db, chatroom_id, start_date, end_date, search, match)
+            messages, total, has_more = fetch_page(query, page, per_page, include_total, count)
 
             return {
                 'total_count': total,
-                'total_pages': math.ceil(total / per_page),
+                'total_pages': total_pages(total, per_page),
                 'current_page': page,
+                'has_more': has_more,
                 'messages': [message.to_dict() for message in messages]
             }, None
         except Exception as e:
             return None, str(e)
 
     @staticmethod
-    def get_user_messages(db: Session, user_id: int, page: int, per_page: int, sort_by: str, sort_order: str):
+    def get_messages_by_cursor(db: Session, chatroom_id: int, per_page: int, before: str = None, after: str = None,
+                               sort_order: str = 'desc', include_total: bool = False,
+                               start_date: str = None, end_date: str = None, search: str = None, match: str = None):
+        try:
+            base_query = db.query(Message).filter_by(chatroom_id=chatroom_id)
+            base_query = _filter_messages(base_query, start_date, end_date, search, chatroom_id, match)
+
+            if after:
+                older, cursor = False, after
+            elif before:
+                older, cursor = True, before
+            else:
+                older, cursor = sort_order != 'asc', None
+
+            query = base_query
+            if cursor:
+                timestamp, message_id = decode_cursor(cursor)
+                query = query.filter(keyset_filter(timestamp, message_id, older))
+            if older:
+                query = query.order_by(Message.timestamp.desc(), Message.id.desc())
+            else:
+                query = query.order_by(Message.timestamp.asc(), Message.id.asc())
+
+            messages = query.limit(per_page + 1).all()
+            has_more = len(messages) > per_page
+            messages = messages[:per_page]
+
+            result = {
+                'next_cursor': encode_cursor(messages[-1].timestamp, messages[-1].id) if messages else cursor,
+                'has_more': has_more,
+                'messages': [message.to_dict() for message in messages]
+            }
+            if include_total:
+                count = _room_message_count(db, chatroom_id, start_date, end_date, search, match)
+                result['total_count'] = count() if count else base_query.count()
+            return result, None
+        except Exception as e:
+            return None, str(e)
+
+    @staticmethod
+    def get_latest_messages_by_chatrooms(db: Session, chatroom_ids: list, limit: int):
+        """
+        Fetch the newest ``limit`` messages of several chatrooms, as lists keyed by
+        chatroom id newest first. Each room is its own LIMIT arm of a UNION ALL so
+        it reads only its head of the (chatroom_id, timestamp) index; chunks stay
+        well below SQLite's cap of 500 compound SELECT terms
+        """
         try:
-            query = db.query(Message).filter_by(user_id=user_id)
+            latest = {}
+            for chunk in chunked(set(chatroom_ids), 100):
+                arms = [select(Message).where(Message.chatroom_id == chatroom_id)
+                        .order_by(Message.timestamp.desc(), Message.id.desc()).limit(limit).subquery().select()
+                        for chatroom_id in chunk]
+                statement = arms[0] if len(arms) == 1 else union_all(*arms)
+                for message in db.query(Message).from_statement(statement):
+                    latest.setdefault(message.chatroom_id, []).append(message)
+            return {chatroom_id: [message.to_dict() for message in
+                                  sorted(messages, key=lambda message: (message.timestamp, message.id), reverse=True)]
+                    for chatroom_id, messages in latest.items()}, None
+        except Exception as e:
+            return None, str(e)
+
+    @staticmethod
+    def get_user_messages(db: Session, user_id: int, page: int, per_page: int, sort_by: str, sort_order: str, include_total: bool = True):
+        try:
+            query = db.query(Message, Chatroom.name.label('chatroom_name')) \
+                .outerjoin(Chatroom, Chatroom.id == Message.chatroom_id) \
+                .filter(Message.user_id == user_id)
 
             if sort_by == 'timestamp':
                 sort_column = Message.timestamp
@@ -72,18 +388,68 @@ class MessageService:
                 sort_column = Message.timestamp
 
             if sort_order == 'asc':
-                query = query.order_by(sort_column.asc())
+                query = query.order_by(sort_column.asc(), Message.timestamp.asc())
             else:
-                query = query.order_by(sort_column.desc())
+                query = query.order_by(sort_column.desc(), Message.timestamp.desc())
 
-            total = query.count()
-            messages =  query.offset((page - 1) * per_page).limit(per_page).all()
+            rows, total, has_more = fetch_page(query, page, per_page, include_total,
+                                               count=lambda: stored_count(db, USER_MESSAGES, user_id))
 
             return {
                 'total_count': total,
-                'total_pages': math.ceil(total / per_page),
+                'total_pages': total_pages(total, per_page),
                 'current_page': page,
-                'messages': [message.to_dict() for message in messages]
+                'has_more': has_more,
+                'messages': [dict(message.to_dict(), chatroom_name=chatroom_name) for message, chatroom_name in rows]
             }, None
         except Exception as e:
-            return None, str(e)
\ No newline at end of file
+            return None, str(e)
+
+
+class AsyncMessageService:
+    """
+    Async counterparts of MessageService. Each call runs the sync implementation
+    on the AsyncSession's aiosqlite connection through run_sync, so it never
+    occupies a threadpool worker.
+    """
+
+    @staticmethod
+    async def send_message(db: AsyncSession, chatroom_id: int, user_id: int, content: str):
+        if Config.MESSAGE_INGEST_MODE != 'direct':
+            # Opening the tenant engine is blocking work, and a full queue is
+            # rejected rather than waited on, so the event loop never stalls
+            result, future, error = await run_in_threadpool(MessageService.enqueue_message, db.info.get('tenant_id'),
+                                                            chatroom_id, user_id, content, False)
+            if error is None and Config.MESSAGE_INGEST_MODE == 'durable':
+                try:
+                    result = _message_dict(await asyncio.wrap_future(future))
+                except Exception as e:
+                    return None, str(e)
+            return result, error
+        return await db.run_sync(MessageService.send_message, chatroom_id, user_id, content)
+
+    @staticmethod
+    async def send_messages(db: AsyncSession, chatroom_id: int, messages: list):
+        return await db.run_sync(MessageService.send_messages, chatroom_id, messages)
+
+    @staticmethod
+    async def search_messages(db: AsyncSession, term: str, chatroom_id: int = None, page: int = 1, per_page: int = 20):
+        return await db.run_sync(MessageService.search_messages, term, chatroom_id, page, per_page)
+
+    @staticmethod
+    async def get_messages(db: AsyncSession, chatroom_id: int, page: int, per_page: int, sort_by: str, sort_order: str, start_date: str = None, end_date: str = None, search: str = None,
+                           include_total: bool = True, match: str = None):
+        return await db.run_sync(MessageService.get_messages, chatroom_id, page, per_page, sort_by, sort_order, start_date, end_date, search,
+                                 include_total, match)
+
+    @staticmethod
+    async def get_messages_by_cursor(db: AsyncSession, chatroom_id: int, per_page: int, before: str = None, after: str = None, sort_order: str = 'desc', include_total: bool = False, start_date: str = None, end_date: str = None, search: str = None, match: str = None):
+        return await db.run_sync(MessageService.get_messages_by_cursor, chatroom_id, per_page, before, after, sort_order, include_total, start_date, end_date, search, match)
+
+    @staticmethod
+    async def get_latest_messages_by_chatrooms(db: AsyncSession, chatroom_ids: list, limit: int):
+        return await db.run_sync(MessageService.get_latest_messages_by_chatrooms, chatroom_ids, limit)
+
+    @staticmethod
+    async def get_user_messages(db: AsyncSession, user_id: int, page: int, per_page: int, sort_by: str, sort_order: str, include_total: bool = True):
+        return await db.run_sync(MessageService.get_user_messages, user_id, page, per_page, sort_by, sort_order, include_total)
@@ -1,11 +1,58 @@
 import os
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker,Session
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import QueuePool
 from app.models import Base, Tenant
 from app.config import Config
-from ..database import get_main_db
+from app.tenant_registry import TenantEngineRegistry, AsyncTenantEngineRegistry
+from app.sqlite_pragmas import apply_sqlite_pragmas, pragmas_for_tenant
+from app.fts import ensure_message_fts, FTS_TABLE
+from app.counters import ensure_counters, COUNTER_TABLE
+from app.authentication.auth import credential_cache
 import logging
 
+logger = logging.getLogger(__name__)
+
+
+def _tenant_db_path(tenant_id: int):
+    return os.path.join(Config.TENANT_DATABASE_DIR, f"{tenant_id}.db")
+
+
+def _tenant_pragmas(tenant_id: int):
+    return pragmas_for_tenant(Config.SQLITE_PRAGMAS, Config.SQLITE_TENANT_PRAGMAS, tenant_id)
+
+
+def _open_tenant_engine(tenant_id: int):
+    tenant_db_path = _tenant_db_path(tenant_id)
+    if not os.path.exists(tenant_db_path):
+        return None
+
+    engine = create_engine(
+        f"sqlite:///{tenant_db_path}",
+        poolclass=QueuePool,
+        pool_size=Config.TENANT_POOL_SIZE,
+        max_overflow=Config.TENANT_POOL_MAX_OVERFLOW,
+        connect_args={'check_same_thread': False}
+    )
+    return apply_sqlite_pragmas(engine, _tenant_pragmas(tenant_id))
+
+
+def _open_async_tenant_engine(tenant_id: int):
+    # Runs in a worker thread. The sync registry owns schema upgrades, so
+    # opening the tenant there first runs them once per process for the
+    # async path as well.
+    if tenant_registry.get_entry(tenant_id) is None:
+        return None
+
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{_tenant_db_path(tenant_id)}",
+        pool_size=Config.TENANT_POOL_SIZE,
+        max_overflow=Config.TENANT_POOL_MAX_OVERFLOW
+    )
+    apply_sqlite_pragmas(engine.sync_engine, _tenant_pragmas(tenant_id))
+    return engine
+
 
 class TenantService:
     @staticmethod
@@ -15,12 +62,13 @@ class TenantService:
             db.add(new_tenant)
             db.commit()
             db.refresh(new_tenant)
+            credential_cache.invalidate(name)
 
             # Create tenant database
-            tenant_db_path = os.path.join(Config.TENANT_DATABASE_DIR, f"{new_tenant.id}.db")
+            tenant_db_path = _tenant_db_path(new_tenant.id)
             os.makedirs(os.path.dirname(tenant_db_path), exist_ok=True)
-            engine = create_engine(f"sqlite:///{tenant_db_path}")
-            Base.metadata.create_all(engine)
+            open(tenant_db_path, 'a').close()
+            tenant_registry.get_entry(new_tenant.id)
 
             return new_tenant, None
         except Exception as e:
@@ -29,23 +77,112 @@ class TenantService:
 
     @staticmethod
     def get_tenant_session(tenant_id: int):
-        tenant_db_path = os.path.join(Config.TENANT_DATABASE_DIR, f"{tenant_id}.db")
-        if not os.path.exists(tenant_db_path):
+        SessionLocal = tenant_registry.get_session_factory(tenant_id)
+        if not SessionLocal:
             return None
-
-        engine = create_engine(f"sqlite:///{tenant_db_path}")
-        SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
         return SessionLocal()
 
+    @staticmethod
+    async def get_async_tenant_session(tenant_id: int):
+        AsyncSessionLocal = await async_tenant_registry.get_session_factory(tenant_id)
+        if not AsyncSessionLocal:
+            return None
+        return AsyncSessionLocal()
+
     @staticmethod
     def get_tenant_engine(tenant_id: int):
-        main_db = next(get_main_db())
-        try:
-            tenant = main_db.query(Tenant).filter(Tenant.id == tenant_id).first()
-            if not tenant:
-                raise ValueError(f"Tenant with id {tenant_id} not found")
-            
-            db_path = os.path.join('tenant_dbs', str(tenant.id), f"{tenant.db_name}.db")
-            return create_engine(f"sqlite:///{db_path}")
-        finally:
-            main_db.close()
+        engine = tenant_registry.get_engine(tenant_id)
+        if engine is None:
+            raise ValueError(f"Tenant with id {tenant_id} not found")
+        return engine
+
+    @staticmethod
+    async def warm_up(count: int = Config.TENANT_WARMUP_COUNT):
+        """
+        Pre-open engines for the most recently written tenant databases
+        """
+        if count <= 0 or not os.path.isdir(Config.TENANT_DATABASE_DIR):
+            return []
+
+        candidates = []
+        for entry in os.scandir(Config.TENANT_DATABASE_DIR):
+            tenant_id, ext = os.path.splitext(entry.name)
+            if ext == '.db' and tenant_id.isdigit():
+                candidates.append((entry.stat().st_mtime, int(tenant_id)))
+        candidates.sort(reverse=True)
+
+        warmed = []
+        for _, tenant_id in candidates[:min(count, tenant_registry.capacity)]:
+            try:
+                if await async_tenant_registry.get_entry(tenant_id):
+                    warmed.append(tenant_id)
+            except Exception as e:
+                logger.warning(f"Could not warm up tenant {tenant_id}: {e}")
+        logger.info(f"Warmed up {len(warmed)} tenant engines")
+        return warmed
+
+    @staticmethod
+    def upgrade_schema(engine, deduplicate: bool = False):
+        """
+        Create missing tables, add indexes missing from existing tables and
+        set up the message search index and the row counters
+        """
+        Base.metadata.create_all(engine)
+        inspector = inspect(engine)
+        created = []
+        for table in Base.metadata.sorted_tables:
+            existing = {index['name'] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing and TenantService.create_index(engine, index, deduplicate):
+                    created.append(index.name)
+        if ensure_message_fts(engine):
+            created.append(FTS_TABLE)
+        if ensure_counters(engine):
+            created.append(COUNTER_TABLE)
+        return created
+
+    @staticmethod
+    def create_index(engine, index, deduplicate: bool = False):
+        """
+        Create a missing index and return whether it was created. Older tenant
+        databases may hold duplicate rows that would make a unique index fail:
+        the index is then skipped with a warning, unless deduplicate is set to
+        keep only the earliest row of each duplicate group. Only the
+        upgrade_tenant_schema migration deletes rows
+        """
+        with engine.begin() as connection:
+            if index.unique:
+                table = index.table.name
+                columns = ', '.join(column.name for column in index.columns)
+                duplicates = (f"FROM {table} WHERE rowid NOT IN "
+                              f"(SELECT MIN(rowid) FROM {table} GROUP BY {columns})")
+                count = connection.execute(text(f"SELECT COUNT(*) {duplicates}")).scalar()
+                if count and not deduplicate:
+                    logger.warning(f"Skipped unique index {index.name} on {engine.url.database}: {count} duplicate "
+                                   f"{table} rows; run migrations/upgrade_tenant_schema.py to remove them")
+                    return False
+                if count:
+                    connection.execute(text(f"DELETE {duplicates}"))
+                    logger.warning(f"Deleted {count} duplicate {table} rows from {engine.url.database}")
+            index.create(connection)
+        return True
+
+    @staticmethod
+    def get_engine_stats():
+        return {
+            'sync': tenant_registry.stats(),
+            'async': async_tenant_registry.stats()
+        }
+
+
+tenant_registry = TenantEngineRegistry(
+    open_engine=_open_tenant_engine,
+    prepare_engine=TenantService.upgrade_schema,
+    capacity=Config.TENANT_ENGINE_CACHE_SIZE,
+    idle_timeout=Config.TENANT_ENGINE_IDLE_TIMEOUT
+)
+async_tenant_registry = AsyncTenantEngineRegistry(
+    open_engine=_open_async_tenant_engine,
+    capacity=Config.TENANT_ENGINE_CACHE_SIZE,
+    idle_timeout=Config.TENANT_ENGINE_IDLE_TIMEOUT
+)
@@ -1,6 +1,46 @@
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.models import User
-import math
+from app.database import chunked, fetch_page, total_pages
+from app.counters import stored_count, USERS
+from app.response_cache import response_cache
+
+UNIQUE_USER_FIELDS = ('username', 'email', 'mobile')
+
+
+def _validate_bulk_users(users: list, taken: dict):
+    """
+    Check each bulk user item against the values already stored (``taken``,
+    keyed by field) and the items before it. Returns (index, user data) pairs
+    to insert and per-item results for the rejected ones
+    """
+    seen = {field: set() for field in UNIQUE_USER_FIELDS}
+    valid, results = [], []
+    for index, item in enumerate(users):
+        error = None
+        if not isinstance(item, dict):
+            error = "Each user must be an object"
+        else:
+            missing = [field for field in ('username', 'email', 'password')
+                       if not isinstance(item.get(field), str) or not item[field].strip()]
+            if missing:
+                error = f"{', '.join(missing)} required"
+            elif item.get('mobile') is not None and not isinstance(item['mobile'], str):
+                error = "mobile must be a string"
+            else:
+                for field in UNIQUE_USER_FIELDS:
+                    value = item.get(field)
+                    if value is not None and (value in taken[field] or value in seen[field]):
+                        error = f"{field} already exists"
+                        break
+        if error:
+            results.append({'index': index, 'status': 'error', 'error': error})
+            continue
+        for field in UNIQUE_USER_FIELDS:
+            if item.get(field) is not None:
+                seen[field].add(item[field])
+        valid.append((index, {field: item.get(field) for field in ('username', 'email', 'password', 'mobile')}))
+    return valid, results
 
 class UserService:
     @staticmethod
@@ -17,7 +57,36 @@ class UserService:
             return None, str(e)
 
     @staticmethod
-    def get_users(db: Session, page: int, per_page: int, sort_by: str, sort_order: str):
+    def create_users(db: Session, users: list):
+        """
+        Create a batch of users in one transaction. Uniqueness of username, email
+        and mobile is checked up front with chunked IN queries, and rejected items
+        are reported per row without stopping the others
+        """
+        try:
+            taken = {}
+            for field in UNIQUE_USER_FIELDS:
+                column = getattr(User, field)
+                values = {item.get(field) for item in users if isinstance(item, dict) and isinstance(item.get(field), str)}
+                taken[field] = {row[0] for chunk in chunked(values)
+                                for row in db.query(column).filter(column.in_(chunk))}
+
+            valid, results = _validate_bulk_users(users, taken)
+            new_users = [User(**data) for _, data in valid]
+            db.add_all(new_users)
+            db.flush()
+
+            for (index, _), new_user in zip(valid, new_users):
+                results.append({'index': index, 'status': 'created', 'user': new_user.to_dict()})
+            results.sort(key=lambda result: result['index'])
+            db.commit()
+            return {'created': len(new_users), 'failed': len(users) - len(new_users), 'results': results}, None
+        except Exception as e:
+            db.rollback()
+            return None, str(e)
+
+    @staticmethod
+    def get_users(db: Session, page: int, per_page: int, sort_by: str, sort_order: str, include_total: bool = True):
         try:
             query = db.query(User)
             
@@ -26,16 +95,16 @@ class UserService:
             else:
                 query = query.order_by(getattr(User, sort_by))
             
-            total =  query.count()
-            pages = math.ceil(total / per_page)
-            users = query.offset((page - 1) * per_page).limit(per_page).all()
-            
+            users, total, has_more = fetch_page(query, page, per_page, include_total,
+                                                count=lambda: stored_count(db, USERS))
+
             return {
                 'items': [user.to_dict() for user in users],
                 'total': total,
                 'page': page,
-                'pages': pages,
-                'per_page': per_page
+                'pages': total_pages(total, per_page),
+                'per_page': per_page,
+                'has_more': has_more
             }, None
         except Exception as e:
             return None, str(e)
@@ -50,6 +119,17 @@ class UserService:
         except Exception as e:
             return None, str(e)
 
+    @staticmethod
+    def get_users_by_ids(db: Session, user_ids: list):
+        """
+        Fetch users for a list of ids with chunked IN queries, keyed by id
+        """
+        try:
+            return {user.id: user.to_dict() for chunk in chunked(set(user_ids))
+                    for user in db.query(User).filter(User.id.in_(chunk))}, None
+        except Exception as e:
+            return None, str(e)
+
     @staticmethod
     def update_user(db: Session, user_id: int, data: dict):
         try:
@@ -58,6 +138,7 @@ class UserService:
                 for key, value in data.items():
                     setattr(user, key, value)
                 db.commit()
+                response_cache.invalidate(db.info.get('tenant_id'), f'user:{user_id}')
                 return user.to_dict(), None
             return None, None
         except Exception as e:
@@ -71,8 +152,39 @@ class UserService:
             if user:
                 db.delete(user)
                 db.commit()
+                response_cache.invalidate(db.info.get('tenant_id'), f'user:{user_id}')
                 return True, None
             return False, None
         except Exception as e:
             db.rollback()
-            return False, str(e)
\ No newline at end of file
+            return False, str(e)
+
+
+class AsyncUserService:
+    @staticmethod
+    async def create_user(db: AsyncSession, user_data: dict):
+        return await db.run_sync(UserService.create_user, user_data)
+
+    @staticmethod
+    async def create_users(db: AsyncSession, users: list):
+        return await db.run_sync(UserService.create_users, users)
+
+    @staticmethod
+    async def get_users(db: AsyncSession, page: int, per_page: int, sort_by: str, sort_order: str, include_total: bool = True):
+        return await db.run_sync(UserService.get_users, page, per_page, sort_by, sort_order, include_total)
+
+    @staticmethod
+    async def get_user(db: AsyncSession, user_id: int):
+        return await db.run_sync(UserService.get_user, user_id)
+
+    @staticmethod
+    async def get_users_by_ids(db: AsyncSession, user_ids: list):
+        return await db.run_sync(UserService.get_users_by_ids, user_ids)
+
+    @staticmethod
+    async def update_user(db: AsyncSession, user_id: int, data: dict):
+        return await db.run_sync(UserService.update_user, user_id, data)
+
+    @staticmethod
+    async def delete_user(db: AsyncSession, user_id: int):
+        return await db.run_sync(UserService.delete_user, user_id)
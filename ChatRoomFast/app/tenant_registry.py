@@ -0,0 +1,210 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+
+class TenantEngine:
+    def __init__(self, engine, session_factory):
+        self.engine = engine
+        self.session_factory = session_factory
+        self.last_used = time.monotonic()
+        # Event loop an async engine was opened on
+        self.loop = None
+
+
+class TenantEngineRegistry:
+    """Bounded cache of pooled per-tenant engines and session factories.
+
+    Entries are kept in least-recently-used order. An entry is dropped when
+    the cache grows past ``capacity`` or when it has not been used for
+    ``idle_timeout`` seconds, and its connection pool is disposed.
+    """
+
+    def __init__(self, open_engine, capacity, idle_timeout, prepare_engine=None):
+        self.open_engine = open_engine
+        self.prepare_engine = prepare_engine
+        self.capacity = capacity
+        self.idle_timeout = idle_timeout
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.idle_evictions = 0
+        self._entries = OrderedDict()
+        self._prepared = set()
+        self._lock = threading.Lock()
+        self._open_lock = threading.Lock()
+
+    def _lookup(self, tenant_id, now):
+        entry = self._entries.get(tenant_id)
+        if entry is not None:
+            entry.last_used = now
+            self._entries.move_to_end(tenant_id)
+            self.hits += 1
+        return entry
+
+    def _evict(self, now):
+        evicted = []
+        while self._entries:
+            tenant_id, entry = next(iter(self._entries.items()))
+            if len(self._entries) > self.capacity:
+                self.evictions += 1
+            elif now - entry.last_used > self.idle_timeout:
+                self.idle_evictions += 1
+            else:
+                break
+            del self._entries[tenant_id]
+            evicted.append(entry)
+        return evicted
+
+    def get_entry(self, tenant_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._lookup(tenant_id, now)
+            evicted = self._evict(now)
+        if entry is None:
+            entry = self._open(tenant_id)
+        for old_entry in evicted:
+            self._dispose(old_entry)
+        return entry
+
+    def _open(self, tenant_id):
+        with self._open_lock:
+            with self._lock:
+                entry = self._lookup(tenant_id, time.monotonic())
+                if entry is not None:
+                    return entry
+                self.misses += 1
+
+            engine = self.open_engine(tenant_id)
+            if engine is None:
+                return None
+            if self.prepare_engine and tenant_id not in self._prepared:
+                self.prepare_engine(engine)
+                self._prepared.add(tenant_id)
+            entry, evicted = self._add(tenant_id, engine)
+
+        for old_entry in evicted:
+            self._dispose(old_entry)
+        return entry
+
+    def _add(self, tenant_id, engine):
+        entry = TenantEngine(engine, self._make_session_factory(engine, tenant_id))
+        with self._lock:
+            self._entries[tenant_id] = entry
+            return entry, self._evict(time.monotonic())
+
+    def _make_session_factory(self, engine, tenant_id):
+        return sessionmaker(autoflush=False, bind=engine, info={'tenant_id': tenant_id})
+
+    def _dispose(self, entry):
+        entry.engine.dispose()
+
+    def get_session_factory(self, tenant_id):
+        entry = self.get_entry(tenant_id)
+        return entry.session_factory if entry else None
+
+    def get_engine(self, tenant_id):
+        entry = self.get_entry(tenant_id)
+        return entry.engine if entry else None
+
+    def clear(self):
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+            self._prepared.clear()
+        for entry in entries:
+            self._dispose(entry)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'capacity': self.capacity,
+                'idle_timeout': self.idle_timeout,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'idle_evictions': self.idle_evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+
+class AsyncTenantEngineRegistry(TenantEngineRegistry):
+    """Same cache for aiosqlite ``AsyncEngine`` objects and ``AsyncSession``
+    factories, with coroutine lookups. A miss opens and prepares the engine
+    in a worker thread under an ``asyncio.Lock``, so requests for tenants
+    already open are served while it runs. Evicted engines are disposed on
+    the event loop that opened them.
+    """
+
+    def __init__(self, open_engine, capacity, idle_timeout, prepare_engine=None):
+        super().__init__(open_engine, capacity, idle_timeout, prepare_engine)
+        self._open_lock = asyncio.Lock()
+        self._disposals = set()
+
+    async def get_entry(self, tenant_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._lookup(tenant_id, now)
+            evicted = self._evict(now)
+        if entry is None:
+            entry = await self._open(tenant_id)
+        for old_entry in evicted:
+            self._dispose(old_entry)
+        return entry
+
+    async def _open(self, tenant_id):
+        async with self._open_lock:
+            with self._lock:
+                entry = self._lookup(tenant_id, time.monotonic())
+                if entry is not None:
+                    return entry
+                self.misses += 1
+
+            engine = await asyncio.to_thread(self.open_engine, tenant_id)
+            if engine is None:
+                return None
+            if self.prepare_engine and tenant_id not in self._prepared:
+                await asyncio.to_thread(self.prepare_engine, engine)
+                self._prepared.add(tenant_id)
+            entry, evicted = self._add(tenant_id, engine)
+            entry.loop = asyncio.get_running_loop()
+
+        for old_entry in evicted:
+            self._dispose(old_entry)
+        return entry
+
+    def _make_session_factory(self, engine, tenant_id):
+        return sessionmaker(engine, class_=AsyncSession, autoflush=False, expire_on_commit=False,
+                            info={'tenant_id': tenant_id})
+
+    def _dispose(self, entry):
+        # aiosqlite connections can only be closed on the loop they were opened on
+        loop = entry.loop
+        if loop is None or loop.is_closed():
+            entry.engine.sync_engine.dispose(close=False)
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            task = loop.create_task(entry.engine.dispose())
+            self._disposals.add(task)
+            task.add_done_callback(self._disposals.discard)
+        elif loop.is_running():
+            asyncio.run_coroutine_threadsafe(entry.engine.dispose(), loop)
+        else:
+            entry.engine.sync_engine.dispose(close=False)
+
+    async def get_session_factory(self, tenant_id):
+        entry = await self.get_entry(tenant_id)
+        return entry.session_factory if entry else None
+
+    async def get_engine(self, tenant_id):
+        entry = await self.get_entry(tenant_id)
+        return entry.engine if entry else None
@@ -0,0 +1,103 @@
+"""
+Throughput and latency of the chatroom history read under concurrent load,
+served through the sync services in the threadpool (the old request path)
+and through the async services on aiosqlite engines.
+
+    python -m benchmarks.async_vs_sync --concurrency 200 --requests 2000 --output async.json
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from functools import partial
+from anyio import to_thread
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+from starlette.concurrency import run_in_threadpool
+
+from benchmarks.common import summarize, print_table, write_results
+from benchmarks.index_latency import seed
+from app.models import Base
+from app.services.message import MessageService, AsyncMessageService
+
+
+def sync_request(session_factory, rooms, per_page):
+    with session_factory() as db:
+        MessageService.get_messages(db, random.randint(1, rooms), 1, per_page, 'timestamp', 'desc')
+
+
+async def async_request(session_factory, rooms, per_page):
+    async with session_factory() as db:
+        await AsyncMessageService.get_messages(db, random.randint(1, rooms), 1, per_page, 'timestamp', 'desc')
+
+
+async def run_load(handler, concurrency, requests):
+    samples = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            await handler()
+            samples.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+    stats = summarize(samples)
+    stats['requests_per_second'] = round(requests / elapsed, 1)
+    return stats
+
+
+async def benchmark(db_path, args):
+    to_thread.current_default_thread_limiter().total_tokens = args.threads
+
+    engine = create_engine(f"sqlite:///{db_path}", pool_size=args.pool_size,
+                           connect_args={'check_same_thread': False})
+    sync_factory = sessionmaker(bind=engine)
+    sync_stats = await run_load(
+        lambda: run_in_threadpool(partial(sync_request, sync_factory, args.rooms, args.per_page)),
+        args.concurrency, args.requests)
+    engine.dispose()
+
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}", pool_size=args.pool_size)
+    async_factory = sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+    async_stats = await run_load(
+        lambda: async_request(async_factory, args.rooms, args.per_page),
+        args.concurrency, args.requests)
+    await async_engine.dispose()
+
+    return {'sync_threadpool': sync_stats, 'async_aiosqlite': async_stats}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--rooms', type=int, default=50)
+    parser.add_argument('--messages', type=int, default=50000)
+    parser.add_argument('--per-page', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=40, help='threadpool size used by the sync path')
+    parser.add_argument('--pool-size', type=int, default=5)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    engine = create_engine(f"sqlite:///{db_path}")
+    Base.metadata.create_all(engine)
+    seed(engine, args.users, args.rooms, args.messages)
+    engine.dispose()
+
+    results = asyncio.run(benchmark(db_path, args))
+    print_table(f"History page, {args.concurrency} concurrent clients", results)
+    for name, stats in results.items():
+        print(f"  {name:<40} {stats['requests_per_second']:>10.1f} req/s")
+    write_results({'parameters': vars(args), 'results': results}, args.output)
+
+
+if __name__ == '__main__':
+    main()
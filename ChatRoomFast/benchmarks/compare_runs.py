@@ -0,0 +1,97 @@
+"""
+Diff two load test result files, from either app's benchmarks.load_test:
+per scenario, the change in throughput, latency percentiles, SQL statements
+per request and errors, with changes worse than --threshold percent flagged
+as regressions. Comparing two runs of one app catches regressions; comparing
+a ChatRoom run with a ChatRoomFast run compares the implementations.
+
+    python -m benchmarks.compare_runs before.json after.json --threshold 10 --output diff.json --fail-on-regression
+"""
+import argparse
+import json
+import sys
+
+from benchmarks.common import write_results
+
+# Metric -> True when a higher value is better
+METRICS = {
+    'throughput_rps': True,
+    'p50_ms': False,
+    'p95_ms': False,
+    'p99_ms': False,
+    'sql_per_request': False,
+    'errors': False,
+}
+
+
+def load_run(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare_metric(baseline, candidate, higher_is_better, threshold):
+    change = round((candidate - baseline) / baseline * 100, 2) if baseline else None
+    if change is None:
+        worse = candidate > baseline and not higher_is_better
+    else:
+        worse = -change > threshold if higher_is_better else change > threshold
+    return {'baseline': baseline, 'candidate': candidate, 'change_pct': change, 'regression': worse}
+
+
+def compare_runs(baseline, candidate, threshold):
+    baseline_scenarios, candidate_scenarios = baseline['scenarios'], candidate['scenarios']
+    scenarios, regressions = {}, []
+    for name in baseline_scenarios:
+        if name not in candidate_scenarios:
+            continue
+        scenarios[name] = {
+            metric: compare_metric(baseline_scenarios[name][metric], candidate_scenarios[name][metric],
+                                   higher_is_better, threshold)
+            for metric, higher_is_better in METRICS.items()
+        }
+        regressions.extend(f'{name}.{metric}' for metric, diff in scenarios[name].items() if diff['regression'])
+    return {
+        'baseline': {'app': baseline.get('app'), 'parameters': baseline.get('parameters')},
+        'candidate': {'app': candidate.get('app'), 'parameters': candidate.get('parameters')},
+        'threshold_pct': threshold,
+        'scenarios': scenarios,
+        'only_in_baseline': sorted(set(baseline_scenarios) - set(candidate_scenarios)),
+        'only_in_candidate': sorted(set(candidate_scenarios) - set(baseline_scenarios)),
+        'regressions': regressions,
+    }
+
+
+def print_comparison(comparison):
+    print(f"\n{comparison['baseline']['app']} (baseline) against {comparison['candidate']['app']} (candidate)")
+    for name, metrics in comparison['scenarios'].items():
+        print(f"  {name}")
+        for metric, diff in metrics.items():
+            change = 'n/a' if diff['change_pct'] is None else f"{diff['change_pct']:+.1f}%"
+            flag = '  REGRESSION' if diff['regression'] else ''
+            print(f"    {metric:<18} {diff['baseline']:>12} -> {diff['candidate']:>12}  {change:>9}{flag}")
+    for side in ('only_in_baseline', 'only_in_candidate'):
+        if comparison[side]:
+            print(f"  {side.replace('_', ' ')}: {', '.join(comparison[side])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    parser.add_argument('--threshold', type=float, default=10.0,
+                        help='percent change that counts as a regression')
+    parser.add_argument('--fail-on-regression', action='store_true',
+                        help='exit with status 1 when any metric regressed')
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    comparison = compare_runs(load_run(args.baseline), load_run(args.candidate), args.threshold)
+    print_comparison(comparison)
+    write_results(comparison, args.output)
+    if args.fail_on_regression and comparison['regressions']:
+        print(f"\n{len(comparison['regressions'])} regressions: {', '.join(comparison['regressions'])}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
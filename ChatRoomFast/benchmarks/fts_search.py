@@ -0,0 +1,129 @@
+"""
+Message search latency with the old LIKE scan against the FTS5 index, for a
+single chatroom and across the whole tenant. Message text is drawn from a
+Zipf-distributed vocabulary so that common and rare terms are both covered.
+
+    python -m benchmarks.fts_search --messages 1000000 --output fts.json
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, text
+
+from benchmarks.common import measure, summarize, print_table, write_results
+from app.config import Config
+from app.fts import ensure_message_fts, fts_query, SEARCH_SQL
+from app.models import Base, Message, User, Chatroom
+from app.sqlite_pragmas import apply_sqlite_pragmas
+
+LIKE_SQL = (
+    "SELECT id, user_id, chatroom_id, content, timestamp FROM message "
+    "WHERE content LIKE :pattern {room_filter}ORDER BY timestamp DESC LIMIT :limit"
+)
+
+
+def vocabulary(size):
+    rng = random.Random(7)
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choice(letters) for _ in range(rng.randint(3, 9))))
+    return sorted(words)
+
+
+def seed(engine, words, users, rooms, messages):
+    weights = [1 / rank for rank in range(1, len(words) + 1)]
+    start = datetime(2024, 1, 1)
+    with engine.begin() as connection:
+        connection.execute(User.__table__.insert(), [
+            {'id': i, 'username': f'user{i}', 'email': f'user{i}@example.com', 'password': 'x'}
+            for i in range(1, users + 1)
+        ])
+        connection.execute(Chatroom.__table__.insert(), [
+            {'id': i, 'name': f'room{i}'} for i in range(1, rooms + 1)
+        ])
+        batch = []
+        for i in range(messages):
+            batch.append({
+                'id': uuid.uuid4().hex,
+                'user_id': random.randint(1, users),
+                'chatroom_id': random.randint(1, rooms),
+                'content': ' '.join(random.choices(words, weights, k=random.randint(6, 16))),
+                'timestamp': start + timedelta(seconds=i)
+            })
+            if len(batch) == 10000:
+                connection.execute(Message.__table__.insert(), batch)
+                batch = []
+        if batch:
+            connection.execute(Message.__table__.insert(), batch)
+
+
+def run_searches(engine, terms, rooms, per_page, repeat):
+    results = {}
+    with engine.connect() as connection:
+        for label, term in terms.items():
+            for scope in ('room', 'tenant'):
+                room_filter = "AND chatroom_id = :chatroom_id " if scope == 'room' else ""
+                like = text(LIKE_SQL.format(room_filter=room_filter))
+                fts = text(SEARCH_SQL)
+
+                def params():
+                    chatroom_id = random.randint(1, rooms)
+                    return {
+                        'pattern': f'%{term}%',
+                        'query': fts_query(term, chatroom_id if scope == 'room' else None),
+                        'chatroom_id': chatroom_id,
+                        'mark_start': '<mark>',
+                        'mark_end': '</mark>',
+                        'snippet_tokens': 12,
+                        'limit': per_page,
+                        'offset': 0
+                    }
+                results[f'like_{scope}_{label}'] = summarize(
+                    measure(lambda: connection.execute(like, params()).fetchall(), repeat))
+                results[f'fts_{scope}_{label}'] = summarize(
+                    measure(lambda: connection.execute(fts, params()).fetchall(), repeat))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--rooms', type=int, default=200)
+    parser.add_argument('--messages', type=int, default=1000000)
+    parser.add_argument('--vocabulary', type=int, default=20000)
+    parser.add_argument('--per-page', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    engine = apply_sqlite_pragmas(create_engine(f"sqlite:///{db_path}"), Config.SQLITE_PRAGMAS)
+    Base.metadata.create_all(engine)
+    words = vocabulary(args.vocabulary)
+    seed(engine, words, args.users, args.rooms, args.messages)
+
+    start = time.perf_counter()
+    ensure_message_fts(engine)
+    backfill_seconds = time.perf_counter() - start
+
+    terms = {'common': words[0], 'mid': words[len(words) // 100], 'rare': words[-1]}
+    results = run_searches(engine, terms, args.rooms, args.per_page, args.repeat)
+
+    print(f"\nIndex backfill of {args.messages} messages: {backfill_seconds:.1f}s")
+    print_table(f"Search, {args.per_page} results per page", results)
+    write_results({
+        'parameters': vars(args),
+        'terms': terms,
+        'backfill_seconds': round(backfill_seconds, 3),
+        'results': results
+    }, args.output)
+    engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
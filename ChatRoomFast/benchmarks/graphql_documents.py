@@ -0,0 +1,66 @@
+"""
+Cost of preparing a GraphQL document for execution: parsing and validating
+it on every request against a DocumentCache hit, plus the request body size
+with the full query and with an automatic persisted query hash.
+
+    python -m benchmarks.graphql_documents --repeat 2000 --output documents.json
+"""
+import argparse
+import json
+from graphql import parse, validate
+
+from benchmarks.common import measure, summarize, print_table, write_results
+from app.graphql_cache import DocumentCache, query_hash
+from app.schema import schema
+
+# The kind of document a mobile client sends on every screen load
+QUERY = """
+query Home($chatroomId: Int!, $perPage: Int = 20) {
+  allChatrooms(perPage: 20) {
+    id name description
+    members { id role user { id username email mobile } }
+    latestMessages(limit: 3) { id content timestamp user { id username } }
+  }
+  messages(chatroomId: $chatroomId, perPage: $perPage) {
+    id content timestamp userId chatroomId
+    user { id username email mobile }
+    chatroom { id name description }
+  }
+  chatroomUsers(chatroomId: $chatroomId, perPage: 50) {
+    id role userId chatroomId
+    user { id username email }
+  }
+}
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=2000)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    graphql_schema = schema.graphql_schema
+    cache = DocumentCache(graphql_schema, max_entries=1000)
+    cache.document(QUERY)
+
+    results = {
+        'parse_and_validate': summarize(measure(lambda: validate(graphql_schema, parse(QUERY)), args.repeat)),
+        'cache_hit': summarize(measure(lambda: cache.document(QUERY), args.repeat)),
+        'persisted_hash_hit': summarize(measure(lambda: cache.lookup(query_hash(QUERY)), args.repeat)),
+    }
+    variables = {'chatroomId': 1}
+    extensions = {'persistedQuery': {'version': 1, 'sha256Hash': query_hash(QUERY)}}
+    body_bytes = {
+        'full_query': len(json.dumps({'query': QUERY, 'variables': variables})),
+        'persisted_hash': len(json.dumps({'variables': variables, 'extensions': extensions})),
+    }
+
+    print_table("Preparing a document: parse and validate, cache hit, persisted hash lookup", results)
+    print(f"\nRequest body: {body_bytes['full_query']} bytes with the query, "
+          f"{body_bytes['persisted_hash']} bytes with the persisted hash")
+    write_results({'parameters': vars(args), 'results': results, 'body_bytes': body_bytes}, args.output)
+
+
+if __name__ == '__main__':
+    main()
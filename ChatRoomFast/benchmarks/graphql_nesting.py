@@ -0,0 +1,93 @@
+"""
+SQL statements and latency of nested GraphQL queries resolved through the
+per-request DataLoaders, against the same loaders limited to one key per
+batch, which issues one query per parent row like plain relationship
+resolvers would.
+
+    python -m benchmarks.graphql_nesting --rooms 50 --users 20 --output nesting.json
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from sqlalchemy import event
+
+from benchmarks.common import summarize, print_table, write_results
+from benchmarks.index_latency import seed
+from app.config import Config
+from app.loaders import TenantLoaders
+from app.schema import schema
+from app.services.tenant import TenantService, async_tenant_registry
+
+QUERIES = {
+    'message_user_chatroom': """{
+        messages(chatroomId: 1, perPage: 50) { content user { username } chatroom { name } }
+    }""",
+    'chatroom_members_user': """{
+        allChatrooms(perPage: 50) { name members { role user { username } } }
+    }""",
+    'chatroom_latest_messages_user': """{
+        allChatrooms(perPage: 50) { name latestMessages(limit: 5) { content user { username } } }
+    }""",
+}
+
+
+async def run_query(query, max_batch_size):
+    loaders = TenantLoaders(1, max_batch_size)
+    start = time.perf_counter()
+    result = await schema.execute_async(query, context_value={'tenant_id': 1, 'loaders': loaders})
+    elapsed = time.perf_counter() - start
+    if result.errors:
+        raise RuntimeError(result.errors)
+    return elapsed, loaders.batches()
+
+
+async def benchmark(args):
+    engine = (await async_tenant_registry.get_entry(1)).engine.sync_engine
+    statements = []
+    event.listen(engine, 'before_cursor_execute', lambda *_: statements.append(1))
+
+    results = {}
+    for name, query in QUERIES.items():
+        for mode, max_batch_size in (('batched', None), ('per_row', 1)):
+            samples, counts, batches = [], [], []
+            for _ in range(args.repeat):
+                statements.clear()
+                elapsed, batch_count = await run_query(query, max_batch_size)
+                samples.append(elapsed)
+                counts.append(len(statements))
+                batches.append(batch_count)
+            stats = summarize(samples)
+            stats['statements'] = max(counts)
+            stats['loader_batches'] = max(batches)
+            results[f'{name}_{mode}'] = stats
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    # Every seeded user is a member of every room
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--rooms', type=int, default=50)
+    parser.add_argument('--messages', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    Config.TENANT_DATABASE_DIR = tempfile.mkdtemp()
+    open(os.path.join(Config.TENANT_DATABASE_DIR, '1.db'), 'a').close()
+    engine = TenantService.get_tenant_engine(1)
+    random.seed(7)
+    seed(engine, args.users, args.rooms, args.messages)
+
+    results = asyncio.run(benchmark(args))
+    print_table("Nested GraphQL queries through DataLoaders, batched and one key per batch", results)
+    for name, stats in results.items():
+        print(f"  {name:<40} {stats['statements']:>5} SQL statements   {stats['loader_batches']:>5} loader batches")
+    write_results({'parameters': vars(args), 'results': results}, args.output)
+
+
+if __name__ == '__main__':
+    main()
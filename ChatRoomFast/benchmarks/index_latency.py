@@ -0,0 +1,105 @@
+"""
+Query latency of the hot message and membership lookups before and after
+the composite indexes are applied to a tenant database.
+
+    python -m benchmarks.index_latency --messages 200000 --output index.json
+"""
+import argparse
+import os
+import random
+import tempfile
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, text
+
+from benchmarks.common import measure, summarize, print_table, write_results
+from app.models import Base, Message, ChatroomUser, User, Chatroom
+from app.services.tenant import TenantService
+
+QUERIES = {
+    'room_history_page': (
+        "SELECT * FROM message WHERE chatroom_id = :room ORDER BY timestamp DESC LIMIT 50"
+    ),
+    'user_history_page': (
+        "SELECT * FROM message WHERE user_id = :user ORDER BY timestamp DESC LIMIT 50"
+    ),
+    'membership_lookup': (
+        "SELECT * FROM chatroom_user WHERE chatroom_id = :room AND user_id = :user LIMIT 1"
+    ),
+}
+
+
+def seed(engine, users, rooms, messages):
+    start = datetime(2024, 1, 1)
+    with engine.begin() as connection:
+        connection.execute(User.__table__.insert(), [
+            {'id': i, 'username': f'user{i}', 'email': f'user{i}@example.com', 'password': 'x'}
+            for i in range(1, users + 1)
+        ])
+        connection.execute(Chatroom.__table__.insert(), [
+            {'id': i, 'name': f'room{i}'} for i in range(1, rooms + 1)
+        ])
+        connection.execute(ChatroomUser.__table__.insert(), [
+            {'id': uuid.uuid4().hex, 'user_id': user, 'chatroom_id': room, 'role': 'member'}
+            for room in range(1, rooms + 1) for user in range(1, users + 1)
+        ])
+        batch = []
+        for i in range(messages):
+            batch.append({
+                'id': uuid.uuid4().hex,
+                'user_id': random.randint(1, users),
+                'chatroom_id': random.randint(1, rooms),
+                'content': f'message {i}',
+                'timestamp': start + timedelta(seconds=i)
+            })
+            if len(batch) == 10000:
+                connection.execute(Message.__table__.insert(), batch)
+                batch = []
+        if batch:
+            connection.execute(Message.__table__.insert(), batch)
+
+
+def run_queries(engine, users, rooms, repeat):
+    results = {}
+    with engine.connect() as connection:
+        for name, sql in QUERIES.items():
+            statement = text(sql)
+            samples = measure(lambda: connection.execute(statement, {
+                'room': random.randint(1, rooms), 'user': random.randint(1, users)
+            }).fetchall(), repeat)
+            results[name] = summarize(samples)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--rooms', type=int, default=50)
+    parser.add_argument('--messages', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    engine = create_engine(f"sqlite:///{db_path}")
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                connection.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+    seed(engine, args.users, args.rooms, args.messages)
+
+    before = run_queries(engine, args.users, args.rooms, args.repeat)
+    created = TenantService.upgrade_schema(engine)
+    with engine.begin() as connection:
+        connection.execute(text("ANALYZE"))
+    after = run_queries(engine, args.users, args.rooms, args.repeat)
+
+    print_table('Without indexes', before)
+    print_table(f"With indexes ({', '.join(created)})", after)
+    write_results({'parameters': vars(args), 'before': before, 'after': after}, args.output)
+    engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+Cost of the totals on paginated list endpoints: COUNT(*) over the query,
+the trigger-maintained row counters and no total at all (include_total=false),
+plus the insert overhead the counter triggers add.
+
+    python -m benchmarks.list_totals --messages 500000 --output totals.json
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks.common import measure, summarize, print_table, write_results
+from benchmarks.index_latency import seed
+from app.counters import stored_count, ROOM_MESSAGES, USER_MESSAGES, USERS
+from app.database import fetch_page
+from app.fts import ensure_message_fts
+from app.models import Base, Message, User
+from app.services.tenant import TenantService
+
+
+def seeded_engine(args, counters):
+    db_path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    engine = create_engine(f"sqlite:///{db_path}")
+    if counters:
+        TenantService.upgrade_schema(engine)
+    else:
+        Base.metadata.create_all(engine)
+        ensure_message_fts(engine)
+    random.seed(11)
+    start = time.perf_counter()
+    seed(engine, args.users, args.rooms, args.messages)
+    return engine, time.perf_counter() - start
+
+
+def run_lists(session, args):
+    lists = {
+        'room_messages': (
+            args.rooms,
+            lambda key: session.query(Message).filter_by(chatroom_id=key).order_by(Message.timestamp.desc()),
+            lambda key: stored_count(session, ROOM_MESSAGES, key)
+        ),
+        'user_messages': (
+            args.users,
+            lambda key: session.query(Message).filter_by(user_id=key).order_by(Message.timestamp.desc()),
+            lambda key: stored_count(session, USER_MESSAGES, key)
+        ),
+        'users': (
+            1,
+            lambda key: session.query(User).order_by(User.created_at.desc()),
+            lambda key: stored_count(session, USERS)
+        ),
+    }
+    results = {}
+    for name, (keys, make_query, counter) in lists.items():
+        def page(mode):
+            key = random.randint(1, keys)
+            query = make_query(key)
+            if mode == 'count':
+                return fetch_page(query, 1, args.per_page, True)
+            if mode == 'counter':
+                return fetch_page(query, 1, args.per_page, True, lambda: counter(key))
+            return fetch_page(query, 1, args.per_page, False)
+        for mode in ('count', 'counter', 'none'):
+            results[f'{name}_{mode}'] = summarize(measure(lambda: page(mode), args.repeat))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--rooms', type=int, default=20)
+    parser.add_argument('--messages', type=int, default=500000)
+    parser.add_argument('--per-page', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    plain_engine, plain_seconds = seeded_engine(args, counters=False)
+    plain_engine.dispose()
+    engine, counted_seconds = seeded_engine(args, counters=True)
+    session = sessionmaker(bind=engine)()
+    results = run_lists(session, args)
+    session.close()
+    engine.dispose()
+
+    print(f"\nSeeding {args.messages} messages: {plain_seconds:.1f}s without counters, "
+          f"{counted_seconds:.1f}s with counter triggers")
+    print_table(f"First page of {args.per_page} with COUNT(*), maintained counter, no total", results)
+    write_results({
+        'parameters': vars(args),
+        'seed_seconds': {'plain': round(plain_seconds, 3), 'counters': round(counted_seconds, 3)},
+        'results': results
+    }, args.output)
+
+
+if __name__ == '__main__':
+    main()
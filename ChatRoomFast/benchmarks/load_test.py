@@ -0,0 +1,187 @@
+"""
+In-process load test of the FastAPI app. Seeds --tenants tenants through the
+service layer, then sends send_message, get_messages, get_users_in_chatroom
+and GraphQL requests through the ASGI app with --concurrency requests in
+flight, each kind alone and as the weighted --mix. Reports throughput,
+p50/p95/p99 latency and SQL statements per request for every scenario.
+
+The JSON written to --output has the same layout as the Flask app's
+benchmarks.load_test, so runs of either app can be diffed with
+benchmarks.compare_runs.
+
+    python -m benchmarks.load_test --tenants 4 --users 50 --rooms 10 --messages 200 --requests 2000 --output fast.json
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+# The app opens its main database on import, so point it away from ./main.db first
+WORKDIR = tempfile.mkdtemp(prefix='chatroom-load-')
+os.environ['MAIN_DATABASE_URL'] = f"sqlite:///{os.path.join(WORKDIR, 'main.db')}"
+os.environ['MAIN_ASYNC_DATABASE_URL'] = f"sqlite+aiosqlite:///{os.path.join(WORKDIR, 'main.db')}"
+
+import httpx
+
+from benchmarks.common import StatementCounter, environment, load_summary, print_load_table, write_results
+from app import app
+from app.config import Config
+from app.database import MainSessionLocal, create_main_tables
+from app.services.chatroom import ChatroomService
+from app.services.chatroom_user import ChatroomUserService
+from app.services.message import MessageService
+from app.services.tenant import TenantService
+from app.services.user import UserService
+
+REQUEST_KINDS = ('send_message', 'get_messages', 'get_users_in_chatroom', 'graphql')
+SCENARIOS = REQUEST_KINDS + ('mixed',)
+DEFAULT_MIX = 'send_message=20,get_messages=50,get_users_in_chatroom=20,graphql=10'
+PASSWORD = 'load-test'
+GRAPHQL_QUERY = "query User($id: Int!) { user(id: $id) { id username email } }"
+SEED_BATCH = 1000
+
+
+def parse_mix(value):
+    weights = {}
+    for part in value.split(','):
+        kind, _, weight = part.partition('=')
+        if kind not in REQUEST_KINDS:
+            raise argparse.ArgumentTypeError(f"unknown request kind {kind!r}, expected one of {', '.join(REQUEST_KINDS)}")
+        weights[kind] = float(weight)
+    return weights
+
+
+def seed_tenant(tenant_id, name, args, rng):
+    db = TenantService.get_tenant_session(tenant_id)
+    try:
+        result, error = UserService.create_users(db, [
+            {'username': f'user{i}', 'email': f'user{i}@example.com', 'password': PASSWORD, 'mobile': f'+1555{i:07d}'}
+            for i in range(args.users)
+        ])
+        if error:
+            raise RuntimeError(error)
+        users = [item['user']['id'] for item in result['results'] if item['status'] == 'created']
+
+        members = {}
+        for index in range(args.rooms):
+            room, error = ChatroomService.create_chatroom(db, {'name': f'room {index}', 'description': 'load test'})
+            if error:
+                raise RuntimeError(error)
+            members[room['id']] = rng.sample(users, min(args.members, len(users)))
+            ChatroomUserService.add_users_to_chatroom(db, room['id'], [{'user_id': user} for user in members[room['id']]])
+            messages = [{'user_id': rng.choice(members[room['id']]), 'content': f'seed message {i}'}
+                        for i in range(args.messages)]
+            for start in range(0, len(messages), SEED_BATCH):
+                MessageService.send_messages(db, room['id'], messages[start:start + SEED_BATCH])
+    finally:
+        db.close()
+    return {'id': tenant_id, 'auth': (name, PASSWORD), 'users': users, 'members': members}
+
+
+def seed(args, rng):
+    os.makedirs(Config.TENANT_DATABASE_DIR, exist_ok=True)
+    create_main_tables()
+    tenants = []
+    with MainSessionLocal() as db:
+        for index in range(args.tenants):
+            name = f'load-{index}'
+            tenant, error = TenantService.create_tenant(db, name, name, PASSWORD)
+            if error:
+                raise RuntimeError(error)
+            tenants.append(seed_tenant(tenant.id, name, args, rng))
+    return tenants
+
+
+def build_request(kind, tenant, rng):
+    room = rng.choice(list(tenant['members']))
+    user = rng.choice(tenant['members'][room])
+    if kind == 'send_message':
+        return 'POST', f'/api/chatrooms/{room}/messages', {'json': {'user_id': user, 'content': 'load test message'}}
+    if kind == 'get_messages':
+        return 'GET', f'/api/chatrooms/{room}/messages', {'params': {'per_page': 20}}
+    if kind == 'get_users_in_chatroom':
+        return 'GET', f'/api/chatrooms/{room}/users', {'params': {'per_page': 20}}
+    return 'POST', '/graphql', {'json': {'query': GRAPHQL_QUERY, 'variables': {'id': user}}}
+
+
+def plan(scenario, count, tenants, mix, rng):
+    if scenario == 'mixed':
+        kinds = rng.choices(list(mix), weights=list(mix.values()), k=count)
+    else:
+        kinds = [scenario] * count
+    requests = []
+    for kind in kinds:
+        tenant = rng.choice(tenants)
+        method, url, kwargs = build_request(kind, tenant, rng)
+        requests.append((method, url, tenant['auth'], kwargs))
+    return requests
+
+
+def failed(response):
+    if response.status_code >= 400:
+        return True
+    return response.request.url.path == '/graphql' and bool(response.json().get('errors'))
+
+
+async def run_scenario(client, requests, concurrency, counter):
+    samples, errors = [], 0
+    pending = iter(requests)
+
+    async def worker():
+        nonlocal errors
+        for method, url, auth, kwargs in pending:
+            start = time.perf_counter()
+            response = await client.request(method, url, auth=auth, **kwargs)
+            samples.append(time.perf_counter() - start)
+            errors += failed(response)
+
+    counter.reset()
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return load_summary(samples, errors, elapsed, counter.count)
+
+
+async def benchmark(args, tenants, rng):
+    counter = StatementCounter()
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://load-test') as client:
+        await run_scenario(client, plan('mixed', args.warmup, tenants, args.mix, rng), args.concurrency, counter)
+        for scenario in args.scenarios:
+            requests = plan(scenario, args.requests, tenants, args.mix, rng)
+            results[scenario] = await run_scenario(client, requests, args.concurrency, counter)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tenants', type=int, default=4)
+    parser.add_argument('--users', type=int, default=50, help='users per tenant')
+    parser.add_argument('--rooms', type=int, default=10, help='chatrooms per tenant')
+    parser.add_argument('--members', type=int, default=20, help='members per chatroom')
+    parser.add_argument('--messages', type=int, default=200, help='seeded messages per chatroom')
+    parser.add_argument('--requests', type=int, default=2000, help='requests per scenario')
+    parser.add_argument('--warmup', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f'weights of the mixed scenario (default {DEFAULT_MIX})')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    Config.TENANT_DATABASE_DIR = os.path.join(WORKDIR, 'tenants')
+    rng = random.Random(args.seed)
+    tenants = seed(args, rng)
+
+    results = asyncio.run(benchmark(args, tenants, rng))
+    print_load_table(f"ChatRoomFast, {args.tenants} tenants, {args.concurrency} concurrent requests", results)
+    write_results({'app': 'ChatRoomFast', 'parameters': vars(args), 'environment': environment(),
+                   'scenarios': results}, args.output)
+
+
+if __name__ == '__main__':
+    main()
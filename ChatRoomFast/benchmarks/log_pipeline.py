@@ -0,0 +1,79 @@
+"""
+Latency an access log call adds to a request with the old synchronous
+FileHandler and with the queued handler and batched background writer,
+on a normal disk and on a slow one (each write and flush delayed by
+--slow-write-ms), plus the records dropped to protect request latency.
+
+    python -m benchmarks.log_pipeline --records 5000 --slow-write-ms 2 --output logging.json
+"""
+import argparse
+import logging
+import os
+import tempfile
+import time
+
+from benchmarks.common import measure, summarize, print_table, write_results
+from app.log_pipeline import BatchWriter, JsonFormatter, QueueingHandler
+
+
+class SlowFileHandler(logging.FileHandler):
+    delay_seconds = 0.0
+
+    def emit(self, record):
+        time.sleep(self.delay_seconds)
+        super().emit(record)
+
+
+class SlowBatchWriter(BatchWriter):
+    delay_seconds = 0.0
+
+    def _write(self, stream, batch):
+        time.sleep(self.delay_seconds)
+        super()._write(stream, batch)
+
+
+def access_record_logger(name, handler):
+    logger = logging.getLogger(name)
+    logger.handlers = [handler]
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    fields = {'remote_addr': '127.0.0.1', 'method': 'GET', 'path': '/api/chatrooms', 'query': 'page=1',
+              'protocol': 'HTTP/1.1', 'status': 200, 'bytes': 512, 'duration_ms': 1.234}
+    return lambda: logger.info('request', extra={'access': fields})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--records', type=int, default=5000)
+    parser.add_argument('--slow-write-ms', type=float, default=2.0)
+    parser.add_argument('--queue-size', type=int, default=10000)
+    parser.add_argument('--batch-size', type=int, default=512)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    log_dir = tempfile.mkdtemp()
+    results, writers = {}, {}
+    for disk, delay in (('disk', 0.0), ('slow_disk', args.slow_write_ms / 1000)):
+        handler = SlowFileHandler(os.path.join(log_dir, f'sync_{disk}.log'))
+        handler.delay_seconds = delay
+        handler.setFormatter(JsonFormatter())
+        results[f'file_handler_{disk}'] = summarize(
+            measure(access_record_logger(f'bench.sync.{disk}', handler), args.records))
+        handler.close()
+
+        writer = SlowBatchWriter(os.path.join(log_dir, f'queued_{disk}.log'), JsonFormatter(),
+                                 args.queue_size, args.batch_size)
+        writer.delay_seconds = delay
+        results[f'queued_{disk}'] = summarize(
+            measure(access_record_logger(f'bench.queued.{disk}', QueueingHandler(writer)), args.records))
+        writer.stop(timeout=60)
+        writers[disk] = writer.stats()
+
+    print_table(f"Per-record logging latency over {args.records} access records", results)
+    for disk, stats in writers.items():
+        print(f"  queued writer on {disk}: {stats['written']} written, {stats['dropped']} dropped")
+    write_results({'parameters': vars(args), 'results': results, 'writers': writers}, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+Sustained message insert throughput of a tenant database with one commit
+per message (MESSAGE_INGEST_MODE=direct) against the write-behind queue,
+both waiting for the group commit (durable) and returning at once (buffered).
+
+    python -m benchmarks.message_ingest --clients 32 --messages 20000 --output ingest.json
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+from sqlalchemy import create_engine, func, select
+
+from benchmarks.common import summarize, write_results
+from benchmarks.index_latency import seed
+from app.config import Config
+from app.message_ingest import MessageIngestQueue
+from app.models import Base, Message
+from app.services.message import _insert_messages
+from app.sqlite_pragmas import apply_sqlite_pragmas
+
+
+def make_row(client, i, rooms):
+    return {
+        'id': uuid.uuid4().hex,
+        'user_id': 1,
+        'chatroom_id': (client + i) % rooms + 1,
+        'content': f'message {i} from client {client}',
+        'timestamp': datetime.utcnow()
+    }
+
+
+def run_mode(mode, args):
+    db_path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    engine = create_engine(f"sqlite:///{db_path}", pool_size=args.clients, max_overflow=0,
+                           connect_args={'check_same_thread': False})
+    apply_sqlite_pragmas(engine, Config.SQLITE_PRAGMAS)
+    Base.metadata.create_all(engine)
+    seed(engine, 1, args.rooms, 0)
+
+    ingest = MessageIngestQueue(
+        write_batch=_insert_messages,
+        on_flushed=lambda tenant_id, rows: None,
+        batch_size=args.batch_size,
+        flush_interval=args.flush_interval_ms / 1000,
+        max_pending=Config.MESSAGE_QUEUE_MAX_PENDING
+    )
+    per_client = args.messages // args.clients
+    samples = [[] for _ in range(args.clients)]
+
+    def client(number):
+        for i in range(per_client):
+            row = make_row(number, i, args.rooms)
+            start = time.perf_counter()
+            if mode == 'direct':
+                _insert_messages(engine, [row])
+            else:
+                future = ingest.submit(1, engine, row, wait=mode == 'durable')
+                if mode == 'durable':
+                    future.result()
+            samples[number].append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=client, args=(number,)) for number in range(args.clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    ingest.flush()
+    elapsed = time.perf_counter() - start
+
+    with engine.connect() as connection:
+        written = connection.execute(select(func.count()).select_from(Message.__table__)).scalar()
+    engine.dispose()
+
+    stats = summarize([sample for client_samples in samples for sample in client_samples])
+    stats.update({
+        'written': written,
+        'messages_per_second': round(written / elapsed, 1),
+        'batches': ingest.batches
+    })
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rooms', type=int, default=20)
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--messages', type=int, default=20000)
+    parser.add_argument('--batch-size', type=int, default=Config.MESSAGE_BATCH_SIZE)
+    parser.add_argument('--flush-interval-ms', type=int, default=Config.MESSAGE_FLUSH_INTERVAL_MS)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    results = {mode: run_mode(mode, args) for mode in ('direct', 'durable', 'buffered')}
+
+    print(f"\n{args.messages} messages from {args.clients} clients")
+    for mode, stats in results.items():
+        print(f"  {mode:<10} {stats['messages_per_second']:>10.1f} msg/s   "
+              f"p95 {stats['p95_ms']:>9.3f} ms   {stats['batches']} batches")
+    write_results({'parameters': vars(args), 'results': results}, args.output)
+
+
+if __name__ == '__main__':
+    main()
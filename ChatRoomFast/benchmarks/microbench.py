@@ -0,0 +1,158 @@
+"""
+Microbenchmarks of the service layer and serialization hot paths, one
+function at a time: tenant session lookup, a message history page at each
+of --depths messages through the sync and async services, model and
+response serialization, Basic auth verification and GraphQL queries
+resolved through the per-request loaders.
+
+Save a baseline before a caching or query change and compare against it
+afterwards, on the same machine:
+
+    python -m benchmarks.microbench --save-baseline baseline.json
+    python -m benchmarks.microbench --compare baseline.json --fail-on-regression
+
+benchmarks/microbench_baseline.json is a reference run saved with the
+default arguments. Its environment block records the machine it came from;
+timings from another machine are only comparable by their ratios.
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+
+# The app opens its main database on import, so point it away from ./main.db first
+WORKDIR = tempfile.mkdtemp(prefix='chatroom-bench-')
+os.environ['MAIN_DATABASE_URL'] = f"sqlite:///{os.path.join(WORKDIR, 'main.db')}"
+os.environ['MAIN_ASYNC_DATABASE_URL'] = f"sqlite+aiosqlite:///{os.path.join(WORKDIR, 'main.db')}"
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.security import HTTPBasicCredentials
+
+from benchmarks.common import add_microbench_arguments, run_microbenchmarks
+from app.authentication.auth import credential_cache, verify_credentials
+from app.config import Config
+from app.database import MainSessionLocal, create_main_tables
+from app.loaders import TenantLoaders
+from app.models import Message
+from app.schema import schema
+from app.services.chatroom import ChatroomService
+from app.services.chatroom_user import ChatroomUserService
+from app.services.message import MessageService, AsyncMessageService
+from app.services.tenant import TenantService
+from app.services.user import UserService
+
+TENANT = 'bench'
+PASSWORD = 'bench'
+PAGE_SIZE = 20
+SEED_BATCH = 1000
+USER_QUERY = "query User($id: Int!) { user(id: $id) { id username email mobile } }"
+MESSAGES_QUERY = """query Messages($chatroomId: Int!) {
+    messages(chatroomId: $chatroomId, perPage: 20) { id content timestamp user { id username } }
+}"""
+
+
+def seed(depths):
+    """One tenant with a chatroom per history depth; returns the tenant id, a user id and {depth: chatroom id}."""
+    rng = random.Random(7)
+    os.makedirs(Config.TENANT_DATABASE_DIR, exist_ok=True)
+    create_main_tables()
+    with MainSessionLocal() as main_db:
+        tenant, error = TenantService.create_tenant(main_db, TENANT, TENANT, PASSWORD)
+        if error:
+            raise RuntimeError(error)
+    db = TenantService.get_tenant_session(tenant.id)
+    try:
+        result, error = UserService.create_users(db, [
+            {'username': f'user{i}', 'email': f'user{i}@example.com', 'password': PASSWORD} for i in range(50)
+        ])
+        users = [item['user']['id'] for item in result['results']]
+        rooms = {}
+        for depth in depths:
+            room, error = ChatroomService.create_chatroom(db, {'name': f'{depth} messages'})
+            if error:
+                raise RuntimeError(error)
+            ChatroomUserService.add_users_to_chatroom(db, room['id'], [{'user_id': user} for user in users])
+            messages = [{'user_id': rng.choice(users), 'content': f'message {i}'} for i in range(depth)]
+            for start in range(0, depth, SEED_BATCH):
+                MessageService.send_messages(db, room['id'], messages[start:start + SEED_BATCH])
+            rooms[depth] = room['id']
+    finally:
+        db.close()
+    return tenant.id, users[0], rooms
+
+
+def benchmarks(tenant_id, user_id, rooms, loop):
+    run = loop.run_until_complete
+
+    def tenant_session():
+        TenantService.get_tenant_session(tenant_id).close()
+
+    def history_page(room):
+        def sync_page():
+            with TenantService.get_tenant_session(tenant_id) as db:
+                MessageService.get_messages(db, room, 1, PAGE_SIZE, 'timestamp', 'desc')
+        return sync_page
+
+    def async_history_page(room):
+        async def page():
+            async with await TenantService.get_async_tenant_session(tenant_id) as db:
+                await AsyncMessageService.get_messages(db, room, 1, PAGE_SIZE, 'timestamp', 'desc')
+        return lambda: run(page())
+
+    deepest = rooms[max(rooms)]
+    with TenantService.get_tenant_session(tenant_id) as db:
+        message = db.query(Message).filter_by(chatroom_id=deepest).first()
+        db.expunge(message)
+        message_page, _ = MessageService.get_messages(db, deepest, 1, PAGE_SIZE, 'timestamp', 'desc')
+        chatroom_page, _ = ChatroomService.get_chatrooms(db, 1, PAGE_SIZE, 'created_at', 'desc')
+
+    credentials = HTTPBasicCredentials(username=TENANT, password=PASSWORD)
+
+    def verify_uncached():
+        credential_cache.invalidate(TENANT)
+        run(verify_credentials(credentials))
+
+    def execute(query, variables):
+        async def execute_query():
+            context = {'tenant_id': tenant_id, 'loaders': TenantLoaders(tenant_id)}
+            result = await schema.execute_async(query, variable_values=variables, context_value=context)
+            if result.errors:
+                raise RuntimeError(result.errors)
+        return lambda: run(execute_query())
+
+    cases = {'tenant_session': tenant_session}
+    for depth, room in sorted(rooms.items()):
+        cases[f'get_messages[depth={depth}]'] = history_page(room)
+        cases[f'async_get_messages[depth={depth}]'] = async_history_page(room)
+    cases.update({
+        'message_to_dict': message.to_dict,
+        f'messages_page_encode[{PAGE_SIZE}]': lambda: jsonable_encoder(message_page),
+        f'chatrooms_page_encode[{len(chatroom_page["items"])}]': lambda: jsonable_encoder(chatroom_page),
+        'auth_verify_cached': lambda: run(verify_credentials(credentials)),
+        'auth_verify_uncached': verify_uncached,
+        'graphql_user_query': execute(USER_QUERY, {'id': user_id}),
+        f'graphql_messages_query[{PAGE_SIZE}]': execute(MESSAGES_QUERY, {'chatroomId': deepest}),
+    })
+    return cases
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--depths', type=int, nargs='+', default=[100, 10000, 100000],
+                        help='messages in the chatroom each get_messages benchmark reads from')
+    add_microbench_arguments(parser)
+    args = parser.parse_args()
+
+    Config.TENANT_DATABASE_DIR = os.path.join(WORKDIR, 'tenants')
+    tenant_id, user_id, rooms = seed(args.depths)
+
+    loop = asyncio.new_event_loop()
+    try:
+        run_microbenchmarks('ChatRoomFast', benchmarks(tenant_id, user_id, rooms, loop), args)
+    finally:
+        loop.close()
+
+
+if __name__ == '__main__':
+    main()
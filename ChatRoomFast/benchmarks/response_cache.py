@@ -0,0 +1,65 @@
+"""
+Cost of serving GET /api/chatrooms and GET /api/users/{id} by rendering
+them from the tenant database against a response cache hit and a 304
+revalidation from the cache.
+
+    python -m benchmarks.response_cache --rooms 500 --output cache.json
+"""
+import argparse
+import os
+import random
+import tempfile
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks.common import measure, summarize, print_table, write_results
+from benchmarks.index_latency import seed
+from app.response_cache import ResponseCache, etag_matches
+from app.services.chatroom import ChatroomService
+from app.services.tenant import TenantService
+from app.services.user import UserService
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--rooms', type=int, default=500)
+    parser.add_argument('--per-page', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=500)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    engine = create_engine(f"sqlite:///{db_path}")
+    TenantService.upgrade_schema(engine)
+    seed(engine, args.users, args.rooms, 0)
+    Session = sessionmaker(bind=engine, info={'tenant_id': 1})
+    cache = ResponseCache(ttl=300, max_entries=1000)
+
+    renders = {
+        'chatroom_list': lambda db: ChatroomService.get_chatrooms(db, 1, args.per_page, 'created_at', 'desc')[0],
+        'user': lambda db: UserService.get_user(db, random.randint(1, args.users))[0],
+    }
+    results = {}
+    for name, render in renders.items():
+        def uncached():
+            with Session() as db:
+                return JSONResponse(jsonable_encoder(render(db))).body
+
+        with Session() as db:
+            etag = cache.set(1, name, JSONResponse(jsonable_encoder(render(db))).body, [name], cache.version(1))
+
+        results[f'{name}_render'] = summarize(measure(uncached, args.repeat))
+        results[f'{name}_hit'] = summarize(measure(lambda: cache.get(1, name).body, args.repeat))
+        results[f'{name}_304'] = summarize(measure(
+            lambda: etag_matches(f'"{etag}"', cache.get(1, name).etag), args.repeat))
+
+    engine.dispose()
+    print_table("Response served by rendering, from the cache and as a 304", results)
+    write_results({'parameters': vars(args), 'results': results}, args.output)
+
+
+if __name__ == '__main__':
+    main()
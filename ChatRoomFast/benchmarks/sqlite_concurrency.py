@@ -0,0 +1,119 @@
+"""
+Concurrent read/write throughput of a tenant database with SQLite's default
+rollback journal and with the connection profile from Config.SQLITE_PRAGMAS.
+Writers commit one message per transaction, as send_message does, while
+readers page through room history.
+
+    python -m benchmarks.sqlite_concurrency --writers 4 --readers 16 --seconds 10 --output pragmas.json
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from benchmarks.common import summarize, write_results
+from benchmarks.index_latency import seed
+from app.config import Config
+from app.models import Base, Message
+from app.sqlite_pragmas import apply_sqlite_pragmas
+
+HISTORY = text("SELECT * FROM message WHERE chatroom_id = :room ORDER BY timestamp DESC LIMIT 50")
+
+
+def open_engine(db_path, pragmas, threads):
+    engine = create_engine(f"sqlite:///{db_path}", pool_size=threads, max_overflow=0,
+                           connect_args={'check_same_thread': False})
+    return apply_sqlite_pragmas(engine, pragmas)
+
+
+def run_profile(pragmas, args):
+    db_path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    engine = open_engine(db_path, pragmas, args.writers + args.readers)
+    Base.metadata.create_all(engine)
+    seed(engine, args.users, args.rooms, args.messages)
+
+    deadline = time.perf_counter() + args.seconds
+    samples = {'write': [], 'read': []}
+    errors = {'write': 0, 'read': 0}
+    lock = threading.Lock()
+
+    def write():
+        with engine.begin() as connection:
+            connection.execute(Message.__table__.insert(), {
+                'id': uuid.uuid4().hex,
+                'user_id': random.randint(1, args.users),
+                'chatroom_id': random.randint(1, args.rooms),
+                'content': 'benchmark',
+                'timestamp': datetime.utcnow()
+            })
+
+    def read():
+        with engine.connect() as connection:
+            connection.execute(HISTORY, {'room': random.randint(1, args.rooms)}).fetchall()
+
+    def worker(kind, operation):
+        local_samples, local_errors = [], 0
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                operation()
+            except OperationalError:
+                local_errors += 1
+                continue
+            local_samples.append(time.perf_counter() - start)
+        with lock:
+            samples[kind].extend(local_samples)
+            errors[kind] += local_errors
+
+    threads = [threading.Thread(target=worker, args=('write', write)) for _ in range(args.writers)]
+    threads += [threading.Thread(target=worker, args=('read', read)) for _ in range(args.readers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with engine.connect() as connection:
+        journal_mode = connection.execute(text("PRAGMA journal_mode")).scalar()
+    engine.dispose()
+
+    results = {'journal_mode': journal_mode}
+    for kind in ('write', 'read'):
+        stats = summarize(samples[kind])
+        stats['per_second'] = round(len(samples[kind]) / args.seconds, 1)
+        stats['errors'] = errors[kind]
+        results[kind] = stats
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--rooms', type=int, default=20)
+    parser.add_argument('--messages', type=int, default=20000)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--readers', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    results = {
+        'default': run_profile({'busy_timeout': Config.SQLITE_PRAGMAS['busy_timeout']}, args),
+        'profile': run_profile(Config.SQLITE_PRAGMAS, args),
+    }
+
+    print(f"\n{args.writers} writers, {args.readers} readers, {args.seconds:g}s")
+    for name, stats in results.items():
+        print(f"  {name:<10} journal={stats['journal_mode']:<8} "
+              f"writes {stats['write']['per_second']:>9.1f}/s (p95 {stats['write']['p95_ms']:.2f} ms, {stats['write']['errors']} errors)   "
+              f"reads {stats['read']['per_second']:>9.1f}/s (p95 {stats['read']['p95_ms']:.2f} ms, {stats['read']['errors']} errors)")
+    write_results({'parameters': vars(args), 'pragmas': Config.SQLITE_PRAGMAS, 'results': results}, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""
+Fan-out latency of chat messages to many subscribers of one room.
+
+By default the benchmark drives the in-process MessageHub directly with
+--subscribers consumers, publishing from a worker thread the way the sync
+send_message route does. With --url it instead opens real WebSocket
+connections to a running server (requires the ``websockets`` package) and
+posts messages through the REST API.
+
+    python -m benchmarks.ws_fanout --subscribers 5000 --messages 200
+    python -m benchmarks.ws_fanout --url http://localhost:5000 --chatroom 1 \\
+        --username acme --password secret --subscribers 2000
+"""
+import argparse
+import asyncio
+import base64
+import json
+import threading
+import time
+import urllib.request
+
+from benchmarks.common import summarize, print_table, write_results
+from app.pubsub import MessageHub
+
+
+async def run_in_process(subscribers, messages, queue_size, interval):
+    hub = MessageHub(queue_size=queue_size)
+    latencies = []
+    done = asyncio.Event()
+    remaining = [subscribers * messages]
+
+    async def consume(subscription):
+        while True:
+            payload = await subscription.get()
+            if payload is None:
+                return
+            latencies.append(time.perf_counter() - json.loads(payload)['sent_at'])
+            remaining[0] -= 1
+            if remaining[0] == 0:
+                done.set()
+
+    subscriptions = [hub.subscribe(1, 1) for _ in range(subscribers)]
+    consumers = [asyncio.create_task(consume(subscription)) for subscription in subscriptions]
+
+    def publish():
+        for i in range(messages):
+            hub.publish(1, 1, {'id': i, 'sent_at': time.perf_counter()})
+            time.sleep(interval)
+
+    started = time.perf_counter()
+    await asyncio.to_thread(publish)
+    try:
+        await asyncio.wait_for(done.wait(), timeout=60)
+    except asyncio.TimeoutError:
+        pass
+    elapsed = time.perf_counter() - started
+    for consumer in consumers:
+        consumer.cancel()
+    return latencies, elapsed, hub.stats()
+
+
+async def run_against_server(url, chatroom, username, password, subscribers, messages, interval):
+    import websockets
+
+    token = base64.b64encode(f'{username}:{password}'.encode()).decode()
+    headers = {'Authorization': f'Basic {token}'}
+    ws_url = url.replace('http', 'ws', 1).rstrip('/') + f'/api/chatrooms/{chatroom}/ws'
+    sent_at = {}
+    latencies = []
+
+    async def consume(connection):
+        async for payload in connection:
+            content = json.loads(payload)['content']
+            if content in sent_at:
+                latencies.append(time.perf_counter() - sent_at[content])
+
+    connections = [await websockets.connect(ws_url, additional_headers=headers) for _ in range(subscribers)]
+    consumers = [asyncio.create_task(consume(connection)) for connection in connections]
+
+    def post(content):
+        request = urllib.request.Request(
+            url.rstrip('/') + f'/api/chatrooms/{chatroom}/messages',
+            data=json.dumps({'user_id': 1, 'content': content}).encode(),
+            headers=dict(headers, **{'Content-Type': 'application/json'}),
+            method='POST'
+        )
+        urllib.request.urlopen(request).read()
+
+    started = time.perf_counter()
+    for i in range(messages):
+        content = f'fanout-{i}-{time.time()}'
+        sent_at[content] = time.perf_counter()
+        await asyncio.to_thread(post, content)
+        await asyncio.sleep(interval)
+    await asyncio.sleep(2)
+    elapsed = time.perf_counter() - started
+
+    for consumer in consumers:
+        consumer.cancel()
+    for connection in connections:
+        await connection.close()
+    return latencies, elapsed, {'connections': subscribers}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--subscribers', type=int, default=2000)
+    parser.add_argument('--messages', type=int, default=100)
+    parser.add_argument('--interval', type=float, default=0.01, help='seconds between published messages')
+    parser.add_argument('--queue-size', type=int, default=256)
+    parser.add_argument('--url')
+    parser.add_argument('--chatroom', type=int, default=1)
+    parser.add_argument('--username')
+    parser.add_argument('--password')
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    if args.url:
+        latencies, elapsed, stats = asyncio.run(run_against_server(
+            args.url, args.chatroom, args.username, args.password, args.subscribers, args.messages, args.interval))
+    else:
+        latencies, elapsed, stats = asyncio.run(run_in_process(
+            args.subscribers, args.messages, args.queue_size, args.interval))
+
+    summary = summarize(latencies)
+    summary['deliveries_per_second'] = round(len(latencies) / elapsed, 1) if elapsed else 0.0
+    print_table(f'Fan-out to {args.subscribers} subscribers', {'publish_to_receive': summary})
+    print(f"  deliveries/s {summary['deliveries_per_second']}   hub {stats}")
+    write_results({'parameters': vars(args), 'fanout': summary, 'stats': stats}, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+import os
+import sys
+import tempfile
+
+import pytest
+from sqlalchemy import event
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+# The app opens its main database and reads logging.yaml from the working
+# directory on import, so both are pointed at a scratch directory first
+WORKDIR = tempfile.mkdtemp(prefix='chatroom-tests-')
+os.environ['MAIN_DATABASE_URL'] = f"sqlite:///{os.path.join(WORKDIR, 'main.db')}"
+os.environ['MAIN_ASYNC_DATABASE_URL'] = f"sqlite+aiosqlite:///{os.path.join(WORKDIR, 'main.db')}"
+with open(os.path.join(WORKDIR, 'logging.yaml'), 'w') as f:
+    f.write('version: 1\ndisable_existing_loggers: false\n')
+_cwd = os.getcwd()
+os.chdir(WORKDIR)
+try:
+    import app  # noqa: F401
+finally:
+    os.chdir(_cwd)
+
+from app.config import Config
+from app.response_cache import response_cache
+from app.services.tenant import TenantService, tenant_registry, async_tenant_registry
+
+TENANT_ID = 1
+
+
+@pytest.fixture
+def tenant_db(tmp_path, monkeypatch):
+    """A session on an empty tenant database under tmp_path."""
+    monkeypatch.setattr(Config, 'TENANT_DATABASE_DIR', str(tmp_path))
+    open(tmp_path / f'{TENANT_ID}.db', 'a').close()
+    db = TenantService.get_tenant_session(TENANT_ID)
+    yield db
+    db.close()
+    # Every test opens its own database as tenant 1
+    tenant_registry.clear()
+    async_tenant_registry.clear()
+    response_cache.clear()
+
+
+class StatementRecorder:
+    """Collects the SQL statements an engine executes while active."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._record)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(self.engine, 'before_cursor_execute', self._record)
@@ -0,0 +1,26 @@
+from app.services.chatroom import ChatroomService
+from app.services.message import MessageService
+from app.services.user import UserService
+from conftest import StatementRecorder
+
+# Bound parameter limit of SQLite builds before 3.32
+SQLITE_MAX_VARIABLES = 999
+
+
+def test_bulk_send_checks_senders_in_chunks(tenant_db):
+    senders = 1000
+    result, error = UserService.create_users(tenant_db, [
+        {'username': f'user{i}', 'email': f'user{i}@example.com', 'password': 'secret'} for i in range(senders)
+    ])
+    assert error is None
+    user_ids = [item['user']['id'] for item in result['results']]
+    room, error = ChatroomService.create_chatroom(tenant_db, {'name': 'room'})
+    assert error is None
+
+    with StatementRecorder(tenant_db.get_bind()) as recorder:
+        result, error = MessageService.send_messages(
+            tenant_db, room['id'], [{'user_id': user_id, 'content': 'hello'} for user_id in user_ids])
+
+    assert error is None
+    assert result['created'] == senders
+    assert max(statement.count('?') for statement in recorder.statements) <= SQLITE_MAX_VARIABLES
@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+
+from app.loaders import TenantLoaders
+from app.schema import schema
+from app.services.chatroom import ChatroomService
+from app.services.chatroom_user import ChatroomUserService
+from app.services.message import MessageService
+from app.services.tenant import async_tenant_registry
+from app.services.user import UserService
+from conftest import TENANT_ID, StatementRecorder
+
+# Each query costs its root query plus one batched query per nested relationship
+QUERIES = {
+    'messages { user chatroom }': ("""{
+        messages(chatroomId: 1, perPage: 50) { content user { username } chatroom { name } }
+    }""", 3),
+    'allChatrooms { members { user } }': ("""{
+        allChatrooms(perPage: 50) { name members { role user { username } } }
+    }""", 3),
+    'allChatrooms { latestMessages { user } }': ("""{
+        allChatrooms(perPage: 50) { name latestMessages(limit: 5) { content user { username } } }
+    }""", 3),
+}
+
+
+def seed(db, users, rooms):
+    result, error = UserService.create_users(db, [
+        {'username': f'user{i}', 'email': f'user{i}@example.com', 'password': 'secret'} for i in range(users)
+    ])
+    assert error is None
+    user_ids = [item['user']['id'] for item in result['results']]
+    for i in range(rooms):
+        room, error = ChatroomService.create_chatroom(db, {'name': f'room{i}'})
+        assert error is None
+        result, error = ChatroomUserService.add_users_to_chatroom(
+            db, room['id'], [{'user_id': user_id} for user_id in user_ids])
+        assert error is None
+        result, error = MessageService.send_messages(
+            db, room['id'], [{'user_id': user_id, 'content': f'hello from {user_id}'} for user_id in user_ids])
+        assert error is None and result['created'] == users
+
+
+async def run_query(query):
+    engine = (await async_tenant_registry.get_entry(TENANT_ID)).engine.sync_engine
+    with StatementRecorder(engine) as recorder:
+        result = await schema.execute_async(
+            query, context_value={'tenant_id': TENANT_ID, 'loaders': TenantLoaders(TENANT_ID)})
+    assert not result.errors, result.errors
+    return result.data, recorder.statements
+
+
+@pytest.mark.parametrize('users, rooms', [(2, 2), (20, 20)])
+@pytest.mark.parametrize('name', list(QUERIES))
+def test_nested_query_batches_each_level(tenant_db, name, users, rooms):
+    seed(tenant_db, users, rooms)
+    query, expected = QUERIES[name]
+
+    data, statements = asyncio.run(run_query(query))
+
+    assert data
+    assert len(statements) == expected, statements
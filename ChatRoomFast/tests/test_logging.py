@@ -0,0 +1,22 @@
+import threading
+
+from fastapi import FastAPI
+
+from app import configure_logging
+from conftest import WORKDIR
+
+
+def log_writers():
+    return [thread for thread in threading.enumerate() if thread.name.startswith('log-writer-')]
+
+
+def test_configure_logging_stops_the_writers_it_replaces(monkeypatch):
+    # configure_logging reads logging.yaml from the working directory
+    monkeypatch.chdir(WORKDIR)
+    configure_logging(FastAPI())
+    writers = len(log_writers())
+
+    for _ in range(3):
+        configure_logging(FastAPI())
+
+    assert len(log_writers()) == writers